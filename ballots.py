@@ -0,0 +1,173 @@
+# Ballot-level backend: sampled voters instead of fractional rank buckets.
+#
+# Every voter in a country gets one full ranking of the channels, stored as a row of channel
+# indices in rank order (uint8, or uint16 past 255 channels). Rankings follow the model
+# votes_distribution_ranked_voting approximates with its rank buckets: the first preference is drawn
+# in proportion to the country's first-preference counts, then come the other channels of that
+# language, then the remaining channels, each block in random order.
+#
+# Ballots are never all held at once. A country's ballots are cut into chunks of at most
+# chunk_size voters, and chunk c of country k is always drawn from RandomState([seed, k, c]), so a
+# method that needs several passes (IRV) regenerates the same ballots instead of storing them.
+# Memory stays at one chunk of ballots plus the (countries, channels) tallies.
+#
+# Approval and score ballots are derived from the rankings: a voter approves a prefix of uniform
+# random length of their ranking, and scores their first preference n_channels and every other
+# channel a uniform 1..n_channels, like distribute_score_votes' random ranks with the channel's own
+# voters on the top score.
+
+import numpy as np
+
+from pairwise import pairwise_results
+
+CHUNK_SIZE = 1 << 16
+BALLOT_METHODS = ('fptp', 'irv', 'borda', 'condorcet', 'copeland', 'schulze', 'ranked_pairs', 'approval', 'score')
+
+
+def ballot_dtype(n_channels):
+    return np.uint8 if n_channels <= 256 else np.uint16
+
+
+def voters_per_country(useful_counts, total_voters):
+    # Largest-remainder split of total_voters in proportion to the countries' useful populations.
+    useful_counts = np.asarray(useful_counts, dtype=float)
+    if useful_counts.sum() <= 0:
+        return np.zeros(len(useful_counts), dtype=np.int64)
+    quotas = total_voters * useful_counts / useful_counts.sum()
+    voters = np.floor(quotas).astype(np.int64)
+    leftover = int(total_voters - voters.sum())
+    voters[np.argsort(-(quotas - voters), kind='mergesort')[:leftover]] += 1
+    return voters
+
+
+def _first_or_none(tally):
+    # Row-wise winner of a (countries, channels) tally, -1 where nobody got anything.
+    return np.where(tally.max(axis=1) > 0, tally.argmax(axis=1), -1)
+
+
+class BallotBox(object):
+
+    def __init__(self, electorate, country_indices, voters, seed=0, chunk_size=CHUNK_SIZE):
+        # country_indices: electorate columns to vote in, voters: ballots to draw in each of them.
+        self.n_channels = electorate.n_channels
+        self.country_indices = list(country_indices)
+        self.voters = np.asarray(voters, dtype=np.int64)
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.dtype = ballot_dtype(self.n_channels)
+
+        counts = electorate.counts[:, self.country_indices].T
+        totals = counts.sum(axis=1)
+        self.first_preference_shares = counts / np.where(totals > 0, totals, 1)[:, None]
+        self.voters[totals <= 0] = 0
+
+        # block[i, j]: where channel j goes on a ballot with first preference i
+        # (0 first, 1 same language, 2 everyone else)
+        languages = np.array(electorate.languages)
+        self.block = np.where(languages[:, None] == languages[None, :], 1.0, 2.0)
+        self.block[np.arange(self.n_channels), np.arange(self.n_channels)] = 0.0
+
+    @property
+    def n_countries(self):
+        return len(self.country_indices)
+
+    def _rng(self, country, chunk):
+        return np.random.RandomState([self.seed, self.country_indices[country], chunk])
+
+    def chunks(self, country):
+        # (rng, ballots) per chunk of one country; ballots[v, r] is voter v's channel at rank r+1.
+        n_voters = int(self.voters[country])
+        for chunk, start in enumerate(range(0, n_voters, self.chunk_size)):
+            size = min(self.chunk_size, n_voters - start)
+            rng = self._rng(country, chunk)
+            first = rng.choice(self.n_channels, size, p=self.first_preference_shares[country])
+            keys = self.block[first] + rng.random_sample((size, self.n_channels))
+            yield rng, np.argsort(keys, axis=1).astype(self.dtype)
+
+    def _tally(self, weigh):
+        # (countries, channels) sum of weigh(rng, ballots) -> per-channel weights over all chunks.
+        tally = np.zeros((self.n_countries, self.n_channels))
+        for country in range(self.n_countries):
+            for rng, ballots in self.chunks(country):
+                tally[country] += weigh(rng, ballots)
+        return tally
+
+    def first_preferences(self):
+        return self._tally(lambda rng, ballots: np.bincount(ballots[:, 0], minlength=self.n_channels))
+
+    def rank_points(self):
+        # Borda points: n_channels-1 for a first preference down to 0 for a last.
+        def weigh(rng, ballots):
+            points = np.zeros(self.n_channels)
+            for rank in range(self.n_channels - 1):
+                points += (self.n_channels - 1 - rank) * np.bincount(ballots[:, rank], minlength=self.n_channels)
+            return points
+        return self._tally(weigh)
+
+    def approvals(self):
+        def weigh(rng, ballots):
+            approved_ranks = rng.randint(1, self.n_channels + 1, size=len(ballots))
+            approvals = np.zeros(self.n_channels)
+            for rank in range(self.n_channels):
+                approvals += np.bincount(ballots[approved_ranks > rank, rank], minlength=self.n_channels)
+            return approvals
+        return self._tally(weigh)
+
+    def scores(self):
+        def weigh(rng, ballots):
+            scores = rng.randint(1, self.n_channels + 1, size=ballots.shape).astype(float)
+            scores[:, 0] = self.n_channels
+            return np.bincount(ballots.ravel(), weights=scores.ravel(), minlength=self.n_channels)
+        return self._tally(weigh)
+
+    def pairwise_matrix(self):
+        # (countries, channels, channels): matrix[k, i, j] voters in country k ranking i above j.
+        matrix = np.zeros((self.n_countries, self.n_channels, self.n_channels))
+        for country in range(self.n_countries):
+            for rng, ballots in self.chunks(country):
+                position = np.empty_like(ballots)
+                position[np.arange(len(ballots))[:, None], ballots] = np.arange(self.n_channels, dtype=ballots.dtype)
+                for i in range(self.n_channels):
+                    matrix[country, i] += (position[:, i, None] < position).sum(axis=0)
+        return matrix
+
+    def irv_winners(self):
+        # One pass over a country's ballots per round: count every ballot for its highest-ranked
+        # channel still standing, stop at a majority, else eliminate the fewest (first on ties).
+        winners = np.full(self.n_countries, -1, dtype=int)
+        for country in range(self.n_countries):
+            if not self.voters[country]:
+                continue
+            standing = np.ones(self.n_channels, dtype=bool)
+            chunks = self.chunks
+            if self.voters[country] <= self.chunk_size:
+                # a single chunk: keep it instead of redrawing it every round
+                single_chunk = list(self.chunks(country))
+                chunks = lambda country: single_chunk
+            while True:
+                tally = np.zeros(self.n_channels)
+                for rng, ballots in chunks(country):
+                    top = standing[ballots].argmax(axis=1)
+                    tally += np.bincount(ballots[np.arange(len(ballots)), top], minlength=self.n_channels)
+                leader = int(tally.argmax())
+                if 2 * tally[leader] > self.voters[country] or standing.sum() == 1:
+                    winners[country] = leader
+                    break
+                standing[np.flatnonzero(standing)[tally[standing].argmin()]] = False
+        return winners
+
+    def winners(self, method):
+        # Winning channel index per country for any of BALLOT_METHODS, -1 where there is none.
+        if method == 'fptp':
+            return _first_or_none(self.first_preferences())
+        if method == 'irv':
+            return self.irv_winners()
+        if method == 'borda':
+            return _first_or_none(self.rank_points())
+        if method == 'approval':
+            return _first_or_none(self.approvals())
+        if method == 'score':
+            return _first_or_none(self.scores())
+        if method in ('condorcet', 'copeland', 'schulze', 'ranked_pairs'):
+            return pairwise_results(self.pairwise_matrix())[method]
+        raise ValueError("Unknown voting method: " + str(method))
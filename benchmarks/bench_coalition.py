@@ -0,0 +1,161 @@
+# Coalition analysis: the generating-function power indices and the pruned coalition search
+# against counting all 2^n coalitions.
+#
+#       python benchmarks/bench_coalition.py [--sizes 12x650,16x650,20x650,50x650,80x650,120x650,200x1000]
+#                                            [--groups 0] [--brute-max 20] [--exact-max 120] [--repeat 3]
+#
+# Sizes are channelsxseats, with seats split by D'Hondt over random heavy-tailed votes and
+# optionally grouped into --groups languages. dp_s covers coalition.power_indices,
+# minimal_winning_coalitions (capped at COALITION_LIMIT past --brute-max channels) and
+# cheapest_government.
+#
+# reference_s is the check it is compared with. Up to --brute-max channels that is brute force,
+# which scores every bitmask at once with numpy; same then also covers the minimal winning
+# coalitions and the cheapest government's seats. Up to --exact-max channels it is the same
+# generating functions in exact Python ints, taking each channel back out of the full table by
+# subtraction (which float64 cannot do past about 60 channels); same then covers both indices.
+# sums checks that both indices add up to 1 (or are all 0 when no coalition can win).
+
+import argparse
+import math
+import sys
+import time
+from fractions import Fraction
+
+import numpy as np
+
+import common  # puts the repo root on sys.path
+import coalition
+import seats
+
+DEFAULT_SIZES = '12x650,16x650,20x650,50x650,80x650,120x650,200x1000'
+
+
+def brute_force(weights, quota, groups):
+    # (banzhaf, shapley_shubik, minimal winning masks, cheapest government's seats) over all masks.
+    n = len(weights)
+    masks = np.arange(1 << n, dtype=np.int64)
+    bits = (masks[:, None] >> np.arange(n)) & 1
+    labels = sorted(set(groups))
+    in_group = np.array([[g == label for g in groups] for label in labels], dtype=np.int64)
+    group_seats = bits.dot((in_group * weights).T)
+    winning = (group_seats >= quota).any(axis=1)
+    sizes = bits.sum(axis=1)
+    order_weight = np.array([np.exp(np.sum(np.log(np.arange(1, k + 1))) + np.sum(np.log(np.arange(1, n - k)))
+                                    - np.sum(np.log(np.arange(1, n + 1)))) for k in range(n)])
+    swings = np.zeros(n)
+    pivots = np.zeros(n)
+    minimal = winning.copy()
+    for i in range(n):
+        joined = masks[bits[:, i] == 1]
+        without = joined ^ (1 << i)
+        pivotal = winning[joined] & ~winning[without]
+        swings[i] = pivotal.sum()
+        pivots[i] = order_weight[sizes[without][pivotal]].sum()
+        minimal[joined[~pivotal]] = False
+    single_group = (bits.dot(in_group.T) > 0).sum(axis=1) <= 1
+    government = int(bits[winning & single_group].dot(weights).min()) if (winning & single_group).any() else 0
+    banzhaf = swings / swings.sum() if swings.sum() > 0 else swings
+    return banzhaf, pivots, set(int(m) for m in masks[minimal]), government
+
+
+def _multiply(a, b):
+    product = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            product[i + j] += x * y
+    return product
+
+
+def exact_reference(weights, quota, groups):
+    # (banzhaf, shapley_shubik) from generating functions over Python ints.
+    n = len(weights)
+    members = [[i for i in range(n) if groups[i] == label] for label in sorted(set(groups))]
+    tables = []
+    for group in members:
+        table = np.zeros((len(group) + 1, quota), dtype=object)
+        table[0, 0] = 1
+        for i in group:
+            if weights[i] < quota:
+                table[1:, weights[i]:] += table[:-1, :quota-weights[i]].copy()
+        tables.append(table)
+    losing = [list(table.sum(axis=1)) for table in tables]
+    order_weight = [Fraction(math.factorial(k) * math.factorial(n - 1 - k), math.factorial(n)) for k in range(n)]
+    swings = [0] * n
+    pivots = [Fraction(0)] * n
+    for g, group in enumerate(members):
+        others = [1]
+        for h, sizes in enumerate(losing):
+            if h != g:
+                others = _multiply(others, sizes)
+        for i in group:
+            w = int(weights[i])
+            if w == 0:
+                continue
+            rest = tables[g][:-1].copy()
+            if w < quota:
+                for k in range(1, len(rest)):
+                    rest[k, w:] -= rest[k-1, :quota-w]
+            sizes = _multiply(list(rest[:, max(quota - w, 0):].sum(axis=1)), others)
+            swings[i] = sum(sizes)
+            pivots[i] = sum(count * weight for count, weight in zip(sizes, order_weight))
+    total = sum(swings)
+    banzhaf = np.array([float(Fraction(s, total)) if total else 0.0 for s in swings])
+    return banzhaf, np.array([float(p) for p in pivots])
+
+
+def _sums_to_one(index):
+    return bool(np.isclose(index.sum(), 1.0) or not index.any()) and bool((index >= 0).all())
+
+
+def dynamic(weights, quota, groups, limit=None):
+    banzhaf, shapley_shubik = coalition.power_indices(weights, quota, groups)
+    minimal = coalition.minimal_winning_coalitions(weights, quota, groups, limit)
+    government = coalition.cheapest_government(weights, quota, groups)
+    return banzhaf, shapley_shubik, minimal, sum(int(w) for i, w in enumerate(weights) if (government >> i) & 1)
+
+
+def _best(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.time()
+        result = func(*args)
+        best = min(best, time.time() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated channelsxseats')
+    parser.add_argument('--groups', type=int, default=0, help='languages to group the channels into (0: no affinity)')
+    parser.add_argument('--brute-max', type=int, default=20)
+    parser.add_argument('--exact-max', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("%-12s %10s %12s %10s %12s %8s %8s" % ('size', 'dp_s', 'coalitions', 'reference', 'reference_s', 'same', 'sums'))
+    for size in args.sizes.split(','):
+        n_channels, n_seats = [int(n) for n in size.lower().split('x')]
+        rng = np.random.RandomState(args.seed)
+        weights = seats.highest_averages(rng.pareto(1.5, n_channels) + 0.01, n_seats)
+        groups = list(rng.randint(args.groups, size=n_channels)) if args.groups else None
+        quota = coalition.majority_quota(weights)
+        limit = None if n_channels <= args.brute_max else coalition.COALITION_LIMIT
+        dp, dp_result = _best(args.repeat, dynamic, weights, quota, groups, limit)
+        sums = _sums_to_one(dp_result[0]) and _sums_to_one(dp_result[1])
+        if n_channels <= args.brute_max:
+            reference, (seconds, result) = 'brute', _best(args.repeat, brute_force, weights, quota, groups or [0] * n_channels)
+            same = (np.allclose(dp_result[0], result[0]) and np.allclose(dp_result[1], result[1])
+                    and set(dp_result[2]) == result[2] and len(dp_result[2]) == len(result[2]) and dp_result[3] == result[3])
+        elif n_channels <= args.exact_max:
+            reference, (seconds, result) = 'exact', _best(1, exact_reference, weights, quota, groups or [0] * n_channels)
+            same = np.allclose(dp_result[0], result[0]) and np.allclose(dp_result[1], result[1])
+        else:
+            print("%-12s %10.4f %12d %10s %12s %8s %8s" % (size, dp, len(dp_result[2]), '-', '-', '-', sums))
+            continue
+        print("%-12s %10.4f %12d %10s %12.4f %8s %8s" % (size, dp, len(dp_result[2]), reference, seconds, same, sums))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# compare_all's fused pass against running the methods one at a time.
+#
+#       python benchmarks/bench_compare.py [--sizes bundled,8x30x3,12x50x4] [--repeat 3]
+#
+# Every method's winner_* function runs alone on the same built electorate with the pairwise cache
+# cleared first, as it would run in a fresh process; sum_s adds those up and max_s is the slowest
+# one. fused_s is compare_all over all of them, also from a cold cache. The pairwise matrix is the
+# dominant stage, so fused_s should sit near max_s rather than sum_s.
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from common import quiet
+from synthetic import synthetic_electorate
+
+import pairwise
+import pewdie
+from tally import TALLY_METHODS
+
+DEFAULT_SIZES = 'bundled,8x30x3,12x50x4'
+
+
+def _cold(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        pairwise.clear_cache()
+        random.seed(0)
+        np.random.seed(0)
+        start = time.time()
+        func(*args)
+        best = min(best, time.time() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="'bundled' or channelsxcountriesxlanguages, comma separated")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("%-10s %-14s %10s" % ('size', 'method', 'seconds'))
+    for size in args.sizes.split(','):
+        if size == 'bundled':
+            channels, countries = pewdie.channels, pewdie.total_monthly_2016_top_15_countries
+        else:
+            n_channels, n_countries, n_languages = [int(n) for n in size.lower().split('x')]
+            channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, args.seed)
+        electorate, country_data = quiet(pewdie.build_electorate, channels, countries)
+
+        singles = []
+        for method in TALLY_METHODS:
+            seconds = _cold(args.repeat, pewdie.winner_methods[method], electorate, country_data)
+            singles.append(seconds)
+            print("%-10s %-14s %10.4f" % (size, method, seconds))
+        fused = _cold(args.repeat, pewdie.compare_all, electorate, country_data, TALLY_METHODS, args.seed)
+        print("%-10s %-14s %10.4f" % (size, 'sum_s', sum(singles)))
+        print("%-10s %-14s %10.4f" % (size, 'max_s', max(singles)))
+        print("%-10s %-14s %10.4f" % (size, 'fused_s', fused))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
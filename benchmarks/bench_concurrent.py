@@ -0,0 +1,74 @@
+# Methods run back to back against run_concurrently's threads over one read-only electorate.
+#
+#       python benchmarks/bench_concurrent.py [--sizes bundled,10x30x4,20x50x5] [--threads 4] [--seed 0]
+#
+# sequential_s runs every method isolated (own random.Random(seed)) one after another, threaded_s
+# the same set through pewdie.run_concurrently; same says whether every result matched. copied_kb
+# is what the rank-rewriting methods (irv's loop, score) copied on their overlays, against
+# full_copy_kb for the electorate.copy() per run they would need otherwise. The methods are mostly
+# pure-Python loops, so under the GIL threaded_s mainly shows the pool's overhead; the point is that
+# they share one base with no copies and still give the isolated results.
+
+import argparse
+import random
+import sys
+import time
+
+from common import quiet
+from synthetic import synthetic_electorate
+
+import instrument
+import pewdie
+
+DEFAULT_SIZES = 'bundled,10x30x4,20x50x5'
+METHOD_OPTIONS = {'irv': {'transfer': 'ranked_proportional'}}
+
+
+def isolated(electorate, country_data, methods, seed):
+    results = {}
+    for method in methods:
+        options = dict(METHOD_OPTIONS.get(method, {}))
+        if method in pewdie.random_methods:
+            options['rng'] = random.Random(seed)
+        results[method] = pewdie.winner_methods[method](electorate, country_data, **options)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="'bundled' or channelsxcountriesxlanguages, comma separated")
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    methods = sorted(pewdie.winner_methods)
+
+    print("%-10s %12s %12s %6s %10s %14s" % ('size', 'sequential_s', 'threaded_s', 'same', 'copied_kb', 'full_copy_kb'))
+    for size in args.sizes.split(','):
+        if size == 'bundled':
+            channels, countries = pewdie.channels, pewdie.total_monthly_2016_top_15_countries
+        else:
+            n_channels, n_countries, n_languages = [int(n) for n in size.lower().split('x')]
+            channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, args.seed)
+        electorate, country_data = quiet(pewdie.build_electorate, channels, countries)
+        isolated(electorate, country_data, methods, args.seed)      # fills the pairwise cache for both
+
+        start = time.time()
+        expected = isolated(electorate, country_data, methods, args.seed)
+        sequential = time.time() - start
+
+        instrument.enable()
+        instrument.reset()
+        start = time.time()
+        got = pewdie.run_concurrently(electorate, country_data, methods, args.seed, args.threads, METHOD_OPTIONS)
+        threaded = time.time() - start
+        blocks = instrument.report()['counters'].get('overlay_block_copies', 0)
+        instrument.disable()
+
+        same = all(list(expected[m].winners) == list(got[m].winners) for m in methods)
+        block_kb = electorate.n_channels * electorate.n_ranks * 8 / 1024.0
+        full_kb = (electorate.counts.nbytes + electorate.ranks.nbytes) / 1024.0
+        print("%-10s %12.4f %12.4f %6s %10.1f %14.1f" % (size, sequential, threaded, same, blocks * block_kb, 2 * full_kb))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# Float (2-decimal rounding) against whole-voter arithmetic on synthetic electorates.
+#
+#       python benchmarks/bench_exact.py [--sizes 5x15x3,10x50x5,15x60x6] [--repeat 3] [--seed 0]
+#
+# For each size and stage: best wall time, the random numbers drawn (every pass of the elimination
+# and rank-subtraction loops draws, so this tracks their iterations) and the drift, the largest
+# gap in voters between what a channel's rank row adds up to and the votes it should hold:
+# the country's first preferences for the ranked distribution, its useful population for score
+# ballots. The exact stages keep every row whole; the float ones lose or gain hundredths.
+
+import argparse
+import cProfile
+import pstats
+import random
+import sys
+import time
+
+import numpy as np
+
+from common import quiet
+from synthetic import synthetic_electorate
+
+import exact
+import pewdie
+
+DEFAULT_SIZES = '5x15x3,10x50x5,15x60x6'
+
+
+def _ranked(electorate, country_data, solver):
+    ranked = electorate.copy()
+    pewdie.votes_distribution_ranked_voting(ranked, country_data, solver)
+    return ranked
+
+
+def drift(electorate, country_data, expected):
+    # Largest gap between a channel's rank row total and what it should be (`expected` per country).
+    country_indices = [electorate.country(c['country']) for c in country_data]
+    rows = electorate.ranks[:, country_indices].sum(axis=2)
+    return float(np.abs(rows - np.asarray(expected)[None, :]).max()) * exact.SCALE if len(country_indices) else 0.0
+
+
+def stages(electorate, country_data):
+    # (name, arithmetic, run, expected) where run() returns the electorate whose rank rows should
+    # add up to `expected` per country, or None.
+    float_ranked = _ranked(electorate, country_data, 'batched')
+    exact_ranked = _ranked(electorate, country_data, 'exact')
+
+    def irv(ranked, arithmetic):
+        def run():
+            pewdie.winner_irv(ranked, country_data, 'loop', arithmetic)
+        return run
+
+    def score(arithmetic):
+        def run():
+            ballots = electorate.overlay()
+            pewdie.winner_score_voting(electorate, country_data, arithmetic, overlay=ballots)
+            return ballots.materialize()
+        return run
+
+    totals = electorate.counts[:, [electorate.country(c['country']) for c in country_data]].sum(axis=0)
+    populations = [c['useful_count'] for c in country_data]
+    yield 'votes_distribution_ranked_voting', 'float', lambda: _ranked(electorate, country_data, 'batched'), totals
+    yield 'votes_distribution_ranked_voting', 'exact', lambda: _ranked(electorate, country_data, 'exact'), totals
+    yield 'winner_irv loop', 'float', irv(float_ranked, 'float'), None
+    yield 'winner_irv loop', 'exact', irv(exact_ranked, 'exact'), None
+    yield 'winner_score_voting', 'float', score('float'), populations
+    yield 'winner_score_voting', 'exact', score('exact'), populations
+
+
+def _seeded(run, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    return run()
+
+
+def draws(run, seed):
+    # Calls into the generator behind `random` (random() on Python 2, getrandbits() too on 3).
+    profile = cProfile.Profile()
+    quiet(profile.runcall, _seeded, run, seed)
+    return sum(calls for (filename, line, name), (calls, _, _, _, _) in pstats.Stats(profile).stats.items()
+               if "of '_random.Random' objects" in name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated channelsxcountriesxlanguages')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("%-10s %-34s %-6s %10s %12s %10s" % ('size', 'stage', 'mode', 'seconds', 'draws', 'drift'))
+    for size in args.sizes.split(','):
+        n_channels, n_countries, n_languages = [int(n) for n in size.lower().split('x')]
+        channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, args.seed)
+        electorate, country_data = quiet(pewdie.build_electorate, channels, countries, False)
+        for name, arithmetic, run, expected in stages(electorate, country_data):
+            best = float('inf')
+            for _ in range(args.repeat):
+                random.seed(args.seed)
+                np.random.seed(args.seed)
+                start = time.time()
+                checked = run()
+                best = min(best, time.time() - start)
+            gap = '%10.0f' % drift(checked, country_data, expected) if checked is not None else '%10s' % '-'
+            print("%-10s %-34s %-6s %10.4f %12d %s" % (size, name, arithmetic, best, draws(run, args.seed), gap))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# The live feed under bursts: readings in, re-tallies out, and how late the event loop runs.
+#
+#       python3 benchmarks/bench_live.py [--rates 1000,10000,50000] [--seconds 3] [--tick 0.5]
+#                                        [--size 200x100x8] [--source submit|http|tail]
+#
+# A producer pushes `rate` readings per second for random channels, either straight into
+# LiveService.submit, through a local stub HTTP server the service polls every 50ms, or appended
+# to a JSON Lines file it tails. retallies should stay at about seconds / tick whatever the rate;
+# retally_ms is the mean worker time per re-tally and lag_ms the worst delay of a 10ms heartbeat on
+# the event loop, which stays small because re-tallies run off the loop. Python 3 only.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+
+from synthetic import synthetic_electorate
+
+import live
+from tracker import LiveTally
+
+DEFAULT_RATES = '1000,10000,50000'
+POLL = 0.05
+
+
+class StubFeed(object):
+    # Latest subs per channel, served as one JSON mapping to every GET.
+
+    def __init__(self):
+        self.subs = {}
+
+    async def handle(self, reader, writer):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:             # the service was cancelled mid-request
+            writer.close()
+            return
+        body = json.dumps(self.subs).encode('utf-8')
+        writer.write(b'HTTP/1.0 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+        await writer.drain()
+        writer.close()
+
+
+async def _heartbeat(lags):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(0.01)
+        lags.append(loop.time() - start - 0.01)
+
+
+async def _produce(push, channels, rate, seconds, seed):
+    # `rate` readings per second in 10ms batches.
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    while loop.time() < end:
+        for _ in range(max(1, rate // 100)):
+            channel_obj = rng.choice(channels)
+            push(channel_obj['name'], channel_obj['subs'] + rng.randint(-50000, 200000))
+        await asyncio.sleep(0.01)
+
+
+async def _drain(queue, results):
+    while True:
+        results.append(await queue.get())
+
+
+async def _run(source, channels, countries, rate, seconds, tick, seed):
+    sources, cleanup = [], []
+    if source == 'submit':
+        service = live.LiveService(LiveTally(channels, countries), tick=tick)
+        push = service.submit
+    elif source == 'http':
+        feed = StubFeed()
+        server = await asyncio.start_server(feed.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        service = live.LiveService(LiveTally(channels, countries), [live.HTTPSource('http://127.0.0.1:%d/subs' % port, POLL)], tick=tick)
+        push = feed.subs.__setitem__
+        cleanup.append(server.close)
+    else:
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        stream = os.fdopen(handle, 'w')
+        service = live.LiveService(LiveTally(channels, countries), [live.FileTailSource(path, POLL)], tick=tick)
+
+        def push(name, subs):
+            stream.write(json.dumps({'name': name, 'subs': subs}) + '\n')
+            stream.flush()
+        cleanup.extend([stream.close, lambda: os.remove(path)])
+
+    lags, results = [], []
+    helpers = [asyncio.ensure_future(_heartbeat(lags)), asyncio.ensure_future(_drain(service.results, results))]
+    runner = asyncio.ensure_future(service.run())
+    await _produce(push, channels, rate, seconds, seed)
+    await asyncio.sleep(tick + 2 * POLL)
+    for task in [runner] + helpers:
+        task.cancel()
+    await asyncio.gather(runner, *helpers, return_exceptions=True)
+    service.close()
+    for step in cleanup:
+        step()
+    return service, results, lags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rates', default=DEFAULT_RATES, help='comma separated readings per second')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--tick', type=float, default=0.5)
+    parser.add_argument('--size', default='200x100x8', help='channelsxcountriesxlanguages')
+    parser.add_argument('--source', default='submit', choices=('submit', 'http', 'tail'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    n_channels, n_countries, n_languages = [int(n) for n in args.size.lower().split('x')]
+    channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, args.seed)
+    print("%10s %10s %10s %10s %10s %12s %10s" % ('rate', 'readings', 'ticks', 'retallies', 'applied', 'retally_ms', 'lag_ms'))
+    for rate in [int(r) for r in args.rates.split(',')]:
+        service, results, lags = asyncio.run(_run(args.source, channels, countries, rate, args.seconds, args.tick, args.seed))
+        applied = sum(result.applied for result in results)
+        retally_ms = 1000 * service.retally_seconds / max(service.retallies, 1)
+        print("%10d %10d %10d %10d %10d %12.2f %10.2f" % (rate, service.coalescer.received, service.ticks, service.retallies,
+                                                            applied, retally_ms, 1000 * max(lags or [0])))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
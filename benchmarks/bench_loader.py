@@ -0,0 +1,77 @@
+# Load time and peak memory of loader.load_electorate against input size.
+#
+#       python benchmarks/bench_loader.py [--format csv|jsonl] [--sizes 1000,10000,50000]
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from common import measure
+
+import loader
+
+LANGUAGES = ['L%02d' % i for i in range(20)]
+
+
+def write_dataset(directory, file_format, n_countries, n_channels, seed=0):
+    rng = random.Random(seed)
+    countries_path = os.path.join(directory, 'countries.' + file_format)
+    channels_path = os.path.join(directory, 'channels.' + file_format)
+    country_names = ['C%04d' % k for k in range(n_countries)]
+
+    with open(countries_path, 'w') as handle:
+        if file_format == 'csv':
+            writer = csv.writer(handle)
+            writer.writerow(['country', 'count'] + LANGUAGES)
+            for name in country_names:
+                writer.writerow([name, round(rng.uniform(1, 200), 1)] + [round(rng.uniform(0, 100), 2) for _ in LANGUAGES])
+        else:
+            for name in country_names:
+                row = {'country': name, 'count': round(rng.uniform(1, 200), 1),
+                       'languages': dict((language, round(rng.uniform(0, 100), 2)) for language in LANGUAGES)}
+                handle.write(json.dumps(row) + '\n')
+
+    with open(channels_path, 'w') as handle:
+        if file_format == 'csv':
+            writer = csv.writer(handle)
+            writer.writerow(['name', 'country', 'language', 'subs'])
+        for i in range(n_channels):
+            row = ['channel-%06d' % i, rng.choice(country_names), rng.choice(LANGUAGES), float(rng.randint(1000, 90000000))]
+            if file_format == 'csv':
+                writer.writerow(row)
+            else:
+                handle.write(json.dumps(dict(zip(loader.CHANNEL_FIELDS, row))) + '\n')
+    return countries_path, channels_path
+
+
+def _load(countries_path, channels_path):
+    loader.load_electorate(countries_path, channels_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--format', default='csv', choices=['csv', 'jsonl'])
+    parser.add_argument('--countries', type=int, default=200)
+    parser.add_argument('--sizes', default='1000,5000,20000,50000', help='comma separated channel counts')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='pewdie-bench-')
+    try:
+        print("format=%s countries=%d" % (args.format, args.countries))
+        print("%10s %12s %10s %14s" % ('channels', 'bytes', 'seconds', 'peak_memory_kb'))
+        for n_channels in [int(size) for size in args.sizes.split(',')]:
+            countries_path, channels_path = write_dataset(directory, args.format, args.countries, n_channels)
+            size = os.path.getsize(countries_path) + os.path.getsize(channels_path)
+            seconds, peak = measure(_load, countries_path, channels_path)
+            print("%10d %12d %10.3f %14d" % (n_channels, size, seconds, peak // 1024))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
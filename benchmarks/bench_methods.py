@@ -0,0 +1,157 @@
+# Wall time, peak memory and function-call counts of every distribution and winner function on
+# synthetic electorates of growing size, optionally written as JSON for comparing commits.
+#
+#       python benchmarks/bench_methods.py [--sizes 5x15x3,10x50x5,15x60x6] [--repeat 3]
+#                                          [--output results.json] [--baseline previous.json]
+#
+# A size is channels x countries x languages. Each stage runs on a fresh copy of its inputs, with
+# the shaping and pairwise caches cleared, so repeats measure the uncached work.
+
+import argparse
+import cProfile
+import json
+import platform
+import pstats
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from common import REPO, measure, quiet
+from synthetic import synthetic_electorate
+
+import pairwise
+import pewdie
+from electorate import Electorate
+
+DEFAULT_SIZES = '5x15x3,10x50x5,15x60x6'
+
+
+def _shape(channels, countries):
+    pewdie.population_shaper.clear()
+    return pewdie.shapeCountryPopulationDataAccordingToLanguages_Attempt2(channels, countries)
+
+
+def _winner(func):
+    def run(electorate, countries):
+        pairwise.clear_cache()
+        return func(electorate, countries)
+    run.__name__ = func.__name__
+    return run
+
+
+def stages(channels, countries):
+    # (name, prepare, run) triples: run(*prepare()) is the measured call.
+    shaped = quiet(pewdie.shapeCountryPopulationDataAccordingToLanguages_Attempt2, channels, countries)
+    first_preferences = Electorate(channels, countries)
+    quiet(pewdie.votes_distribution_fptp, first_preferences, shaped)
+    ranked = first_preferences.copy()
+    quiet(pewdie.votes_distribution_ranked_voting, ranked, shaped)
+
+    def fresh(electorate=None):
+        if electorate is None:
+            return lambda: (Electorate(channels, countries), shaped)
+        return lambda: (electorate.copy(), shaped)
+
+    yield 'shape', lambda: (channels, countries), _shape
+    yield 'votes_distribution_fptp', fresh(), pewdie.votes_distribution_fptp
+    yield 'votes_distribution_ranked_voting', fresh(first_preferences), pewdie.votes_distribution_ranked_voting
+    yield 'votes_distribution_exclusive', fresh(), pewdie.votes_distribution_exclusive
+    for method in ('fptp', 'approval', 'score'):
+        yield 'winner_' + method, fresh(first_preferences), _winner(pewdie.winner_methods[method])
+    for method in ('irv', 'borda', 'condorcet', 'copeland', 'schulze', 'ranked_pairs'):
+        yield 'winner_' + method, fresh(ranked), _winner(pewdie.winner_methods[method])
+
+
+def _seeded(prepare, seed):
+    def seeded_prepare():
+        random.seed(seed)
+        np.random.seed(seed)
+        return prepare()
+    return seeded_prepare
+
+
+def best_time(prepare, run, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        args = prepare()
+        start = time.time()
+        quiet(run, *args)
+        best = min(best, time.time() - start)
+    return best
+
+
+def call_count(prepare, run):
+    args = prepare()
+    profile = cProfile.Profile()
+    quiet(profile.runcall, run, *args)
+    return pstats.Stats(profile).total_calls
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_size(size):
+    n_channels, n_countries, n_languages = [int(n) for n in size.lower().split('x')]
+    return n_channels, n_countries, n_languages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated channelsxcountriesxlanguages')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', help='comma separated stage names (default: all)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare wall times against')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as handle:
+            for row in json.load(handle)['results']:
+                baseline[(row['channels'], row['countries'], row['languages'], row['stage'])] = row['seconds']
+
+    selected = set(args.stages.split(',')) if args.stages else None
+    results = []
+    print("%-10s %-34s %10s %14s %10s %8s" % ('size', 'stage', 'seconds', 'peak_memory_kb', 'calls', 'vs_base'))
+    for size in args.sizes.split(','):
+        n_channels, n_countries, n_languages = _parse_size(size)
+        channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, args.seed)
+        for name, prepare, run in stages(channels, countries):
+            if selected is not None and name not in selected:
+                continue
+            prepare = _seeded(prepare, args.seed)
+            seconds = best_time(prepare, run, args.repeat)
+            peak = measure(quiet, prepare=lambda: (run,) + tuple(prepare()))[1]
+            calls = call_count(prepare, run)
+            row = {'channels': n_channels, 'countries': n_countries, 'languages': n_languages, 'seed': args.seed,
+                   'stage': name, 'seconds': seconds, 'peak_bytes': peak, 'calls': calls}
+            results.append(row)
+
+            previous = baseline.get((n_channels, n_countries, n_languages, name))
+            ratio = '%7.2fx' % (seconds / previous) if previous else '-'
+            print("%-10s %-34s %10.4f %14d %10d %8s" % (size, name, seconds, peak // 1024, calls, ratio))
+
+    if args.output:
+        report = {
+            'commit': _commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'results': results,
+        }
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# Snapshots per second: replay.replay over a whole (time, channel) series against re-running the
+# per-snapshot pipeline (build_electorate and a winner_* function) once per row.
+#
+#       python benchmarks/bench_replay.py [--snapshots 2000] [--loop-snapshots 50] [--sizes bundled,20x50x4]
+#
+# The series is a random walk of every channel's subs from its starting count. loop_per_s times the
+# per-snapshot pipeline on the first --loop-snapshots rows only; same counts how many of those rows
+# got the same winners from both (fptp and score draw differently, see replay.py). Borda on the
+# synthetic sizes replays --loop-snapshots rows too, since the batched rank solver dominates.
+
+import argparse
+import copy
+import sys
+import time
+
+import numpy as np
+
+from common import quiet
+from synthetic import synthetic_electorate
+
+import pewdie
+import replay
+
+DEFAULT_SIZES = 'bundled,20x50x4'
+
+
+def random_walk(channels, n_snapshots, seed=0):
+    rng = np.random.RandomState(seed)
+    start = np.array([channel_obj['subs'] for channel_obj in channels], dtype=float)
+    steps = rng.normal(0.002, 0.01, size=(n_snapshots, len(channels)))
+    return np.round(start * np.exp(np.cumsum(steps, axis=0)))
+
+
+def loop_winners(method, subs, channels, countries):
+    winners = []
+    for row in subs:
+        snapshot_channels = copy.deepcopy(channels)
+        for channel_obj, channel_subs in zip(snapshot_channels, row):
+            channel_obj['subs'] = channel_subs
+        electorate, country_data = pewdie.build_electorate(snapshot_channels, countries, ranked=method in pewdie.ranked_methods)
+        winners.append(pewdie.winner_methods[method](electorate, country_data).winners)
+    return np.array(winners)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--snapshots', type=int, default=2000)
+    parser.add_argument('--loop-snapshots', type=int, default=50)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="'bundled' or channelsxcountriesxlanguages, comma separated")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("%-10s %-7s %12s %12s %10s" % ('size', 'method', 'replay_per_s', 'loop_per_s', 'same'))
+    for size in args.sizes.split(','):
+        if size == 'bundled':
+            channels, countries = pewdie.channels, pewdie.total_monthly_2016_top_15_countries
+        else:
+            n_channels, n_countries, n_languages = [int(n) for n in size.lower().split('x')]
+            channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, args.seed)
+        subs = random_walk(channels, args.snapshots, args.seed)
+        for method in replay.REPLAY_METHODS:
+            n_replay = args.snapshots if method != 'borda' or size == 'bundled' else args.loop_snapshots
+            start = time.time()
+            result = replay.replay(subs[:n_replay], channels, countries, (method,), args.seed)
+            replay_rate = n_replay / (time.time() - start)
+
+            n_loop = min(args.loop_snapshots, n_replay)
+            start = time.time()
+            winners = quiet(loop_winners, method, subs[:n_loop], channels, countries)
+            loop_rate = n_loop / (time.time() - start)
+            same = int((winners == result['winners'][:n_loop, 0]).all(axis=1).sum())
+            print("%-10s %-7s %12.0f %12.1f %7d/%-3d" % (size, method, replay_rate, loop_rate, same, n_loop))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# Seat allocation at parliament scale: the heap quotient allocator against rescanning every channel
+# for every seat.
+#
+#       python benchmarks/bench_seats.py [--sizes 650x15,2000x100,5000x500,20000x1000] [--repeat 3]
+#
+# Sizes are seatsxchannels over one country's random first-preference votes. heap_s is
+# seats.highest_averages (O(channels + seats log channels)), scan_s the argmax-per-seat loop
+# (O(seats * channels)); both must give the same seats. largest_remainder_s is for scale.
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import common  # puts the repo root on sys.path
+import seats
+
+DEFAULT_SIZES = '650x15,2000x100,5000x500,20000x1000'
+
+
+def scan_allocation(votes, n_seats, method='dhondt'):
+    divisor = seats.DIVISORS[method]
+    votes = np.asarray(votes, dtype=float)
+    won = np.zeros(len(votes), dtype=np.int64)
+    for _ in range(n_seats):
+        won[int((votes / divisor(won)).argmax())] += 1
+    return won
+
+
+def _best(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.time()
+        result = func(*args)
+        best = min(best, time.time() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated seatsxchannels')
+    parser.add_argument('--method', default='dhondt', choices=sorted(seats.DIVISORS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("%-12s %10s %10s %20s %8s" % ('size', 'heap_s', 'scan_s', 'largest_remainder_s', 'same'))
+    for size in args.sizes.split(','):
+        n_seats, n_channels = [int(n) for n in size.lower().split('x')]
+        votes = np.random.RandomState(args.seed).pareto(1.5, n_channels) + 0.01
+        heap, heap_seats = _best(args.repeat, seats.highest_averages, votes, n_seats, args.method)
+        scan, scan_seats = _best(args.repeat, scan_allocation, votes, n_seats, args.method)
+        remainder, _ = _best(args.repeat, seats.largest_remainder, votes, n_seats)
+        same = bool((heap_seats == scan_seats).all())
+        print("%-12s %10.4f %10.4f %20.4f %8s" % (size, heap, scan, remainder, same))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
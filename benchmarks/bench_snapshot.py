@@ -0,0 +1,67 @@
+# Building a ranked electorate against mapping its snapshot, and what each costs to ship to a pool.
+#
+#       python benchmarks/bench_snapshot.py [--sizes 5x15x3,10x50x5,20x100x6,40x100x8] [--repeat 3]
+#
+# build_s is build_electorate with the shaping cache cleared, load_s load_snapshot of the same
+# inputs (meta.json parse plus two .npy maps) and first_s the first method run on the mapped
+# tensors, which pages them in. pickled_kb is what a pool worker receives for the built electorate
+# and for the snapshot-backed one.
+
+import argparse
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+from common import quiet
+from synthetic import synthetic_electorate
+
+import pewdie
+import snapshot
+
+DEFAULT_SIZES = '5x15x3,10x50x5,20x100x6,40x100x8'
+
+
+def _best(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.time()
+        result = func(*args)
+        best = min(best, time.time() - start)
+    return best, result
+
+
+def _build(channels, countries):
+    pewdie.population_shaper.clear()
+    return pewdie.build_electorate(channels, countries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated channelsxcountriesxlanguages')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='pewdie-snapshots-')
+    try:
+        print("%-10s %10s %10s %10s %14s %14s" % ('size', 'build_s', 'load_s', 'first_s', 'built_kb', 'mapped_kb'))
+        for size in args.sizes.split(','):
+            n_channels, n_countries, n_languages = [int(n) for n in size.lower().split('x')]
+            channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, args.seed)
+            build, (electorate, country_data) = _best(args.repeat, quiet, _build, channels, countries)
+            path = snapshot.snapshot_path(directory, channels, countries)
+            snapshot.save_snapshot(path, channels, countries, electorate, country_data)
+
+            load, (mapped, mapped_data) = _best(args.repeat, snapshot.load_snapshot, path)
+            first, _ = _best(1, pewdie.winner_ranked_borda_count, mapped, mapped_data)
+            built_kb = len(pickle.dumps(electorate, 2)) // 1024
+            mapped_kb = len(pickle.dumps(mapped, 2)) // 1024
+            print("%-10s %10.4f %10.4f %10.4f %14d %14d" % (size, build, load, first, built_kb, mapped_kb))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# Cold-start cost of importing pewdie in a fresh interpreter, next to what it builds on.
+#
+#       python benchmarks/bench_startup.py [--repeat 10]
+
+import argparse
+import subprocess
+import sys
+import time
+
+from common import REPO
+
+SNIPPETS = [
+    ('interpreter', 'pass'),
+    ('import numpy', 'import numpy'),
+    ('import scipy.optimize', 'import scipy.optimize'),
+    ('import pewdie', 'import pewdie'),
+    ('import pewdie (scipy loaded?)', "import pewdie, sys; assert 'scipy' not in sys.modules"),
+    ('run_election fptp', "import os, sys; sys.stdout = open(os.devnull, 'w'); import pewdie; pewdie.run_election('fptp')"),
+    ('run_election borda', "import pewdie; pewdie.run_election('borda')"),
+    # the first repeat writes the snapshot, the rest map it
+    ('run_election borda (snapshot)', "import os, tempfile, pewdie; pewdie.run_election('borda', snapshots=os.path.join(tempfile.gettempdir(), 'pewdie-bench-snapshots'))"),
+]
+
+
+def cold_start(code, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code], cwd=REPO)
+        timings.append(time.time() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print("%-32s %12s" % ('snippet', 'median_ms'))
+    for label, code in SNIPPETS:
+        try:
+            print("%-32s %12.1f" % (label, cold_start(code, args.repeat) * 1000))
+        except subprocess.CalledProcessError:
+            print("%-32s %12s" % (label, 'failed'))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
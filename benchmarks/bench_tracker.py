@@ -0,0 +1,54 @@
+# Per-update latency of tracker.LiveTally.update_subs on the bundled data and on larger electorates
+# made by replicating the bundled countries.
+#
+#       python benchmarks/bench_tracker.py [--updates 2000] [--countries 15,200]
+
+import argparse
+import random
+import sys
+import time
+
+import common  # puts the repo root on sys.path
+
+import pewdie
+from tracker import LiveTally
+
+
+def replicate_countries(countries, n_countries, seed=0):
+    rng = random.Random(seed)
+    replicated = []
+    for k in range(n_countries):
+        template = countries[k % len(countries)]
+        replicated.append({
+            'country': '%s-%d' % (template['country'], k // len(countries)) if k >= len(countries) else template['country'],
+            'languages': dict(template['languages']),
+            'count': round(template['count'] * rng.uniform(0.5, 1.5), 1),
+        })
+    return replicated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--countries', default='15,200')
+    args = parser.parse_args(argv)
+
+    print("%10s %10s %14s %14s" % ('countries', 'updates', 'mean_us', 'p99_us'))
+    for n_countries in [int(n) for n in args.countries.split(',')]:
+        countries = replicate_countries(pewdie.total_monthly_2016_top_15_countries, n_countries)
+        tally = LiveTally(pewdie.channels, countries)
+        rng = random.Random(1)
+        latencies = []
+        for _ in range(args.updates):
+            channel_obj = rng.choice(tally.channels)
+            new_subs = channel_obj['subs'] + rng.randint(-5000, 20000)
+            start = time.time()
+            tally.update_subs(channel_obj['name'], new_subs)
+            latencies.append(time.time() - start)
+        latencies.sort()
+        print("%10d %10d %14.1f %14.1f" % (n_countries, args.updates, 1e6 * sum(latencies) / len(latencies),
+                                           1e6 * latencies[int(0.99 * (len(latencies) - 1))]))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# Per-run latency of the rank-preserving IRV loop: distributeEliminatedChannelsVotes against the
+# bounded transfers of transfers.py, over many seeds so the tail shows.
+#
+#       python benchmarks/bench_transfers.py [--sizes bundled,5x15x3,10x50x5] [--runs 50] [--timeout 2]
+#
+# Every run is winner_irv on the same ranked electorate with a different seed. The loop's time
+# depends on how often its random proposals miss; on the bundled data some seeds never finish, so
+# runs are cut off after --timeout seconds (Unix only), counted in `timeouts` and taken at the
+# timeout in the percentiles. The bounded engines do a fixed amount of work per elimination, so
+# their p99/max stay close to their median.
+
+import argparse
+import random
+import signal
+import sys
+import time
+
+import numpy as np
+
+from common import quiet
+from synthetic import synthetic_electorate
+
+import pewdie
+
+DEFAULT_SIZES = 'bundled,5x15x3,10x50x5'
+TRANSFERS = ('loop', 'ranked_random', 'ranked_proportional')
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _expire(signum, frame):
+    raise _Timeout()
+
+
+def latencies(electorate, country_data, transfer, runs, seed, timeout):
+    # (seconds per run, runs cut off at the timeout).
+    seconds = []
+    timeouts = 0
+    signal.signal(signal.SIGALRM, _expire)
+    for run in range(runs):
+        random.seed((seed << 32) | run)
+        np.random.seed(((seed << 32) | run) % (2 ** 32))
+        start = time.time()
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            pewdie.winner_irv(electorate, country_data, transfer)
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        except _Timeout:
+            timeouts += 1
+        seconds.append(time.time() - start)
+    return np.array(seconds), timeouts
+
+
+def electorate_for(size, seed):
+    if size == 'bundled':
+        return pewdie.build_electorate(pewdie.channels, pewdie.total_monthly_2016_top_15_countries)
+    n_channels, n_countries, n_languages = [int(n) for n in size.lower().split('x')]
+    channels, countries = synthetic_electorate(n_channels, n_countries, n_languages, seed)
+    return quiet(pewdie.build_electorate, channels, countries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma separated channelsxcountriesxlanguages or 'bundled'")
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=2.0, help='seconds before a run is cut off')
+    parser.add_argument('--transfers', default=','.join(TRANSFERS))
+    args = parser.parse_args(argv)
+
+    print("%-10s %-20s %10s %10s %10s %10s %10s %9s" % ('size', 'transfer', 'mean_s', 'p50_s', 'p95_s', 'p99_s', 'max_s', 'timeouts'))
+    for size in args.sizes.split(','):
+        electorate, country_data = electorate_for(size, args.seed)
+        for transfer in args.transfers.split(','):
+            seconds, timeouts = latencies(electorate, country_data, transfer, args.runs, args.seed, args.timeout)
+            p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+            print("%-10s %-20s %10.4f %10.4f %10.4f %10.4f %10.4f %9d" % (size, transfer, seconds.mean(), p50, p95, p99, seconds.max(), timeouts))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
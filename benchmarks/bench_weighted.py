@@ -0,0 +1,62 @@
+# Weighted-ballot IRV, Borda and Schulze against the rank-bucket path as channels grow.
+#
+#       python benchmarks/bench_weighted.py [--channels 5,10,20,40,60] [--countries 50] [--bucket-max 10]
+#
+# The rank-bucket columns include votes_distribution_ranked_voting, which the weighted path does not
+# need; they are only run up to --bucket-max channels since the pairwise matrix grows with channels^4.
+
+import argparse
+import sys
+import time
+
+from common import best_of, quiet
+from synthetic import synthetic_electorate
+
+import pairwise
+import pewdie
+from weighted import WeightedBallots
+
+METHODS = ('irv', 'borda', 'schulze')
+
+
+def _bucket_run(channels, countries, method):
+    pairwise.clear_cache()
+    pewdie.run_election(method, channels, countries)
+
+
+def _weighted_run(electorate, country_indices, method):
+    WeightedBallots.from_electorate(electorate, country_indices).winners(method)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--channels', default='5,10,20,40,60')
+    parser.add_argument('--countries', type=int, default=50)
+    parser.add_argument('--languages', type=int, default=5)
+    parser.add_argument('--bucket-max', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print("%9s %10s %14s %14s %10s %12s %12s" % ('channels', 'rankings', 'weighted_kb', 'ranks_kb', 'method', 'weighted_s', 'buckets_s'))
+    for n_channels in [int(n) for n in args.channels.split(',')]:
+        channels, countries = synthetic_electorate(n_channels, args.countries, min(args.languages, n_channels), 0)
+        electorate, useful_country_data = quiet(pewdie.build_electorate, channels, countries, False)
+        country_indices = [electorate.country(c['country']) for c in useful_country_data]
+
+        start = time.time()
+        ballots = WeightedBallots.from_electorate(electorate, country_indices)
+        build = time.time() - start
+        weighted_kb = (ballots.rankings.nbytes + ballots.weights.nbytes + ballots.countries.nbytes) // 1024
+        ranks_kb = n_channels * args.countries * n_channels * 8 // 1024
+        print("%9d %10d %14d %14d %10s %12.4f %12s" % (n_channels, len(ballots), weighted_kb, ranks_kb, 'build', build, '-'))
+
+        for method in METHODS:
+            weighted = best_of(args.repeat, _weighted_run, electorate, country_indices, method)
+            buckets = '-'
+            if n_channels <= args.bucket_max:
+                buckets = '%12.4f' % best_of(args.repeat, quiet, _bucket_run, channels, countries, method)
+            print("%9d %10s %14s %14s %10s %12.4f %12s" % (n_channels, '', '', '', method, weighted, buckets))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# Shared helpers for the benchmark scripts: repo imports, timing and peak-memory measurement.
+
+import multiprocessing
+import os
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+try:
+    import tracemalloc
+except ImportError:                                 # Python 2
+    tracemalloc = None
+    import resource
+
+
+def _measure_child(queue, func, args, prepare):
+    if prepare is not None:
+        args = prepare()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    else:
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    func(*args)
+    seconds = time.time() - start
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+    else:
+        peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    queue.put((seconds, peak))
+
+
+def measure(func, *args, **options):
+    # (wall seconds, peak bytes) of func(*args), run in a fresh child process so peaks don't mix.
+    # Peak memory is tracemalloc's peak where available, else the growth of the child's max RSS.
+    # With prepare=callable, the child calls it first (untimed, untraced) and uses its result as args.
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_measure_child, args=(queue, func, args, options.get('prepare')))
+    child.start()
+    seconds, peak = queue.get()
+    child.join()
+    return seconds, peak
+
+
+def best_of(repeat, func, *args):
+    # Fastest wall time of `repeat` in-process calls.
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.time()
+        func(*args)
+        best = min(best, time.time() - start)
+    return best
+
+
+def quiet(func, *args, **kwargs):
+    # Call func with stdout discarded (the legacy print helpers and the CLI print as they go).
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
@@ -0,0 +1,52 @@
+# Seeded synthetic electorates shaped like pewdie's bundled data, for benchmarks.
+#
+# Every country gets a share for every language (some of them 0, like Japan's), every language gets
+# at least one channel and at least one country that speaks it, so the shaping and distribution
+# stages never divide by zero. Channels live in one of the generated countries.
+
+import random
+
+import common  # puts the repo root on sys.path
+
+
+def language_names(n_languages):
+    return ['L%02d' % l for l in range(n_languages)]
+
+
+def synthetic_countries(n_countries, n_languages, seed=0):
+    rng = random.Random(seed)
+    languages = language_names(n_languages)
+    countries = []
+    for k in range(n_countries):
+        weights = [rng.random() if rng.random() < 0.6 else 0.0 for _ in languages]
+        weights[k % n_languages] += 1.0
+        spoken = rng.uniform(50, 100)
+        total = sum(weights)
+        countries.append({
+            'country': 'C%04d' % k,
+            'languages': dict((language, round(spoken * w / total, 2)) for language, w in zip(languages, weights)),
+            'count': round(rng.uniform(5, 170), 1),
+        })
+    return countries
+
+
+def synthetic_channels(n_channels, countries, n_languages, seed=0):
+    rng = random.Random(seed + 1)
+    languages = language_names(n_languages)
+    channels = []
+    for i in range(n_channels):
+        channels.append({
+            'name': 'channel-%04d' % i,
+            'country': rng.choice(countries)['country'],
+            'language': languages[i % n_languages] if i < n_languages else rng.choice(languages),
+            'subs': float(rng.randint(1000000, 90000000)),
+        })
+    return channels
+
+
+def synthetic_electorate(n_channels, n_countries, n_languages, seed=0):
+    # Returns (channels, countries) in the format of pewdie.channels / total_monthly_2016_top_15_countries.
+    if n_languages > min(n_channels, n_countries):
+        raise ValueError("need at least as many channels and countries as languages")
+    countries = synthetic_countries(n_countries, n_languages, seed)
+    return synthetic_channels(n_channels, countries, n_languages, seed), countries
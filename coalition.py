@@ -0,0 +1,188 @@
+# Government formation over a seat vector: which channels can govern together, and how much each
+# channel's seats are worth.
+#
+# A coalition is a set of channels held as a bitmask int (bit i for channel i). It wins when its
+# seats reach the quota, a strict majority by default. A channel is pivotal for a losing coalition
+# that its seats turn into a winning one, and the power indices count how often that happens:
+#
+#       banzhaf           swings (the coalitions of the other channels a channel is pivotal for),
+#                         normalised to sum to 1
+#       shapley_shubik    the share of the n! orderings of the channels in which a channel is the
+#                         one that takes the running total to the quota
+#
+# Counting coalitions one at a time is 2^n work. Both indices are read off generating functions
+# over seat counts instead: table[k, w] counts the coalitions of k channels holding w < quota
+# seats, built one channel at a time. Every channel needs the table of all the others. Dividing its
+# factor back out of the full table subtracts huge counts from each other and cancels to noise past
+# about 60 channels. So the tables are built by divide and conquer instead: each half of the
+# channels gets the table of everything outside it, and the halves recurse down to one channel.
+# That only ever adds counts, costs O(n log n) channel additions of O(n * quota) each, and stays
+# accurate to float64 rounding for as long as 2^n fits in a float64 (about 1000 channels).
+#
+# Language affinity: with groups (a label per channel, such as its 'language') only channels
+# sharing a label may govern together. The game is then won by any coalition holding a quota
+# within one group, and a channel can only be pivotal through its own group.
+#
+# cheapest_government() is the winning coalition with the fewest seats, so every member is needed.
+# It comes from a subset sum over bitmasks of reachable seat totals.
+
+import math
+
+import numpy as np
+
+import instrument
+from results import CoalitionResult
+
+COALITION_LIMIT = 100
+
+
+def majority_quota(seats):
+    return int(np.sum(seats)) // 2 + 1
+
+
+def _prepare(seats, quota, groups):
+    # (seats, quota, [[channel index, ...] per group]), groups in order of first appearance.
+    seats = np.asarray(seats, dtype=np.int64)
+    if (seats < 0).any():
+        raise ValueError("Seats must not be negative")
+    quota = majority_quota(seats) if quota is None else int(quota)
+    if quota <= 0:
+        raise ValueError("The quota must be positive, got " + str(quota))
+    if groups is None:
+        return seats, quota, [list(range(len(seats)))]
+    if len(groups) != len(seats):
+        raise ValueError("Need one group per channel, got %d for %d channels" % (len(groups), len(seats)))
+    members, index = [], {}
+    for i, group in enumerate(groups):
+        if group not in index:
+            index[group] = len(members)
+            members.append([])
+        members[index[group]].append(i)
+    return seats, quota, members
+
+
+def _empty_table(rows, quota):
+    # The table of no channels: only the empty coalition, of size 0 and 0 seats.
+    table = np.zeros((rows, quota))
+    table[0, 0] = 1
+    return table
+
+
+def _add_channels(table, weights, quota):
+    # table[k, w] (coalitions of k channels holding w < quota seats) with `weights` added to the channels.
+    table = table.copy()
+    for w in weights:
+        if w < quota:
+            table[1:, w:] += table[:-1, :quota-w].copy()
+    if instrument.enabled:
+        instrument.count('coalition_channel_additions', len(weights))
+    return table
+
+
+def _windows(weights, quota, outside):
+    # windows[j][k]: coalitions of k of the other channels, starting from the `outside` table, whose
+    # seats are short of the quota by at most weights[j], so that channel j would be pivotal.
+    windows = [None] * len(weights)
+
+    def descend(lo, hi, table):
+        if hi - lo == 1:
+            windows[lo] = table[:, max(quota - int(weights[lo]), 0):].sum(axis=1) if weights[lo] else None
+            return
+        mid = (lo + hi) // 2
+        descend(lo, mid, _add_channels(table, weights[mid:hi], quota))
+        descend(mid, hi, _add_channels(table, weights[lo:mid], quota))
+
+    if len(weights):
+        descend(0, len(weights), outside)
+    return windows
+
+
+@instrument.timed()
+def power_indices(seats, quota=None, groups=None):
+    # (banzhaf, shapley_shubik), one entry per channel, both zero where no coalition can win.
+    seats, quota, members = _prepare(seats, quota, groups)
+    n = len(seats)
+    # losing[g][k]: coalitions of k channels of group g holding less than the quota
+    losing = [_add_channels(_empty_table(len(group) + 1, quota), seats[group], quota).sum(axis=1) for group in members]
+    # Shapley-Shubik weight of joining after k others: k! (n-1-k)! / n!
+    order_weight = np.exp([math.lgamma(k + 1) + math.lgamma(n - k) - math.lgamma(n + 1) for k in range(n)])
+    swings = np.zeros(n)
+    pivots = np.zeros(n)
+    for g, group in enumerate(members):
+        others = np.ones(1)
+        for h, sizes in enumerate(losing):
+            if h != g:
+                others = np.convolve(others, sizes)
+        for i, window in zip(group, _windows(seats[group], quota, _empty_table(len(group), quota))):
+            if window is not None:
+                sizes = np.convolve(window, others)
+                swings[i], pivots[i] = sizes.sum(), sizes.dot(order_weight[:len(sizes)])
+    banzhaf = swings / swings.sum() if swings.sum() > 0 else swings
+    return banzhaf, pivots
+
+
+@instrument.timed()
+def minimal_winning_coalitions(seats, quota=None, groups=None, limit=None):
+    # Bitmasks of the coalitions that reach the quota and lose it without any one member, at most
+    # `limit` of them. Members are added largest first, so a branch stops as soon as it reaches the
+    # quota (the member just added is the smallest, so every member is needed) or can no longer
+    # reach it with the channels left.
+    seats, quota, members = _prepare(seats, quota, groups)
+    found = []
+    for group in members:
+        order = sorted((i for i in group if seats[i] > 0), key=lambda i: (-seats[i], i))
+        weights = [int(seats[i]) for i in order]
+        left = [0] * (len(order) + 1)
+        for p in range(len(order) - 1, -1, -1):
+            left[p] = left[p+1] + weights[p]
+        stack = [(0, 0, 0)]
+        while stack:
+            position, mask, total = stack.pop()
+            branches = []
+            for p in range(position, len(order)):
+                if total + left[p] < quota:
+                    break
+                if total + weights[p] >= quota:
+                    found.append(mask | (1 << order[p]))
+                    if limit is not None and len(found) >= limit:
+                        return found
+                else:
+                    branches.append((p + 1, mask | (1 << order[p]), total + weights[p]))
+            stack.extend(reversed(branches))
+    return found
+
+
+def cheapest_government(seats, quota=None, groups=None):
+    # Bitmask of the winning coalition with the fewest seats, 0 if none reaches the quota. Ties go
+    # to the group seen first, then to the lower channel indices.
+    seats, quota, members = _prepare(seats, quota, groups)
+    best, best_total = 0, None
+    for group in members:
+        # reach[j] has bit t set when some of group[:j] hold exactly t seats
+        reach = [1]
+        for i in group:
+            reach.append(reach[-1] | (reach[-1] << int(seats[i])))
+        winning = reach[-1] >> quota
+        if not winning:
+            continue
+        total = quota + (winning & -winning).bit_length() - 1
+        if best_total is not None and total >= best_total:
+            continue
+        # walk back, keeping a channel only when its total can't be made without it
+        mask, t = 0, total
+        for j in range(len(group), 0, -1):
+            if not (reach[j-1] >> t) & 1:
+                mask |= 1 << group[j-1]
+                t -= int(seats[group[j-1]])
+        best, best_total = mask, total
+    return best
+
+
+@instrument.timed()
+def form_government(result, groups=None, quota=None, limit=COALITION_LIMIT):
+    # CoalitionResult for any result with channel_names and seats (ElectionResult, ParliamentResult).
+    seats = np.asarray(result.seats, dtype=np.int64)
+    quota = majority_quota(seats) if quota is None else quota
+    banzhaf, shapley_shubik = power_indices(seats, quota, groups)
+    return CoalitionResult(result.channel_names, seats, quota, cheapest_government(seats, quota, groups),
+                           minimal_winning_coalitions(seats, quota, groups, limit), banzhaf, shapley_shubik, groups)
@@ -0,0 +1,171 @@
+# Array-backed electorate model.
+#
+# Replaces the per-channel 'distribution' lists of {'country', 'count', 'ranks'} dicts (and the
+# getChannelCountryDict linear scans over them) with dense NumPy tensors:
+#
+#       counts[channel, country]          million first-preference votes of a channel in a country
+#       ranks[channel, country, rank-1]   million votes placing the channel at `rank` in a country
+#
+# plus name -> index maps for channels and countries. Rank r lives in column r-1. The ranks tensor
+# grows with channels^2, so it is only allocated once something asks for it.
+#
+# Methods that rewrite rank rows while they tally (IRV's elimination loop, score ballots) do it on
+# an ElectorateOverlay: a per-run view that copies a country's (channels, ranks) block the first
+# time the run writes to it and reads everything else from the base. frozen() gives the base as
+# read-only views, so runs sharing it across threads can't write to it by accident.
+
+import numpy as np
+
+import instrument
+
+
+def _read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class Electorate(object):
+
+    def __init__(self, channels, countries):
+        self.channels = channels
+        self.channel_names = [c['name'] for c in channels]
+        self.country_names = [c['country'] for c in countries]
+        self.channel_index = dict((name, i) for i, name in enumerate(self.channel_names))
+        self.country_index = dict((name, k) for k, name in enumerate(self.country_names))
+        self.languages = [c['language'] for c in channels]
+
+        self.counts = np.zeros((len(self.channel_names), len(self.country_names)))
+        self._ranks = None
+        self._language_groups = None
+        # (path, ranked) when the tensors are read-only maps of a snapshot.py snapshot
+        self.snapshot = None
+
+    @property
+    def ranks(self):
+        if self._ranks is None:
+            self._ranks = np.zeros((len(self.channel_names), len(self.country_names), len(self.channel_names)))
+        return self._ranks
+
+    @ranks.setter
+    def ranks(self, value):
+        self._ranks = value
+
+    @property
+    def n_channels(self):
+        return self.counts.shape[0]
+
+    @property
+    def n_countries(self):
+        return self.counts.shape[1]
+
+    @property
+    def n_ranks(self):
+        return self.counts.shape[0]
+
+    def channel(self, name):
+        return self.channel_index[name]
+
+    def country(self, name):
+        return self.country_index[name]
+
+    def language_groups(self):
+        # language -> list of channel indices, in channel order.
+        if self._language_groups is None:
+            groups = {}
+            for i, language in enumerate(self.languages):
+                groups.setdefault(language, []).append(i)
+            self._language_groups = groups
+        return self._language_groups
+
+    def reset(self):
+        self.counts[:] = 0
+        if self._ranks is not None:
+            self._ranks[:] = 0
+
+    def copy(self):
+        # Shares the (read-only) metadata, copies the vote tensors.
+        instrument.count('electorate_copies')
+        other = object.__new__(Electorate)
+        other.__dict__.update(self.__dict__)
+        other.counts = np.array(self.counts)
+        other._ranks = None if self._ranks is None else np.array(self._ranks)
+        other.snapshot = None
+        return other
+
+    def frozen(self):
+        # Shares the metadata and the vote tensors (no copy), as read-only views.
+        other = object.__new__(Electorate)
+        other.__dict__.update(self.__dict__)
+        other.counts = _read_only(self.counts)
+        other._ranks = None if self._ranks is None else _read_only(self._ranks)
+        return other
+
+    def overlay(self):
+        return ElectorateOverlay(self)
+
+    def _snapshot_backed(self):
+        return (self.snapshot is not None and isinstance(self.counts, np.memmap) and
+                (self._ranks is None or isinstance(self._ranks, np.memmap)))
+
+    def __getstate__(self):
+        # A snapshot-backed electorate pickles as its snapshot path (see snapshot.py).
+        state = dict(self.__dict__)
+        if self._snapshot_backed():
+            state['counts'] = None
+            state['_ranks'] = None
+        else:
+            state['snapshot'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.snapshot is not None:
+            from snapshot import map_tensors
+            self.counts, self._ranks = map_tensors(*self.snapshot)
+
+    def distribution(self, channel):
+        # Old-style list of {'country', 'count', 'ranks'} dicts for one channel, for printing.
+        i = channel if isinstance(channel, int) else self.channel_index[channel]
+        rows = []
+        for k, country in enumerate(self.country_names):
+            rows.append({
+                'country': country,
+                'count': float(self.counts[i, k]),
+                'ranks': dict((r + 1, float(self.ranks[i, k, r])) for r in range(self.n_ranks)),
+            })
+        return rows
+
+
+class ElectorateOverlay(object):
+    # One run's copy-on-write changes to a base electorate's ranks, one country block at a time.
+
+    def __init__(self, base):
+        self.base = base
+        self.blocks = {}
+
+    def _base_block(self, k):
+        # Country k's rows in the base; zeros if the base never allocated its ranks.
+        if self.base._ranks is None:
+            return np.zeros((self.base.n_channels, self.base.n_ranks))
+        return self.base._ranks[:, k]
+
+    def country_ranks(self, k):
+        # (channels, ranks) rows of country k as this run sees them; read-only unless written.
+        block = self.blocks.get(k)
+        return _read_only(self._base_block(k)) if block is None else block
+
+    def writable_ranks(self, k):
+        # This run's private copy of country k's rank rows, made on first use.
+        block = self.blocks.get(k)
+        if block is None:
+            block = self.blocks[k] = np.array(self._base_block(k))
+            instrument.count('overlay_block_copies')
+        return block
+
+    def materialize(self):
+        # A standalone Electorate with this run's blocks written over a copy of the base.
+        electorate = self.base.copy()
+        for k, block in self.blocks.items():
+            electorate.ranks[:, k] = block
+        return electorate
@@ -0,0 +1,178 @@
+# Exact integer arithmetic for the ranked and score paths.
+#
+# pewdie keeps votes as floats in million votes and rounds nearly every update to 2 decimals, so
+# splits drift away from their totals a hundredth at a time, and distributeEliminatedChannelsVotes'
+# `while(votes_to_subtract_from_other_ranks > 0)` can go round many times before the 2-decimal
+# remainder happens to fit a rank slot. Here every count is an int64 number of voters (SCALE per
+# million), every split is exact, and rounding to 2 decimals happens only when a value is shown:
+#
+#       allocate_rank_slots   rank_allocation's split (the one linprog gives), each channel's row
+#                             cut into whole voters by largest remainder instead of 2 decimals
+#       ranked_units          votes_distribution_ranked_voting's rank tensor, in voters
+#       distribute_eliminated distributeEliminatedChannelsVotes in voters, with the same random
+#                             draws for the recipients and for the lower ranks giving the votes up
+#       irv_loop_winner       the original elimination loop on top of it
+#       score_ballots         tally.score_ballots with integer draws
+#
+# The pairwise methods need nothing new: subtract_from_other_channel's round(x, 2) leaves whole
+# numbers alone, so pairwise_matrix over a tensor in voters is already exact.
+
+import numpy as np
+
+import instrument
+from rank_allocation import interior_point
+
+# Voters per million votes: one unit is one voter.
+SCALE = 10 ** 6
+
+# Passes over the lower ranks before the rest is taken from them in order, as in
+# pewdie.distributeEliminatedChannelsVotes (its MAX_TRANSFER_PASSES).
+MAX_TRANSFER_PASSES = 1000
+
+
+def to_units(millions):
+    return np.rint(np.asarray(millions, dtype=float) * SCALE).astype(np.int64)
+
+
+def to_millions(units, decimals=2):
+    # For presentation only; decimals=None keeps every voter.
+    millions = np.asarray(units, dtype=np.int64) / float(SCALE)
+    return millions if decimals is None else np.round(millions, decimals)
+
+
+def _largest_remainder(x, caps, totals):
+    # Whole-voter rows of x (problems, slots) summing to totals and within [0, caps]: every slot
+    # gets its floor, then the voters still missing go one each to the largest fractional parts
+    # (or come back from the smallest ones, where x's float sum overshot its total).
+    whole = np.clip(np.floor(x), 0, caps).astype(np.int64)
+    short = totals - whole.sum(1)
+    while short.any():
+        adding = short[:, None] > 0
+        room = np.where(adding, whole < caps, whole > 0)
+        key = np.where(room, np.where(adding, whole - x, x - whole), np.inf)
+        order = np.argsort(key, axis=1, kind='mergesort')
+        place = np.empty_like(order)
+        place[np.arange(len(order))[:, None], order] = np.arange(order.shape[1])
+        moved = room & (place < np.minimum(np.abs(short), room.sum(1))[:, None])
+        whole += np.where(adding, 1, -1) * moved
+        short = totals - whole.sum(1)
+    return whole
+
+
+def allocate_rank_slots(totals, group_size):
+    # got[problem, channel_in_group, rank_slot] in voters, channel by channel like
+    # rank_allocation.allocate_rank_slots: each channel but the last takes the interior point of
+    # the remaining slot capacities, cut into whole voters, and the last one takes what is left,
+    # so every channel and every rank slot of a group gets exactly `total`.
+    totals = np.asarray(totals, dtype=np.int64)
+    got = np.zeros((len(totals), group_size, group_size), dtype=np.int64)
+    if group_size == 0:
+        return got
+    slots_left = np.repeat(totals[:, None], group_size, axis=1)
+    for j in range(group_size - 1):
+        x = interior_point(slots_left / float(SCALE), totals / float(SCALE)) * SCALE
+        got[:, j] = _largest_remainder(x, slots_left, totals)
+        slots_left = slots_left - got[:, j]
+    got[:, -1] = slots_left
+    return got
+
+
+def ranked_units(electorate, country_indices):
+    # (channels, len(country_indices), ranks) rank tensor in voters, built from electorate.counts
+    # the way votes_distribution_ranked_voting's batched solver builds it.
+    counts = to_units(electorate.counts[:, country_indices])
+    ranks = np.zeros((electorate.n_channels, len(country_indices), electorate.n_ranks), dtype=np.int64)
+    ranks[:, :, 0] = counts
+    for channel_language, group in electorate.language_groups().items():
+        remaining_channels = [j for j in range(electorate.n_channels) if electorate.languages[j] != channel_language]
+        votes = counts[group].ravel()
+        same_language_size = len(group) - 1
+        same_language_got = allocate_rank_slots(votes, same_language_size).reshape(len(group), len(country_indices), same_language_size, same_language_size)
+        remaining_got = allocate_rank_slots(votes, len(remaining_channels)).reshape(len(group), len(country_indices), len(remaining_channels), len(remaining_channels))
+        for g, i in enumerate(group):
+            for position, j in enumerate(j for j in group if j != i):
+                ranks[j, :, 1:1+same_language_size] += same_language_got[g, :, position]
+            for position, j in enumerate(remaining_channels):
+                ranks[j, :, 1+same_language_size:] += remaining_got[g, :, position]
+    return ranks
+
+
+def _take_from_lower_ranks(row, amount, rng):
+    # Removes `amount` from row[1:] (the channel gained it at rank 1) like the original: each pass
+    # visits the lower ranks in random order and takes randint(0, what is left) from each (the last
+    # one the rest) where the rank holds more than that. After MAX_TRANSFER_PASSES the rest comes
+    # off the lower ranks in order. Returns what they could not cover.
+    lower_ranks = list(range(1, len(row)))
+    passes = 0
+    while amount > 0:
+        if passes == MAX_TRANSFER_PASSES:
+            instrument.count('transfer_pass_limit')
+            for r in lower_ranks:
+                taken = min(row[r], amount)
+                row[r] -= taken
+                amount -= taken
+            return amount
+        passes += 1
+        if instrument.enabled:
+            instrument.count('transfer_passes')
+        ranks_left = list(lower_ranks)
+        while ranks_left:
+            r = rng.choice(ranks_left)
+            taken = amount if len(ranks_left) == 1 else rng.randint(0, amount)
+            if row[r] > taken:
+                row[r] -= taken
+                amount -= taken
+            ranks_left.remove(r)
+    return 0
+
+
+def distribute_eliminated(rows, votes, channels, rng):
+    # distributeEliminatedChannelsVotes on one country's rank rows (lists of ints, rows[channel]):
+    # the channels are visited in random order and each gains uniform(0, votes left) first
+    # preferences (the last one the rest), taken from its lower ranks by _take_from_lower_ranks.
+    channels = list(channels)
+    while channels:
+        channel = rng.choice(channels)
+        row = rows[channel]
+        moved = votes if len(channels) == 1 else rng.randint(0, votes)
+        row[0] += moved
+        _take_from_lower_ranks(row, moved, rng)
+        votes -= moved
+        channels.remove(channel)
+
+
+def irv_loop_winner(ranks, k, population, rng):
+    # pewdie.irv_loop_winner on an int64 tensor and population; mutates ranks[:, k]. The loop runs
+    # on Python ints, which index far faster than int64 array scalars.
+    rows = ranks[:, k].tolist()
+    population = int(population)
+    standing = [i for i, row in enumerate(rows) if row[0] != 0]
+    winner = -1
+    while standing:
+        first_preferences = [rows[i][0] for i in standing]
+        majority = [i for i, votes in zip(standing, first_preferences) if 2 * votes > population]
+        if majority or len(standing) == 1:
+            # the last channel standing wins like in irv.py, majority or not
+            winner = (majority or standing)[0]
+            break
+        instrument.count('elimination_rounds')
+        eliminated = standing[first_preferences.index(min(first_preferences))]
+        standing.remove(eliminated)
+        distribute_eliminated(rows, rows[eliminated][0], standing, rng)
+    ranks[:, k] = rows
+    return winner
+
+
+def score_ballots(count, n_ranks, votes, rng):
+    # tally.score_ballots in voters: returns (rank row, average score rounded to 2 decimals).
+    row = [0] * n_ranks
+    row[n_ranks-1] = int(count)
+    left = int(votes - count)
+    ranks = list(range(1, n_ranks+1))
+    rng.shuffle(ranks)
+    for rank in ranks[:-1]:
+        drawn = rng.randint(min(0, left), max(0, left))
+        row[rank-1] += drawn
+        left -= drawn
+    row[ranks[-1]-1] += left
+    return np.array(row, dtype=np.int64), round(float(sum(rank * v for rank, v in enumerate(row, 1))) / votes, 2)
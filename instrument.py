@@ -0,0 +1,181 @@
+# Opt-in instrumentation for the election pipeline: stage timers, hot-path counters and an optional
+# cProfile / tracemalloc capture, exported as JSON.
+#
+# Off by default. Turn it on with enable() (pewdie's --instrument flag does), or for any process
+# importing pewdie with the environment:
+#
+#       PEWDIE_INSTRUMENT=1                     timers and counters
+#       PEWDIE_INSTRUMENT=profile,memory        plus cProfile and tracemalloc (Python 3) captures
+#       PEWDIE_INSTRUMENT_OUTPUT=run.json       write report() there when the process exits
+#
+# Stages are functions wrapped with @timed(): calls and inclusive wall seconds per name, so a
+# winner method's time includes anything it calls. Counters are bumped with count(); hot loops
+# guard the call with `if instrument.enabled:` so a disabled run pays one attribute lookup. Timed
+# functions cost one flag check when disabled.
+#
+# Process pools (tally.py, sweep.py) run their jobs through pooled(), which records the job's stages
+# and counters in the worker and sends them back with its result for merge(). Worker seconds add up
+# across processes, so a stage can show more seconds than the run took. The cProfile and tracemalloc
+# captures only cover the process that enabled them.
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import pstats
+import time
+
+try:
+    import tracemalloc
+except ImportError:                                 # Python 2
+    tracemalloc = None
+
+ENV_VAR = 'PEWDIE_INSTRUMENT'
+OUTPUT_ENV_VAR = 'PEWDIE_INSTRUMENT_OUTPUT'
+
+enabled = False
+_stages = {}
+_counters = {}
+_profile = None
+_tracing_memory = False
+
+
+def enable(profile=False, memory=False):
+    # Starts recording (and the cProfile / tracemalloc captures if asked). Keeps earlier records.
+    global enabled, _profile, _tracing_memory
+    enabled = True
+    if profile and _profile is None:
+        _profile = cProfile.Profile()
+        _profile.enable()
+    if memory and tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracing_memory = True
+
+
+def disable():
+    global enabled
+    enabled = False
+    if _profile is not None:
+        _profile.disable()
+
+
+def reset():
+    # Drops every record and capture; leaves `enabled` as it is.
+    global _profile, _tracing_memory
+    _stages.clear()
+    _counters.clear()
+    if _profile is not None:
+        _profile.disable()
+        _profile = None
+    if _tracing_memory:
+        tracemalloc.stop()
+        _tracing_memory = False
+
+
+def count(name, n=1):
+    if enabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def timed(name=None):
+    # Decorator recording calls and wall seconds of the function under `name` (default: its name).
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record = _stages.setdefault(stage_name, [0, 0.0])
+                record[0] += 1
+                record[1] += time.time() - start
+        return wrapper
+    return decorate
+
+
+def run_recorded(instrumented, func, *args):
+    # (func(*args), records), records holding the stages and counters of this call alone (None when
+    # not instrumented) for merge(). A worker forked from an instrumented process starts with its
+    # records, which are set aside meanwhile.
+    global enabled
+    if not instrumented:
+        return func(*args), None
+    saved = enabled, dict((stage_name, list(record)) for stage_name, record in _stages.items()), dict(_counters)
+    _stages.clear()
+    _counters.clear()
+    enabled = True
+    try:
+        result = func(*args)
+        records = {'stages': dict((stage_name, list(record)) for stage_name, record in _stages.items()),
+                   'counters': dict(_counters)}
+    finally:
+        enabled = saved[0]
+        _stages.clear()
+        _stages.update(saved[1])
+        _counters.clear()
+        _counters.update(saved[2])
+    return result, records
+
+
+def pooled(job):
+    # Pool entry point for a (func, args, instrumented) job: run_recorded's (result, records).
+    func, args, instrumented = job
+    return run_recorded(instrumented, func, *args)
+
+
+def merge(records):
+    # Adds records from run_recorded (in a pool worker, usually) to this process's.
+    if records is None:
+        return
+    for stage_name, (calls, seconds) in records['stages'].items():
+        record = _stages.setdefault(stage_name, [0, 0.0])
+        record[0] += calls
+        record[1] += seconds
+    for name, n in records['counters'].items():
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def _profile_rows(top):
+    if _profile is None:
+        return None
+    stats = pstats.Stats(_profile)
+    rows = []
+    for (filename, line, function), (primitive_calls, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({'function': function, 'file': filename, 'line': line, 'calls': calls,
+                     'primitive_calls': primitive_calls, 'own_seconds': own, 'cumulative_seconds': cumulative})
+    rows.sort(key=lambda row: -row['cumulative_seconds'])
+    return rows[:top]
+
+
+def report(top=25):
+    # Everything recorded so far as plain JSON-ready data. `profile` holds the `top` functions by
+    # cumulative time; `memory` is None unless tracemalloc is tracing.
+    memory = None
+    if _tracing_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        memory = {'current_bytes': current, 'peak_bytes': peak}
+    stages = dict((stage_name, {'calls': calls, 'seconds': seconds}) for stage_name, (calls, seconds) in _stages.items())
+    return {'enabled': enabled, 'stages': stages, 'counters': dict(_counters),
+            'profile': _profile_rows(top), 'memory': memory}
+
+
+def export_json(path, top=25):
+    with open(path, 'w') as handle:
+        json.dump(report(top), handle, indent=2, sort_keys=True)
+
+
+def _from_environment():
+    captures = [c.strip() for c in os.environ.get(ENV_VAR, '').lower().split(',') if c.strip()]
+    if not captures or captures == ['0']:
+        return
+    enable(profile='profile' in captures, memory='memory' in captures)
+    if os.environ.get(OUTPUT_ENV_VAR):
+        atexit.register(export_json, os.environ[OUTPUT_ENV_VAR])
+
+
+_from_environment()
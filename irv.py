@@ -0,0 +1,86 @@
+# Array-based instant-runoff engine.
+#
+# IRV only ever looks at first preferences, so a country is just a vector of first-preference votes
+# per channel. Every round handles all undecided countries at once: find the channels with a
+# majority of the country's population, otherwise eliminate the channel with the fewest first
+# preferences (first one in channel order on ties) and hand its votes to the channels still
+# standing. A country needs at most channels-1 rounds and each round is a fixed number of array
+# operations, instead of distributeEliminatedChannelsVotes' retry loop.
+#
+# Transfers:
+#       'random'  the same stick-breaking split as distributeEliminatedChannelsVotes: the remaining
+#                 channels are visited in random order and each takes uniform(0, votes left), the
+#                 last one takes the rest.
+#       'equal'   the expected value of that split, votes / channels remaining. Deterministic.
+
+import numpy as np
+
+import instrument
+
+TRANSFERS = ('random', 'equal')
+
+
+def _random_shares(active, rng):
+    # Stick-breaking split over the active channels of every row, in a random visiting order.
+    rows, channels = active.shape
+    keys = rng.random_sample((rows, channels))
+    keys[~active] = np.inf                          # inactive channels are visited last
+    order = np.argsort(keys, axis=1)
+    n_active = active.sum(axis=1)
+
+    fractions = rng.random_sample((rows, channels))
+    position = np.arange(channels)[None, :]
+    fractions[position == (n_active - 1)[:, None]] = 1.0   # last visited channel takes the rest
+    fractions[position >= n_active[:, None]] = 0.0
+
+    left_before = np.cumprod(np.hstack((np.ones((rows, 1)), 1 - fractions[:, :-1])), axis=1)
+    shares_in_order = fractions * left_before
+    shares = np.zeros((rows, channels))
+    shares[np.arange(rows)[:, None], order] = shares_in_order
+    return shares
+
+
+def irv_winners(first_preferences, populations, transfer='random', rng=None):
+    # first_preferences: (countries, channels), populations: (countries,) useful population, whose
+    # half is the majority threshold. Returns the winning channel index per country, -1 for countries
+    # where nobody has first preferences.
+    if transfer not in TRANSFERS:
+        raise ValueError("Unknown IRV transfer: " + str(transfer))
+    if rng is None:
+        rng = np.random
+
+    votes = np.array(first_preferences, dtype=float)
+    threshold = np.asarray(populations, dtype=float) / 2.0
+    countries, channels = votes.shape
+    active = votes != 0
+    winners = np.full(countries, -1, dtype=int)
+    undecided = active.any(axis=1)
+
+    while undecided.any():
+        rows = np.flatnonzero(undecided)
+        row_votes = np.where(active[rows], votes[rows], -np.inf)
+
+        majority = row_votes > threshold[rows, None]
+        last_standing = active[rows].sum(axis=1) == 1
+        decided = majority.any(axis=1) | last_standing
+        winners[rows[decided]] = np.where(majority[decided].any(axis=1),
+                                          majority[decided].argmax(axis=1),
+                                          active[rows[decided]].argmax(axis=1))
+        undecided[rows[decided]] = False
+
+        rows = rows[~decided]
+        if not len(rows):
+            break
+        instrument.count('elimination_rounds', len(rows))
+        eliminated = np.where(active[rows], votes[rows], np.inf).argmin(axis=1)
+        eliminated_votes = votes[rows, eliminated]
+        active[rows, eliminated] = False
+        votes[rows, eliminated] = 0
+
+        if transfer == 'equal':
+            shares = active[rows] / active[rows].sum(axis=1).astype(float)[:, None]
+        else:
+            shares = _random_shares(active[rows], rng)
+        votes[rows] += shares * eliminated_votes[:, None]
+
+    return winners
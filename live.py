@@ -0,0 +1,23 @@
+# Live subscriber-count feed (see live_feed.py), behind an interpreter check.
+#
+# live_feed.py is asyncio code and needs Python 3.7+. The rest of the tree, pewdie.py included,
+# runs on Python 2, where importing live_feed.py would fail with a bare SyntaxError. This module
+# parses on both, so on Python 2 `import live` and `python live.py` stop with a message that says
+# which interpreter to use instead.
+#
+#       python3 live.py --countries countries.csv --channels channels.csv --url http://127.0.0.1:8000/subs
+
+import sys
+
+if sys.version_info < (3, 7):
+    _message = ("live.py needs Python 3.7 or later (asyncio), this is Python %d.%d; pewdie.py and the "
+                "rest of the tree run on Python 2" % sys.version_info[:2])
+    if __name__ == '__main__':
+        sys.exit(_message)
+    raise ImportError(_message)
+
+from live_feed import (DEBOUNCE, MAX_DELAY, TICK, Coalescer, FileTailSource, HTTPSource, LiveResult,  # noqa: E402
+                       LiveService, main, parse_counts)
+
+if __name__ == '__main__':
+    sys.exit(main())
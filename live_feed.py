@@ -0,0 +1,288 @@
+# Live subscriber-count feed driving continuous FPTP re-tallies (Python 3.7+, asyncio). Import it
+# through live.py, which checks the interpreter first.
+#
+# Sources are polled concurrently, each on its own interval, and every (channel, subs) reading they
+# return goes into a Coalescer that keeps only the latest reading per channel. A tick loop wakes at
+# most once per `tick` seconds, takes the channels that are due and applies them to a
+# tracker.LiveTally on a single worker thread, then puts a LiveResult on the results queue. So
+# fetching never waits for a tally, a tally never waits for a fetch, and any burst of readings
+# between two ticks costs one re-tally per tick (LiveTally.update_many over the channels that moved).
+#
+# Debouncing: with debounce > 0 a channel is only due once its readings have been quiet for that
+# long, or once max_delay has passed since its first pending reading, whichever comes first.
+#
+# Sources are any object with an `interval` attribute and an `async def fetch()` returning an
+# iterable of (channel name, subs). Two are included:
+#
+#       HTTPSource(url)        GETs a JSON document, {"PewDiePie": 80035336, ...} or a list of
+#                              {"name": ..., "subs": ...}, over plain HTTP/1.0 (a local stub
+#                              server in tests and benchmarks/bench_live.py)
+#       FileTailSource(path)   follows a JSON Lines file of {"name": ..., "subs": ...} as it grows
+#
+#       python3 live.py --countries countries.csv --channels channels.csv --url http://127.0.0.1:8000/subs
+#
+# Unlike the rest of the tree this module needs Python 3.7+ (async def, asyncio.run and the
+# concurrent.futures worker thread). pewdie.py and everything it imports stay on Python 2, where the
+# process pools use multiprocessing (tally.py, simulation.py), so the CLI reads its electorate with
+# loader.py instead of pewdie's bundled lists.
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import urllib.parse
+
+import instrument
+from loader import load_electorate
+from results import ElectionResult
+from tracker import LiveTally
+
+TICK = 1.0
+DEBOUNCE = 0.0
+MAX_DELAY = 5.0
+
+
+def parse_counts(payload):
+    # [(channel name, subs)] from a {name: subs} mapping or a list of {"name", "subs"} objects.
+    if isinstance(payload, dict):
+        return [(name, float(subs)) for name, subs in payload.items()]
+    if isinstance(payload, list):
+        return [(row['name'], float(row['subs'])) for row in payload]
+    raise ValueError("Expected a mapping or a list of subscriber counts, got " + type(payload).__name__)
+
+
+class HTTPSource(object):
+
+    def __init__(self, url, interval=1.0, timeout=5.0):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != 'http':
+            raise ValueError("HTTPSource only speaks plain http: " + url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self.interval = interval
+        self.timeout = timeout
+
+    async def _get(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            request = "GET %s HTTP/1.0\r\nHost: %s\r\nAccept: application/json\r\n\r\n" % (self.target, self.host)
+            writer.write(request.encode('ascii'))
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        status = head.split(b'\r\n', 1)[0].split()
+        if len(status) < 2 or status[1] != b'200':
+            raise IOError("GET %s: %s" % (self.url, head.split(b'\r\n', 1)[0].decode('latin-1')))
+        return body
+
+    async def fetch(self):
+        body = await asyncio.wait_for(self._get(), self.timeout)
+        return parse_counts(json.loads(body.decode('utf-8')))
+
+
+class FileTailSource(object):
+
+    def __init__(self, path, interval=0.5, from_start=True):
+        self.path = path
+        self.interval = interval
+        self.offset = None if from_start else os.path.getsize(path)
+        self._partial = b''
+
+    def _read(self):
+        # New complete lines since the last read; starts over if the file was truncated or replaced.
+        size = os.path.getsize(self.path)
+        if self.offset is None or size < self.offset:
+            self.offset = 0
+            self._partial = b''
+        with open(self.path, 'rb') as handle:
+            handle.seek(self.offset)
+            data = handle.read(size - self.offset)
+        self.offset += len(data)
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        return [json.loads(line.decode('utf-8')) for line in lines if line.strip()]
+
+    async def fetch(self):
+        rows = await asyncio.get_running_loop().run_in_executor(None, self._read)
+        return parse_counts(rows)
+
+
+class Coalescer(object):
+    # Latest pending reading per channel, released once debounced (or held back max_delay at most).
+
+    def __init__(self, debounce=DEBOUNCE, max_delay=MAX_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._pending = {}
+        self.received = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def push(self, channel_name, subs, now):
+        pending = self._pending.get(channel_name)
+        if pending is None:
+            self._pending[channel_name] = [subs, now, now]
+        else:
+            pending[0] = subs
+            pending[2] = now
+        self.received += 1
+
+    def due(self, now):
+        # {channel name: latest subs} for the channels ready to apply, removed from the pending set.
+        ready = {}
+        for channel_name, (subs, first, last) in list(self._pending.items()):
+            if now - last >= self.debounce or now - first >= self.max_delay:
+                ready[channel_name] = subs
+                del self._pending[channel_name]
+        return ready
+
+
+class LiveResult(ElectionResult):
+    # One tick's seats, plus what went into it: the tick number, the channels applied, how many raw
+    # readings they coalesced and {channel name: seat change} against the previous result.
+
+    def __init__(self, tally, tick, applied, received, changes):
+        ElectionResult.__init__(self, 'fptp', "LIVE FPTP - TICK " + str(tick), tally.electorate.channel_names,
+                                tally.electorate.country_names, tally.winners.copy())
+        self.tick = tick
+        self.applied = applied
+        self.received = received
+        self.changes = changes
+        self.time = time.time()
+
+
+class LiveService(object):
+
+    def __init__(self, tally, sources=(), tick=TICK, debounce=DEBOUNCE, max_delay=MAX_DELAY, results=None):
+        self.tally = tally
+        self.sources = list(sources)
+        self.tick = tick
+        self.coalescer = Coalescer(debounce, max_delay)
+        self.results = asyncio.Queue() if results is None else results
+        self.ticks = 0
+        self.retallies = 0
+        self.retally_seconds = 0.0
+        self.unknown = 0
+        self.errors = []
+        self._received_at_tally = 0
+        # update_subs mutates the tally, so every re-tally runs on this one thread, one at a time
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, channel_name, subs):
+        # Queues one reading. Readings for channels outside the electorate are counted and dropped.
+        if channel_name not in self.tally.electorate.channel_index:
+            self.unknown += 1
+            return
+        self.coalescer.push(channel_name, subs, time.monotonic())
+        if instrument.enabled:
+            instrument.count('live_readings')
+
+    @instrument.timed('live_retally')
+    def _retally(self, ready):
+        start = time.time()
+        changes = self.tally.update_many(ready)
+        if instrument.enabled:
+            instrument.count('live_updates_applied', len(ready))
+        self.retally_seconds += time.time() - start
+        return changes
+
+    async def _poll(self, source):
+        while True:
+            try:
+                readings = await source.fetch()
+            except (IOError, OSError, ValueError, KeyError, asyncio.TimeoutError) as error:
+                self.errors.append((source, error))
+                if instrument.enabled:
+                    instrument.count('live_fetch_errors')
+            else:
+                for channel_name, subs in readings:
+                    self.submit(channel_name, subs)
+            await asyncio.sleep(source.interval)
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline = max(deadline + self.tick, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+            self.ticks += 1
+            ready = self.coalescer.due(time.monotonic())
+            if not ready:
+                continue
+            received = self.coalescer.received - self._received_at_tally
+            self._received_at_tally = self.coalescer.received
+            changes = await loop.run_in_executor(self._executor, self._retally, ready)
+            self.retallies += 1
+            await self.results.put(LiveResult(self.tally, self.ticks, len(ready), received, changes))
+
+    async def run(self, duration=None):
+        # Polls every source and re-tallies every tick, for `duration` seconds or until cancelled.
+        tasks = [asyncio.ensure_future(self._poll(source)) for source in self.sources]
+        tasks.append(asyncio.ensure_future(self._tick()))
+        try:
+            if duration is None:
+                await asyncio.gather(*tasks)
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+async def _print_results(service):
+    while True:
+        result = await service.results.get()
+        print("tick %d: %d channels from %d readings, changes %s, %s leads with %d seats"
+              % (result.tick, result.applied, result.received, result.changes or '{}',
+                 result.government(), result[result.government()]))
+
+
+async def _serve(service, duration):
+    printer = asyncio.ensure_future(_print_results(service))
+    try:
+        await service.run(duration)
+    finally:
+        printer.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-tally FPTP seats from live subscriber counts. Needs Python 3.7+, unlike pewdie.py.")
+    parser.add_argument('--countries', required=True, help='countries dataset (see loader.py)')
+    parser.add_argument('--channels', required=True, help='channels dataset (see loader.py)')
+    parser.add_argument('--languages', help='long-format country language file')
+    parser.add_argument('--url', action='append', default=[], help='HTTP JSON source, repeatable')
+    parser.add_argument('--tail', action='append', default=[], help='JSON Lines file to follow, repeatable')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between polls of each source')
+    parser.add_argument('--tick', type=float, default=TICK)
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE)
+    parser.add_argument('--max-delay', type=float, default=MAX_DELAY)
+    parser.add_argument('--duration', type=float, help='stop after this many seconds')
+    args = parser.parse_args(argv)
+    if not args.url and not args.tail:
+        parser.error("need at least one --url or --tail source")
+
+    channels, countries, _ = load_electorate(args.countries, args.channels, args.languages)
+    sources = [HTTPSource(url, args.interval) for url in args.url] + [FileTailSource(path, args.interval) for path in args.tail]
+    service = LiveService(LiveTally(channels, countries), sources, args.tick, args.debounce, args.max_delay)
+    try:
+        asyncio.run(_serve(service, args.duration))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
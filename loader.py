@@ -0,0 +1,203 @@
+# Streaming loader for country and channel datasets.
+#
+# Reads CSV or JSON Lines (picked by file extension) row by row and validates every row as it goes,
+# so files with hundreds of countries and tens of thousands of channels never sit in memory as more
+# than the final country/channel dicts the rest of pewdie works on. A bad row raises DatasetError
+# with its file and line.
+#
+# Countries:
+#       CSV    country,count,<LANG>,<LANG>,...      (one percentage column per language)
+#       JSONL  {"country": "US", "count": 167.4, "languages": {"EN": 75.8, "HI": 0.26}}
+#   plus an optional long-format language file, country,language,percentage (CSV or JSONL).
+#
+# Channels:
+#       CSV    name,country,language,subs
+#       JSONL  {"name": "PewDiePie", "country": "US", "language": "EN", "subs": 80035336}
+#
+# 'count' is the country's YouTube population in millions, like total_monthly_2016_top_15_countries.
+
+import csv
+import io
+import json
+import os
+import sys
+
+from electorate import Electorate
+
+COUNTRY_FIELDS = ('country', 'count')
+CHANNEL_FIELDS = ('name', 'country', 'language', 'subs')
+LANGUAGE_FIELDS = ('country', 'language', 'percentage')
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class DatasetError(ValueError):
+    def __init__(self, path, line, message):
+        ValueError.__init__(self, "%s:%s: %s" % (path, line, message))
+        self.path = path
+        self.line = line
+
+
+def _file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError("Unsupported dataset format (expected .csv or .jsonl): " + str(path))
+
+
+def _raw_rows(path):
+    # (line number, dict) pairs straight from the file, without loading it whole.
+    if _file_format(path) == 'csv':
+        # Python 2's csv module only reads byte streams.
+        handle = open(path, 'rb') if sys.version_info[0] < 3 else io.open(path, 'r', encoding='utf-8', newline='')
+        with handle:
+            reader = csv.reader(handle)
+            header = next(reader, None)
+            if header is None:
+                return
+            header = [column.strip() for column in header]
+            for row in reader:
+                if not row or not any(cell.strip() for cell in row):
+                    continue
+                if len(row) != len(header):
+                    raise DatasetError(path, reader.line_num, "expected %d columns, got %d" % (len(header), len(row)))
+                yield reader.line_num, dict(zip(header, [cell.strip() for cell in row]))
+    else:
+        with io.open(path, 'r', encoding='utf-8') as handle:
+            for line_number, line in enumerate(handle, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    raise DatasetError(path, line_number, "invalid JSON (%s)" % error)
+                if not isinstance(row, dict):
+                    raise DatasetError(path, line_number, "expected a JSON object")
+                yield line_number, row
+
+
+def _require(path, line, row, fields):
+    for field in fields:
+        if field not in row or row[field] in (None, ''):
+            raise DatasetError(path, line, "missing '%s'" % field)
+
+
+def _number(path, line, value, field, low=0.0, high=None):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise DatasetError(path, line, "'%s' is not a number: %r" % (field, value))
+    if number != number or number < low or (high is not None and number > high):
+        raise DatasetError(path, line, "'%s' out of range: %r" % (field, value))
+    return number
+
+
+def _text(value):
+    return value if isinstance(value, string_types) else str(value)
+
+
+def _country_rows(path):
+    seen = set()
+    for line, row in _raw_rows(path):
+        _require(path, line, row, COUNTRY_FIELDS)
+        name = _text(row['country'])
+        if name in seen:
+            raise DatasetError(path, line, "duplicate country '%s'" % name)
+        seen.add(name)
+
+        if 'languages' in row:
+            languages = row['languages']
+            if not isinstance(languages, dict):
+                raise DatasetError(path, line, "'languages' must be an object")
+        else:
+            languages = dict((column, value) for column, value in row.items() if column not in COUNTRY_FIELDS)
+        languages = dict((_text(language), _number(path, line, value, language, 0.0, 100.0))
+                         for language, value in languages.items() if value not in (None, ''))
+        yield {'country': name, 'languages': languages, 'count': _number(path, line, row['count'], 'count')}
+
+
+def _channel_rows(path, spoken=None):
+    # spoken: the languages that have speakers somewhere (spoken_languages), or None not to check.
+    seen = set()
+    for line, row in _raw_rows(path):
+        _require(path, line, row, CHANNEL_FIELDS)
+        name = _text(row['name'])
+        if name in seen:
+            raise DatasetError(path, line, "duplicate channel '%s'" % name)
+        seen.add(name)
+        language = _text(row['language'])
+        if spoken is not None and language not in spoken:
+            raise DatasetError(path, line, "channel language '%s' has no speakers in any country" % language)
+        yield {
+            'name': name,
+            'country': _text(row['country']),
+            'language': language,
+            'subs': _number(path, line, row['subs'], 'subs'),
+        }
+
+
+def _language_rows(path):
+    for line, row in _raw_rows(path):
+        _require(path, line, row, LANGUAGE_FIELDS)
+        yield line, _text(row['country']), _text(row['language']), _number(path, line, row['percentage'], 'percentage', 0.0, 100.0)
+
+
+def spoken_languages(countries):
+    # The languages with speakers in some country, by the same rounded total LanguageAggregates
+    # divides by.
+    totals = {}
+    for country_obj in countries:
+        for language, percentage in country_obj['languages'].items():
+            totals[language] = totals.get(language, 0) + (country_obj['count'] * percentage) / 100
+    return set(language for language, total in totals.items() if round(total, 2) > 0)
+
+
+def load_countries(path, languages_path=None):
+    countries = []
+    by_name = {}
+    for country_obj in _country_rows(path):
+        by_name[country_obj['country']] = country_obj
+        countries.append(country_obj)
+
+    if languages_path is not None:
+        for line, country, language, percentage in _language_rows(languages_path):
+            if country not in by_name:
+                raise DatasetError(languages_path, line, "language row for unknown country '%s'" % country)
+            by_name[country]['languages'][language] = percentage
+    return countries
+
+
+def load_channels(path, countries=None):
+    # With `countries`, a channel whose language nobody in them speaks is rejected at its line.
+    spoken = None if countries is None else spoken_languages(countries)
+    return list(_channel_rows(path, spoken))
+
+
+def fill_missing_languages(channels, countries):
+    # The shaping and distribution stages index every country by every channel language, and divide
+    # by each language's speakers across the countries, so a language nobody speaks is rejected.
+    # load_channels(path, countries) already does that with the file and line; this catches
+    # channel lists that did not come from a file.
+    languages = set(channel_obj['language'] for channel_obj in channels)
+    for country_obj in countries:
+        for language in languages:
+            country_obj['languages'].setdefault(language, 0)
+    spoken = spoken_languages(countries)
+    for language in sorted(languages - spoken):
+        names = [channel_obj['name'] for channel_obj in channels if channel_obj['language'] == language]
+        raise ValueError("channel language '%s' has no speakers in any country (channels: %s)"
+                         % (language, ", ".join(names)))
+    return languages
+
+
+def load_electorate(countries_path, channels_path, languages_path=None):
+    # Returns (channels, countries, electorate) ready for shapeCountryPopulationDataAccordingToLanguages.
+    countries = load_countries(countries_path, languages_path)
+    channels = load_channels(channels_path, countries)
+    fill_missing_languages(channels, countries)
+    return channels, countries, Electorate(channels, countries)
@@ -0,0 +1,164 @@
+# Pairwise preference matrix and the Condorcet-family methods derived from it.
+#
+# pairwise_matrix(ranks)[k, i, j] holds the votes channel i gets over channel j in country k, using
+# the same rank-bucket matching winner_ranked_condorcet always used (subtract_from_other_channel).
+# It is computed once per ranks tensor and cached on a content hash, so every method below is a
+# cheap pass over the matrix instead of another sweep (and deepcopy) over the rank rows.
+
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+import instrument
+
+CACHE_SIZE = 8
+PAIRWISE_METHODS = ('condorcet', 'copeland', 'schulze', 'ranked_pairs')
+
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def subtract_from_other_channel(channel1_ranks_in_this_country, channel2_ranks_in_this_country, rank, lower_ranks):
+    # Both rank rows are indexed by rank-1 and are modified in place.
+    c1_votes = 0
+    channel1_votes_here = channel1_ranks_in_this_country[rank-1]
+    non_channel1_zero_ranks = [lr for lr in lower_ranks if channel1_ranks_in_this_country[lr-1] != 0]
+    non_channel1_zero_ranks = sorted(non_channel1_zero_ranks, key=lambda r: channel2_ranks_in_this_country[r-1], reverse=True)
+    for non_zero_rank in non_channel1_zero_ranks:
+        to_subtract = min(channel1_votes_here, channel2_ranks_in_this_country[non_zero_rank-1])
+        c1_votes += to_subtract
+        channel1_ranks_in_this_country[rank-1] = round((channel1_ranks_in_this_country[rank-1] - to_subtract), 2)
+        channel1_votes_here = round((channel1_votes_here - to_subtract), 2)
+        channel2_ranks_in_this_country[non_zero_rank-1] = round((channel2_ranks_in_this_country[non_zero_rank-1] - to_subtract), 2)
+
+    if channel1_votes_here:
+        channel2_ranks = sorted(lower_ranks, key=lambda r: channel2_ranks_in_this_country[r-1], reverse=True)
+        for c2_rank in channel2_ranks:
+            to_subtract = min(channel1_votes_here, channel2_ranks_in_this_country[c2_rank-1])
+            c1_votes += to_subtract
+            channel1_ranks_in_this_country[rank-1] = round((channel1_ranks_in_this_country[rank-1] - to_subtract), 2)
+            channel1_votes_here = round((channel1_votes_here - to_subtract), 2)
+            channel2_ranks_in_this_country[c2_rank-1] = round((channel2_ranks_in_this_country[c2_rank-1] - to_subtract), 2)
+
+    return c1_votes
+
+
+def pair_votes(c1_ranks, c2_ranks):
+    # (votes for c1 over c2, votes for c2 over c1) from two rank rows of one country.
+    c1_test = [float(v) for v in c1_ranks]
+    c2_test = [float(v) for v in c2_ranks]
+    total_ranks = list(range(1, len(c1_test) + 1))
+    c1_votes = 0
+    c2_votes = 0
+    for rank in total_ranks:
+        lower_ranks = total_ranks[rank:]
+        c1_votes += subtract_from_other_channel(c1_test, c2_test, rank, lower_ranks)
+        c2_votes += subtract_from_other_channel(c2_test, c1_test, rank, lower_ranks)
+    return c1_votes, c2_votes
+
+
+def _compute(ranks):
+    n_channels, n_countries = ranks.shape[:2]
+    matrix = np.zeros((n_countries, n_channels, n_channels))
+    for k in range(n_countries):
+        for ci in range(n_channels):
+            for cj in range(ci + 1, n_channels):
+                matrix[k, ci, cj], matrix[k, cj, ci] = pair_votes(ranks[ci, k], ranks[cj, k])
+    return matrix
+
+
+def pairwise_matrix(ranks):
+    # ranks: (channels, countries, ranks) tensor. Returns (countries, channels, channels).
+    ranks = np.ascontiguousarray(ranks, dtype=float)
+    key = (ranks.shape, hashlib.sha1(ranks.tobytes()).hexdigest())
+    # methods on threads share the cache; the lock keeps the LRU reordering consistent, the
+    # (pure) matrix computation runs outside it
+    with _cache_lock:
+        if key in _cache:
+            instrument.count('pairwise_cache_hits')
+            _cache[key] = _cache.pop(key)
+            return _cache[key]
+    instrument.count('pairwise_matrix_computes')
+    matrix = _compute(ranks)
+    matrix.setflags(write=False)
+    with _cache_lock:
+        _cache[key] = matrix
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return matrix
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _closure(edges):
+    # Transitive closure of boolean (countries, n, n) relations.
+    reach = edges.copy()
+    for m in range(reach.shape[1]):
+        reach |= reach[:, :, m, None] & reach[:, None, m, :]
+    return reach
+
+
+def _first_or_none(mask):
+    # First True per row, -1 for rows without one.
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), -1)
+
+
+def _ranked_pairs_winner(margins):
+    n = margins.shape[0]
+    pairs = [(margins[i, j], i, j) for i in range(n) for j in range(n) if margins[i, j] > 0]
+    # strongest majority first; stable on channel order for equal margins
+    pairs.sort(key=lambda p: -p[0])
+    reach = np.eye(n, dtype=bool)
+    locked = np.zeros((n, n), dtype=bool)
+    for _, i, j in pairs:
+        if reach[j, i]:
+            continue                                # would close a cycle
+        locked[i, j] = True
+        reach |= np.outer(reach[:, i], reach[j, :])
+    sources = ~locked.any(axis=0)
+    return int(sources.argmax()) if sources.any() else -1
+
+
+def pairwise_results(matrix):
+    # Every pairwise method in one pass over a (countries, channels, channels) matrix.
+    # Winners are channel indices per country, -1 where there is none (or no votes at all).
+    n_countries, n_channels = matrix.shape[:2]
+    margins = matrix - matrix.transpose(0, 2, 1)
+    beats = margins > 0
+    has_votes = matrix.reshape(n_countries, -1).any(axis=1)
+
+    wins = beats.sum(axis=2)
+    losses = beats.sum(axis=1)
+    condorcet = _first_or_none(wins == n_channels - 1)
+
+    copeland_scores = wins - losses
+    copeland = np.where(has_votes, copeland_scores.argmax(axis=1), -1)
+
+    # Schulze: widest paths over the defeat strengths (Floyd-Warshall, batched over countries)
+    strength = np.where(beats, matrix, 0.0)
+    for m in range(n_channels):
+        through_m = np.minimum(strength[:, :, m, None], strength[:, None, m, :])
+        strength = np.maximum(strength, through_m)
+    idx = np.arange(n_channels)
+    strength[:, idx, idx] = 0
+    schulze_ok = (strength >= strength.transpose(0, 2, 1)).all(axis=2)
+    schulze = np.where(has_votes, _first_or_none(schulze_ok), -1)
+
+    ranked_pairs = np.array([_ranked_pairs_winner(margins[k]) if has_votes[k] else -1 for k in range(n_countries)], dtype=int)
+
+    # Smith set: channels that reach every other channel through beats-or-ties
+    smith = _closure(margins >= 0).all(axis=2) & has_votes[:, None]
+
+    return {
+        'condorcet': condorcet,
+        'copeland': copeland,
+        'copeland_scores': copeland_scores,
+        'schulze': schulze,
+        'ranked_pairs': ranked_pairs,
+        'smith_set': smith,
+    }
@@ -18,28 +18,41 @@
 #               Therefore, 50 is split as 17 subs from P and 33 subs from Q.
 #       (c) 30 subs, split in proportion to their populations, come from the remaining countries.
 
-from operator import itemgetter
-from scipy.optimize import linprog
+from electorate import Electorate
+from rank_allocation import allocate_rank_slots, round2
+from irv import irv_winners
+from pairwise import pairwise_matrix, pairwise_results
+from shaping import PopulationShaper
+from ballots import BallotBox, voters_per_country
+from weighted import RANKS_METHODS, WEIGHTED_METHODS, WeightedBallots
+from tally import TALLY_METHODS, compare_winners, country_slices, score_ballots, tally_winners
+from results import ComparisonResult, ConsoleReporter, ElectionResult, ParliamentResult, runner_up_margin
+from seats import SEAT_METHODS, apportion, fill_seats
+from coalition import form_government
+import replay
+import exact
+import instrument
+import snapshot
+from transfers import RANKED_TRANSFERS, transfer_eliminated
+import numpy as np
 import copy
 import random
 
-def printChannelVotes(channels):
-    for channel_obj in channels:
+def printChannelVotes(electorate):
+    for i, channel_obj in enumerate(electorate.channels):
         print "-----------------------------"
         print channel_obj['name']
         print channel_obj['subs']
-        printCountryWiseDistribution(channel_obj['distribution'])
+        printCountryWiseDistribution(electorate.distribution(i))
         print "\nFinal million subs: "
-        print sum(x['count'] for x in channel_obj['distribution'])
+        print electorate.counts[i].sum()
         print "\n"
     print "------------------------------"
 
-def printCountryVotes(countries, channels):
+def printCountryVotes(countries, electorate):
     total_votes = 0
     for c in countries:
-        count_c = 0
-        for ch in channels:
-            count_c += getChannelCountryDict(ch,c['country'])['count']
+        count_c = electorate.counts[:, electorate.country(c['country'])].sum()
         total_votes += count_c
         print "_________"
         print str(c['country']) + ": " + str(count_c)
@@ -54,10 +67,9 @@ def printCountryWiseDistribution(countries_array):
     for country_obj in countries_array_sorted:
         print country_obj
 
-def getChannelCountryDict(channel_obj, this_country):
-    return filter(lambda c: c['country'] == this_country, channel_obj['distribution'])[0]
-
-def votes_distribution_fptp(channels,country_data_to_use):
+@instrument.timed()
+def votes_distribution_fptp(electorate,country_data_to_use):
+    channels = electorate.channels
 
     denominator_all_subs = sum(c['subs'] for c in channels)
 
@@ -71,10 +83,13 @@ def votes_distribution_fptp(channels,country_data_to_use):
     # print sum(c['subs'] for c in filter(lambda channel: channel['language'] == 'PR', channels))*pow(10,-6)
     # print "\n"
 
+    language_total_subs = {}
     for channel_obj in channels:
+        language_total_subs[channel_obj['language']] = language_total_subs.get(channel_obj['language'], 0) + channel_obj['subs']
+
+    for i, channel_obj in enumerate(channels):
         channel_language = channel_obj['language']
-        channels_with_channel_language = filter(lambda c: c['language'] == channel_language, channels)
-        channels_with_channel_language_total_subs = sum(c['subs'] for c in channels_with_channel_language)
+        channels_with_channel_language_total_subs = language_total_subs[channel_language]
         # total_population_with_channel_language = sum(map(lambda country: ((country['useful_count'] * country['useful_languages'][channel_language]) / 100), country_data_to_use))
         # print total_population_with_channel_language
         for country_obj in country_data_to_use:
@@ -91,8 +106,7 @@ def votes_distribution_fptp(channels,country_data_to_use):
             channel_subs_in_country = this_channels_slice
 
             # channel_obj['distribution'].append({'country': country_obj['country'], 'count': round(channel_subs_in_country,2)})
-            channel_country_obj = getChannelCountryDict(channel_obj,country_obj['country'])
-            channel_country_obj['count'] = round(channel_subs_in_country,2)
+            electorate.counts[i, electorate.country(country_obj['country'])] = round(channel_subs_in_country,2)
 
     # BASIC EXCLUSIVE SUBS SPLITS DONE. NOW, BIAS THEM UP
     # Loop over countries first, then channels.
@@ -102,46 +116,32 @@ def votes_distribution_fptp(channels,country_data_to_use):
     # printCountryVotes(country_data_to_use, channels)
     # printCountryWiseDistribution(country_data_to_use)
 
-def winner_fptp(all_channels,all_countries):
-    print "\n------------- INITIATING FPTP VOTING -------------\n"
-    results = {}
-    for channel_obj in all_channels:
-        results[channel_obj['name']] = 0
-
+@instrument.timed()
+def winner_fptp(electorate,all_countries,rng=random):
+    winners = []
+    margins = []
     for country_obj in all_countries:
         this_country = country_obj['country']
         # print "________________________"
         # print this_country
-        max_votes_in_this_country = 0
-        winner = {}
-        equal_votes_competitors = []
-
-        total_votes_in_country = 0
-        for channel_obj in all_channels:
-            this_channel_votes_in_this_country = getChannelCountryDict(channel_obj,this_country)['count']
-            # print "    " + str(channel_obj['name']) + ": " + str(this_channel_votes_in_this_country)
-            total_votes_in_country += this_channel_votes_in_this_country
-            if(this_channel_votes_in_this_country > 0):
-                if(this_channel_votes_in_this_country > max_votes_in_this_country):
-                    max_votes_in_this_country = this_channel_votes_in_this_country
-                    winner = channel_obj
-                    equal_votes_competitors = [winner]
-                elif(this_channel_votes_in_this_country == max_votes_in_this_country):
-                    equal_votes_competitors.append(channel_obj)
-        # print "Total population involved in voting: " + str(total_votes_in_country)
-        country_obj['voting_population'] = round(total_votes_in_country,2)
-        if(len(equal_votes_competitors)):
-            winner = random.choice(equal_votes_competitors)
-            # print "Winner " + str(this_country) + ": " + str(winner['name'])
-            results[winner['name']] += 1
-
-    print "\nSeats distribution for " + str(len(all_countries)) + " seats (countries):"
-    print sorted(results.items(), key=itemgetter(1), reverse = True)
-    print "\n"
-    print max(results.iterkeys(), key=lambda x: results[x]) + " forms government!"
-    print "\n"
-
-def distribute_ranks_among_channels_in_this_country(current_rank,this_country,other_channels_list,total_votes):
+        votes_in_this_country = electorate.counts[:, electorate.country(this_country)]
+        max_votes_in_this_country = votes_in_this_country.max()
+
+        # voting population: ElectionResult.voting_population (writing it into country_obj would
+        # change the caller's country data under every other run sharing it)
+        winner = -1
+        if(max_votes_in_this_country > 0):
+            equal_votes_competitors = list(np.flatnonzero(votes_in_this_country == max_votes_in_this_country))
+            winner = rng.choice(equal_votes_competitors)
+            # print "Winner " + str(this_country) + ": " + str(electorate.channel_names[winner])
+        winners.append(winner)
+        margins.append(runner_up_margin(votes_in_this_country))
+
+    return ElectionResult.from_winners('fptp', "FPTP VOTING", electorate, all_countries, winners, margins)
+
+def distribute_ranks_among_channels_in_this_country(electorate,current_rank,this_country,other_channels_list,total_votes):
+    # other_channels_list holds channel indices into electorate.
+    k = electorate.country(this_country)
     other_channels_list_len = len(other_channels_list)
     lower_rank = current_rank + 1
     upper_rank = current_rank + other_channels_list_len
@@ -159,19 +159,19 @@ def distribute_ranks_among_channels_in_this_country(current_rank,this_country,ot
     for i_rank in all_ranks:
         ranks_dict[i_rank] = total_votes
     # print ranks_dict
-    for other_channel in other_channels_list:
-        # print "        " + str(other_channel['name'])
-        other_channel_country_obj = getChannelCountryDict(other_channel,this_country)
+    for ith_channel, other_channel in enumerate(other_channels_list):
+        # print "        " + str(electorate.channel_names[other_channel])
+        other_channel_ranks = electorate.ranks[other_channel, k]
         votes_remaining_for_this_channel = total_votes
 
-        if(other_channels_list.index(other_channel) == (other_channels_list_len-1)):
+        if(ith_channel == (other_channels_list_len-1)):
             for i_rank in xrange(lower_rank,upper_rank+1):
                 # print "Remain: " + str(votes_remaining_for_this_channel)
                 i_ranks_this_channel_got = round(ranks_dict[i_rank],2)
-                other_channel_country_obj['ranks'][i_rank] = round((other_channel_country_obj['ranks'][i_rank] + i_ranks_this_channel_got),2)
+                other_channel_ranks[i_rank-1] = round((other_channel_ranks[i_rank-1] + i_ranks_this_channel_got),2)
                 ranks_dict[i_rank] = ranks_dict[i_rank] - i_ranks_this_channel_got
                 votes_remaining_for_this_channel = votes_remaining_for_this_channel - i_ranks_this_channel_got
-                # print str(other_channel_country_obj['ranks'][i_rank]) + " (" + str(i_ranks_this_channel_got) + ")"
+                # print str(other_channel_ranks[i_rank-1]) + " (" + str(i_ranks_this_channel_got) + ")"
         else:
             F = [-1 for x in xrange(0,other_channels_list_len)]
             # print F
@@ -182,6 +182,8 @@ def distribute_ranks_among_channels_in_this_country(current_rank,this_country,ot
             # print b
             # print F_bounds
             # print "Running LPP"
+            from scipy.optimize import linprog    # only this path needs scipy; keep it off the import path
+            instrument.count('lp_solves')
             res = linprog(F,A_eq=a,b_eq=b,bounds=F_bounds,method='interior-point')
             # print res
 
@@ -192,67 +194,121 @@ def distribute_ranks_among_channels_in_this_country(current_rank,this_country,ot
                 else:
                     # i_ranks_this_channel_got = round(random.uniform(0,min(votes_remaining_for_this_channel,ranks_dict[i_rank])),2)
                     i_ranks_this_channel_got = round(res.x[ith_rank],2)
-                other_channel_country_obj['ranks'][all_ranks[ith_rank]] = round((other_channel_country_obj['ranks'][all_ranks[ith_rank]] + i_ranks_this_channel_got),2)
+                other_channel_ranks[all_ranks[ith_rank]-1] = round((other_channel_ranks[all_ranks[ith_rank]-1] + i_ranks_this_channel_got),2)
                 ranks_dict[all_ranks[ith_rank]] = ranks_dict[all_ranks[ith_rank]] - i_ranks_this_channel_got
                 votes_remaining_for_this_channel = votes_remaining_for_this_channel - i_ranks_this_channel_got
-                # print str(other_channel_country_obj['ranks'][all_ranks[ith_rank]]) + " (" + str(i_ranks_this_channel_got) + ")"
+                # print str(other_channel_ranks[all_ranks[ith_rank]-1]) + " (" + str(i_ranks_this_channel_got) + ")"
 
-def votes_distribution_ranked_voting(channels,country_data_to_use):
+@instrument.timed()
+def votes_distribution_ranked_voting(electorate,country_data_to_use,solver='batched'):
     # Using votes_distribution_fptp data.
+    # solver='batched' (the default) runs linprog's interior-point for every (country, channel)
+    # allocation at once through rank_allocation, an order of magnitude faster than the original
+    # one-LP-per-channel path, solver='linprog', which it reproduces (see rank_allocation.py).
+    # solver='exact' splits whole voters (exact.ranked_units) and leaves the ranks unrounded.
+    language_groups = electorate.language_groups()
+    if(solver == 'exact'):
+        country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+        electorate.ranks[:, country_indices] += exact.to_millions(exact.ranked_units(electorate, country_indices), None)
+        return
+    if(solver == 'batched'):
+        country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+        ranks = electorate.ranks
+        ranks[:, country_indices, 0] += electorate.counts[:, country_indices]
+        for channel_language, group in language_groups.items():
+            # Allocations only depend on the votes being spread and the group size, so every
+            # channel of this language in every country is solved in one batch.
+            remaining_channels = [j for j in xrange(electorate.n_channels) if electorate.languages[j] != channel_language]
+            votes = electorate.counts[group][:, country_indices].ravel()
+            same_language_size = len(group) - 1
+            same_language_got = allocate_rank_slots(votes, same_language_size).reshape(len(group), len(country_indices), same_language_size, same_language_size)
+            remaining_got = allocate_rank_slots(votes, len(remaining_channels)).reshape(len(group), len(country_indices), len(remaining_channels), len(remaining_channels))
+            for g, i in enumerate(group):
+                other_channels_with_channel_language = [j for j in group if j != i]
+                # rounded on every add like distribute_ranks_among_channels_in_this_country; sums of
+                # 2-decimal values rounded this way don't depend on the order they are added in
+                for position, j in enumerate(other_channels_with_channel_language):
+                    ranks[j][country_indices, 1:1+same_language_size] = round2(ranks[j][country_indices, 1:1+same_language_size] + same_language_got[g, :, position])
+                for position, j in enumerate(remaining_channels):
+                    ranks[j][country_indices, 1+same_language_size:] = round2(ranks[j][country_indices, 1+same_language_size:] + remaining_got[g, :, position])
+        return
+    if(solver != 'linprog'):
+        raise ValueError("Unknown ranked solver: " + str(solver))
+
     for country_obj in country_data_to_use:
         this_country = country_obj['country']
+        k = electorate.country(this_country)
         # print "_ _ _ _ _ _"
         # print this_country
 
-        for channel_obj in channels:
-            this_channel_votes_in_this_country = getChannelCountryDict(channel_obj,this_country)['count']
-            # print "    " + str(channel_obj['name']) + ": " + str(this_channel_votes_in_this_country)
-            this_channel_country_obj = getChannelCountryDict(channel_obj,this_country)
-            this_channel_country_obj['ranks'][1] += this_channel_votes_in_this_country
-            # print "\n" +     str(channel_obj['name']) + " total 1 ranks: " + str(this_channel_country_obj['ranks'][1])
+        for i, channel_language in enumerate(electorate.languages):
+            this_channel_votes_in_this_country = electorate.counts[i, k]
+            # print "    " + str(electorate.channel_names[i]) + ": " + str(this_channel_votes_in_this_country)
+            electorate.ranks[i, k, 0] += this_channel_votes_in_this_country
+            # print "\n" +     str(electorate.channel_names[i]) + " total 1 ranks: " + str(electorate.ranks[i, k, 0])
 
-            # print "   For language " + str(channel_obj['language'])
+            # print "   For language " + str(channel_language)
             current_rank = 1
-            other_channels_with_channel_language = filter(lambda c: c['language'] == channel_obj['language'] and c['name'] != channel_obj['name'], channels)
-            distribute_ranks_among_channels_in_this_country(current_rank,this_country,other_channels_with_channel_language,this_channel_votes_in_this_country)
+            other_channels_with_channel_language = [j for j in language_groups[channel_language] if j != i]
+            distribute_ranks_among_channels_in_this_country(electorate,current_rank,this_country,other_channels_with_channel_language,this_channel_votes_in_this_country)
             #
             # # print "   Remaining channels "
             current_rank += len(other_channels_with_channel_language)
-            remaining_channels = filter(lambda c: c['language'] != channel_obj['language'], channels)
-            distribute_ranks_among_channels_in_this_country(current_rank,this_country,remaining_channels,this_channel_votes_in_this_country)
+            remaining_channels = [j for j in xrange(electorate.n_channels) if electorate.languages[j] != channel_language]
+            distribute_ranks_among_channels_in_this_country(electorate,current_rank,this_country,remaining_channels,this_channel_votes_in_this_country)
 
     # printChannelVotes(channels)
     # printCountryVotes(country_data_to_use, channels)
     # printCountryWiseDistribution(country_data_to_use)
 
-def distributeEliminatedChannelsVotes(votes_to_distribute,channels_to_distribute_in,this_country):
+# Random passes allowed per subtraction in distributeEliminatedChannelsVotes. A pass only takes from
+# ranks holding strictly more than its draw, so with 0.01 left and every lower rank at 0.01 (or
+# less left in the ranks than to take) it would go round forever. Runs that finish need a handful.
+MAX_TRANSFER_PASSES = 1000
+
+def distributeEliminatedChannelsVotes(ranks,votes_to_distribute,channels_to_distribute_in,k,rng=random):
+    # ranks is a (channels, countries, ranks) tensor, channels_to_distribute_in a list of channel indices.
+    # After MAX_TRANSFER_PASSES the rest comes off the lower ranks in order, as much as each holds.
+    main_other_ranks = range(2, ranks.shape[2]+1)
     while(channels_to_distribute_in): # votes_to_distribute > 0):
         # print "\n   To distribute: " + str(votes_to_distribute)
-        random_channel_select = random.choice(channels_to_distribute_in)
-        random_channel_select_in_country = getChannelCountryDict(random_channel_select,this_country)
-        main_other_ranks = filter(lambda r: r != 1, random_channel_select_in_country['ranks'].keys())
+        random_channel_select = rng.choice(channels_to_distribute_in)
+        random_channel_select_ranks = ranks[random_channel_select, k]
         if(len(channels_to_distribute_in) == 1):
             votes_to_add_to_1_rank = votes_to_distribute
         else:
-            votes_to_add_to_1_rank = round(random.uniform(0,votes_to_distribute),2)
-        # print  "      Votes added to 1 rank of " + str(random_channel_select['name']) + ": " + str(votes_to_add_to_1_rank)
-        random_channel_select_in_country['ranks'][1] = round((random_channel_select_in_country['ranks'][1] + votes_to_add_to_1_rank),2)
+            votes_to_add_to_1_rank = round(rng.uniform(0,votes_to_distribute),2)
+        # print  "      Votes added to 1 rank of channel " + str(random_channel_select) + ": " + str(votes_to_add_to_1_rank)
+        random_channel_select_ranks[0] = round((random_channel_select_ranks[0] + votes_to_add_to_1_rank),2)
         votes_to_subtract_from_other_ranks = votes_to_add_to_1_rank
+        passes = 0
         while(votes_to_subtract_from_other_ranks > 0):
+            if(passes == MAX_TRANSFER_PASSES):
+                instrument.count('transfer_pass_limit')
+                for rank in main_other_ranks:
+                    taken = min(random_channel_select_ranks[rank-1], votes_to_subtract_from_other_ranks)
+                    random_channel_select_ranks[rank-1] = round((random_channel_select_ranks[rank-1] - taken),2)
+                    votes_to_subtract_from_other_ranks = round((votes_to_subtract_from_other_ranks - taken),2)
+                break
+            passes += 1
+            if(instrument.enabled):
+                instrument.count('transfer_passes')
             other_ranks = copy.copy(main_other_ranks)
             while(other_ranks): # votes_to_subtract_from_other_ranks > 0):
+                if(instrument.enabled):
+                    instrument.count('transfer_iterations')
                 # print "        votes to subtract from all: " + str(votes_to_subtract_from_other_ranks)
-                random_rank_select = random.choice(other_ranks)
+                random_rank_select = rng.choice(other_ranks)
                 # print "        for rank " + str(random_rank_select)
                 if(len(other_ranks) == 1):
                     random_votes_to_subtract = votes_to_subtract_from_other_ranks
                 else:
-                    random_votes_to_subtract = round(random.uniform(0,votes_to_subtract_from_other_ranks),2)
+                    random_votes_to_subtract = round(rng.uniform(0,votes_to_subtract_from_other_ranks),2)
                 # print "          to subtract from this: " + str(random_votes_to_subtract)
-                # print "          this has? " + str(random_channel_select_in_country['ranks'][random_rank_select])
-                if(random_channel_select_in_country['ranks'][random_rank_select] > random_votes_to_subtract):
+                # print "          this has? " + str(random_channel_select_ranks[random_rank_select-1])
+                if(random_channel_select_ranks[random_rank_select-1] > random_votes_to_subtract):
                     # print "          boom"
-                    random_channel_select_in_country['ranks'][random_rank_select] = round((random_channel_select_in_country['ranks'][random_rank_select] - random_votes_to_subtract),2)
+                    random_channel_select_ranks[random_rank_select-1] = round((random_channel_select_ranks[random_rank_select-1] - random_votes_to_subtract),2)
                     votes_to_subtract_from_other_ranks = round((votes_to_subtract_from_other_ranks - random_votes_to_subtract),2)
                     # print "             votes remaining for next rank loop: " + str(votes_to_subtract_from_other_ranks)
                 else:
@@ -263,92 +319,98 @@ def distributeEliminatedChannelsVotes(votes_to_distribute,channels_to_distribute
         votes_to_distribute -= votes_to_add_to_1_rank
         channels_to_distribute_in.remove(random_channel_select)
 
-def winner_irv(channels,country_data_to_use):
-    print "\n------------- INITIATING RANKED VOTING - IRV -------------\n"
-    results = {}
-    for channel_obj in channels:
-        results[channel_obj['name']] = 0
-
-    channels_copied = copy.deepcopy(channels)
-
-    for country_obj in country_data_to_use:
-        this_country = country_obj['country']
-        this_country_population = country_obj['useful_count']
-        # print "=============="
-        # print str(this_country) + " with " + str(this_country_population)
-
-        # to handle and skip countries where all 1 ranks are 0
-        non_zero_1_ranks_channels = filter(lambda c: getChannelCountryDict(c,this_country)['ranks'][1] != 0, channels_copied)
-        if(len(non_zero_1_ranks_channels)):
-            winner = {}
-            while(not winner):
-                lowest_1_rank = float('inf')
-                channel_to_eliminate = {}
-                for channel_obj in non_zero_1_ranks_channels:
-                    if(not winner):
-                        this_channel_1_ranks_in_this_country = getChannelCountryDict(channel_obj,this_country)['ranks'][1]
-                        # print "    1 ranks for " + str(channel_obj['name']) + ": " + str(this_channel_1_ranks_in_this_country)
-                        if(this_channel_1_ranks_in_this_country > (this_country_population/2.0)):
-                            winner = channel_obj
-                        else:
-                            if(this_channel_1_ranks_in_this_country < lowest_1_rank):
-                                lowest_1_rank = this_channel_1_ranks_in_this_country
-                                channel_to_eliminate = channel_obj
-                if(not winner):
-                    # print "        Eliminated " + str(channel_to_eliminate['name'])
-                    channel_to_eliminate_1_ranks_in_this_country = lowest_1_rank
-                    non_eliminated_channels = filter(lambda c: c['name'] != channel_to_eliminate['name'], non_zero_1_ranks_channels)
-                    distributeEliminatedChannelsVotes(channel_to_eliminate_1_ranks_in_this_country,non_eliminated_channels,this_country)
-                    # print [c['name'] for c in non_zero_1_ranks_channels]
-                    non_zero_1_ranks_channels.remove(channel_to_eliminate)
-
-
-    # printChannelVotes(channels_copied)
-
-
-            # print "Winner " + str(this_country) + ": " + str(winner['name'])
-            results[winner['name']] += 1
-
-    print "\nSeats distribution for " + str(len(country_data_to_use)) + " seats (countries):"
-    print sorted(results.items(), key=itemgetter(1), reverse = True)
-    print "\n"
-    print max(results.iterkeys(), key=lambda x: results[x]) + " forms government!"
-    print "\n"
-
-def winner_ranked_borda_count(channels,country_data_to_use):
-    print "\n------------- INITIATING RANKED VOTING - BORDA COUNT -------------\n"
-    results = {}
-    for channel_obj in channels:
-        results[channel_obj['name']] = 0
-
-    channels_copied = copy.deepcopy(channels)
-
+def irv_loop_winner(ranks_copied,k,this_country_population,distribute=distributeEliminatedChannelsVotes):
+    # Original elimination loop for one country; mutates ranks_copied. Returns -1 if nobody has 1 ranks.
+    # distribute(ranks, votes, channels, k) hands out an eliminated channel's votes.
+    # to handle and skip countries where all 1 ranks are 0
+    non_zero_1_ranks_channels = list(np.flatnonzero(ranks_copied[:, k, 0] != 0))
+    if(not len(non_zero_1_ranks_channels)):
+        return -1
+    winner = None
+    while(winner is None):
+        lowest_1_rank = float('inf')
+        channel_to_eliminate = None
+        for channel_index in non_zero_1_ranks_channels:
+            if(winner is None):
+                this_channel_1_ranks_in_this_country = ranks_copied[channel_index, k, 0]
+                # print "    1 ranks for channel " + str(channel_index) + ": " + str(this_channel_1_ranks_in_this_country)
+                if(this_channel_1_ranks_in_this_country > (this_country_population/2.0)):
+                    winner = channel_index
+                else:
+                    if(this_channel_1_ranks_in_this_country < lowest_1_rank):
+                        lowest_1_rank = this_channel_1_ranks_in_this_country
+                        channel_to_eliminate = channel_index
+        if(winner is None):
+            instrument.count('elimination_rounds')
+            # print "        Eliminated channel " + str(channel_to_eliminate)
+            channel_to_eliminate_1_ranks_in_this_country = lowest_1_rank
+            non_eliminated_channels = [c for c in non_zero_1_ranks_channels if c != channel_to_eliminate]
+            distribute(ranks_copied,channel_to_eliminate_1_ranks_in_this_country,non_eliminated_channels,k)
+            # print non_zero_1_ranks_channels
+            non_zero_1_ranks_channels.remove(channel_to_eliminate)
+    return winner
+
+@instrument.timed()
+def winner_irv(electorate,country_data_to_use,transfer='random',arithmetic='float',rng=random):
+    # transfer='random' or 'equal' runs the batched first-preference engine in irv.py,
+    # transfer='loop' the original per-country elimination with distributeEliminatedChannelsVotes,
+    # or with arithmetic='exact' the same loop in whole voters (exact.irv_loop_winner).
+    # transfer='ranked_random' or 'ranked_proportional' runs the original loop with the bounded
+    # transfers of transfers.py, which keep the rank rows consistent like 'loop' does.
+    # The loops rewrite rank rows on an overlay (electorate.py), one country block at a time, so the
+    # electorate passed in is never changed. rng: random.Random-like; numpy draws are seeded from it
+    # unless it is the random module itself.
+    run = electorate.overlay()
+    np_rng = None if rng is random else np.random.RandomState(rng.getrandbits(32))
+    if(transfer.startswith('ranked_') and transfer[len('ranked_'):] in RANKED_TRANSFERS):
+        mode = transfer[len('ranked_'):]
+        def distribute(ranks, votes, channels, k):
+            transfer_eliminated(ranks[:, k], votes, channels, mode, np_rng)
+        winners = []
+        for country_obj in country_data_to_use:
+            winners.append(irv_loop_winner(run.writable_ranks(electorate.country(country_obj['country']))[:, None],0,country_obj['useful_count'],distribute))
+    elif(transfer == 'loop' and arithmetic == 'exact'):
+        ranks_in_units = exact.to_units(electorate.ranks)
+        instrument.count('rank_copies')
+        winners = []
+        for country_obj in country_data_to_use:
+            winners.append(exact.irv_loop_winner(ranks_in_units,electorate.country(country_obj['country']),exact.to_units(country_obj['useful_count']),rng))
+    elif(transfer == 'loop'):
+        def distribute(ranks, votes, channels, k):
+            distributeEliminatedChannelsVotes(ranks, votes, channels, k, rng)
+        winners = []
+        for country_obj in country_data_to_use:
+            # print "=============="
+            # print str(country_obj['country']) + " with " + str(country_obj['useful_count'])
+            winners.append(irv_loop_winner(run.writable_ranks(electorate.country(country_obj['country']))[:, None],0,country_obj['useful_count'],distribute))
+    else:
+        country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+        winners = irv_winners(electorate.ranks[:, country_indices, 0].T, [c['useful_count'] for c in country_data_to_use], transfer, np_rng)
+
+    return ElectionResult.from_winners('irv', "RANKED VOTING - IRV", electorate, country_data_to_use, winners)
+
+@instrument.timed()
+def winner_ranked_borda_count(electorate,country_data_to_use):
+    all_ranks = np.arange(1, electorate.n_ranks+1)
+    winners = []
+    margins = []
     for country_obj in country_data_to_use:
         this_country = country_obj['country']
         # print "___ ___ ___ ___ ___ ___"
         # print this_country
-        lowest_rank_sum = float('inf')
-        winner = {}
-
-        for channel_obj in channels_copied:
-            this_channel_ranks_in_this_country = getChannelCountryDict(channel_obj,this_country)['ranks']
-            # print "    " + str(channel_obj['name']) + ": " + str(this_channel_ranks_in_this_country)
-            all_ranks = this_channel_ranks_in_this_country.keys()
-            all_ranks_sum = sum(map(lambda r: r*this_channel_ranks_in_this_country[r], all_ranks))
-            # print "    " + str(channel_obj['name']) + ": " + str(all_ranks_sum)
-            if(all_ranks_sum < lowest_rank_sum):
-                lowest_rank_sum = all_ranks_sum
-                winner = channel_obj
+        all_ranks_sums = electorate.ranks[:, electorate.country(this_country), :].dot(all_ranks)
+        # print zip(electorate.channel_names, all_ranks_sums)
+        winner = all_ranks_sums.argmin()
+        lowest_rank_sum = all_ranks_sums[winner]
 
         if(lowest_rank_sum > 0):
-            # print "Winner " + str(this_country) + ": " + str(winner['name'])
-            results[winner['name']] += 1
+            # print "Winner " + str(this_country) + ": " + str(electorate.channel_names[winner])
+            winners.append(winner)
+        else:
+            winners.append(-1)
+        margins.append(runner_up_margin(-all_ranks_sums))
 
-    print "\nSeats distribution for " + str(len(country_data_to_use)) + " seats (countries):"
-    print sorted(results.items(), key=itemgetter(1), reverse = True)
-    print "\n"
-    print max(results.iterkeys(), key=lambda x: results[x]) + " forms government!"
-    print "\n"
+    return ElectionResult.from_winners('borda', "RANKED VOTING - BORDA COUNT", electorate, country_data_to_use, winners, margins)
 
 # def diff_in_sum_of_diagonally_opposite(c1,c2,rank,all_ranks):
 #     remaining_ranks_here = filter(lambda r: r > rank, all_ranks)
@@ -360,122 +422,60 @@ def winner_ranked_borda_count(channels,country_data_to_use):
 #     #     return False
 #     return (c1['ranks'][rank] - remaining_c2_votes_sum)
 
-def subtract_from_other_channel(c1_test, c2_test, rank, lower_ranks, this_country):
-    channel1_ranks_in_this_country = getChannelCountryDict(c1_test,this_country)['ranks']
-    channel2_ranks_in_this_country = getChannelCountryDict(c2_test,this_country)['ranks']
-    c1_votes = 0
-    channel1_votes_here = channel1_ranks_in_this_country[rank]
-    non_channel1_zero_ranks = filter(lambda lr: channel1_ranks_in_this_country[lr] != 0, lower_ranks)
-    non_channel1_zero_ranks = sorted(non_channel1_zero_ranks, key=lambda r: channel2_ranks_in_this_country[r], reverse=True)
-    # print non_channel1_zero_ranks
-    for non_zero_rank in non_channel1_zero_ranks:
-        to_subtract = min(channel1_votes_here, channel2_ranks_in_this_country[non_zero_rank])
-        c1_votes += to_subtract
-        channel1_ranks_in_this_country[rank] = round((channel1_ranks_in_this_country[rank] - to_subtract),2)
-        channel1_votes_here = round((channel1_votes_here - to_subtract),2)
-        channel2_ranks_in_this_country[non_zero_rank] = round((channel2_ranks_in_this_country[non_zero_rank] - to_subtract),2)
-
-    if(channel1_votes_here):
-        channel2_ranks = sorted(lower_ranks, key=lambda r: channel2_ranks_in_this_country[r], reverse=True)
-        for c2_rank in channel2_ranks:
-            to_subtract = min(channel1_votes_here, channel2_ranks_in_this_country[c2_rank])
-            c1_votes += to_subtract
-            channel1_ranks_in_this_country[rank] = round((channel1_ranks_in_this_country[rank] - to_subtract),2)
-            channel1_votes_here = round((channel1_votes_here - to_subtract),2)
-            channel2_ranks_in_this_country[c2_rank] = round((channel2_ranks_in_this_country[c2_rank] - to_subtract),2)
-
-    return c1_votes
-
-def winner_ranked_condorcet(channels,country_data_to_use):
+@instrument.timed()
+def winner_ranked_condorcet(electorate,country_data_to_use,arithmetic='float'):
     # channels_test = [
     #     {'name':'A','ranks':{1: 1, 2: 4, 3: 2, 4: 0}},
     #     {'name':'B','ranks':{1: 3, 2: 0, 3: 0, 4: 4}},
     #     {'name':'C','ranks':{1: 1, 2: 2, 3: 2, 4: 2}},
     #     {'name':'D','ranks':{1: 2, 2: 1, 3: 3, 4: 1}}
     # ]
-    print "\n------------- INITIATING RANKED VOTING - CONDORCET -------------\n"
-    results = {}
-    for channel_obj in channels:
-        results[channel_obj['name']] = 0
-
-    channels_copied = copy.deepcopy(channels)
-    total_channels = len(channels_copied)
-    total_ranks = (channels_copied[0]['distribution'][0]['ranks']).keys()
-
-    for country_obj in country_data_to_use:
-        this_country = country_obj['country']
-        # print "___ ___ ___ ___ ___ ___"
-        # print this_country
-
-        channel_winners = [{'name': c['name'], 'wins_against': 0} for c in channels_copied]
-        channel_winners.append({'name': 'NO WINNER', 'wins_against': 0})
-
-        for ci in xrange(total_channels):
-            c1 = channels[ci]
-            for cj in xrange((ci+1),total_channels):
-                c2 = channels[cj]
-                c1_test = copy.deepcopy(c1)
-                c2_test = copy.deepcopy(c2)
-                c1_votes = 0
-                c2_votes = 0
-
-                for rank in total_ranks:
-                    # print "Rank: " + str(rank)
-                    lower_ranks = filter(lambda r: r > rank, total_ranks)
-
-                    # Channel 1:
-                    c1_votes += subtract_from_other_channel(c1_test, c2_test, rank, lower_ranks, this_country)
-
-                    # Channel 2:
-                    c2_votes += subtract_from_other_channel(c2_test, c1_test, rank, lower_ranks, this_country)
-
-                if(c1_votes > c2_votes):
-                    winner = c1
-                elif(c1_votes < c2_votes):
-                    winner = c2
-                else:
-                    winner = {'name': 'NO WINNER'}
-
-                channel_winner_obj = filter(lambda c: c['name'] == winner['name'], channel_winners)[0]
-                channel_winner_obj['wins_against'] += 1
-
-
-                # print str(c1['name']) + ": " + str(c1_votes)
-                # print str(c2['name']) + ": " + str(c2_votes)
-                # print "Winner: " + str(winner['name'])
-                # print "\n"
-
-        # print channel_winners
-        probable_ultimate_winner = max(filter(lambda c: c['name'] != 'NO WINNER', channel_winners), key=lambda w:w['wins_against'])
-        if(probable_ultimate_winner['wins_against'] == (total_channels - 1)):
-            # print "----------------\nUltimate winner: " + str(probable_ultimate_winner['name'])
-            results[probable_ultimate_winner['name']] += 1
-        else:
-            # print "----------------\nNO WINNER:"
-            pass
-
-    print "\nSeats distribution for " + str(len(country_data_to_use)) + " seats (countries):"
-    print sorted(results.items(), key=itemgetter(1), reverse = True)
-    print "\n"
-    print max(results.iterkeys(), key=lambda x: results[x]) + " forms government!"
-    print "\n"
-
-
-def votes_distribution_exclusive(channels,country_data_to_use):
-    subs_in_home_country_percentage = 20                    # x = 20 %
-    subs_in_home_language_countries_percentage = 50         # y = 50 %
-    # rest in rest
-
-    for channel_obj in channels:
+    return winner_pairwise(electorate,country_data_to_use,'condorcet',arithmetic)
+
+@instrument.timed()
+def winner_pairwise(electorate,country_data_to_use,method='condorcet',arithmetic='float'):
+    # Any of pairwise.PAIRWISE_METHODS, all read from the cached pairwise matrix. Only Copeland has
+    # a per-country tally to take margins from (its scores). arithmetic='exact' matches the rank
+    # buckets in whole voters, where subtract_from_other_channel's rounding never bites.
+    country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+    ranks = electorate.ranks
+    if(arithmetic == 'exact'):
+        ranks = exact.to_units(ranks)
+    pairwise_tallies = pairwise_results(pairwise_matrix(ranks)[country_indices])
+    margins = None
+    if(method == 'copeland'):
+        margins = [runner_up_margin(scores) for scores in pairwise_tallies['copeland_scores']]
+    # winner -1: "NO WINNER"
+    return ElectionResult.from_winners(method, "RANKED VOTING - " + method.upper().replace('_', ' '), electorate, country_data_to_use, pairwise_tallies[method], margins)
+
+@instrument.timed()
+def winner_copeland(electorate,country_data_to_use,arithmetic='float'):
+    return winner_pairwise(electorate,country_data_to_use,'copeland',arithmetic)
+
+@instrument.timed()
+def winner_schulze(electorate,country_data_to_use,arithmetic='float'):
+    return winner_pairwise(electorate,country_data_to_use,'schulze',arithmetic)
+
+@instrument.timed()
+def winner_ranked_pairs(electorate,country_data_to_use,arithmetic='float'):
+    return winner_pairwise(electorate,country_data_to_use,'ranked_pairs',arithmetic)
+
+
+@instrument.timed()
+def votes_distribution_exclusive(electorate,country_data_to_use,subs_in_home_country_percentage=20,subs_in_home_language_countries_percentage=50):
+    # subs_in_home_country_percentage is x, subs_in_home_language_countries_percentage y (see the
+    # header); the rest goes to the rest. sweep.py evaluates many (x, y) at once.
+
+    electorate.counts[:] = 0
+    for i, channel_obj in enumerate(electorate.channels):
         channel_country = channel_obj['country']
         channel_language = channel_obj['language']
         channel_subs = channel_obj['subs']
-        channel_obj['distribution'] = []
         # total_voters = sum(x['count'] for x in country_data_to_use)
 
         if(channel_country in map(lambda x: x['country'], country_data_to_use)):
             subs_in_home_country = channel_obj['subs'] * subs_in_home_country_percentage/100
-            channel_obj['distribution'].append({'country': channel_country, 'count': round((subs_in_home_country * pow(10,-6)),2)})
+            electorate.counts[i, electorate.country(channel_country)] = round((subs_in_home_country * pow(10,-6)),2)
             channel_subs -= subs_in_home_country
             # total_voters = sum(x['count'] for x in filter(lambda y: y['country'] != channel_country, country_data_to_use))
             # if(channel_obj['name'] == 'T-Series'):
@@ -497,7 +497,7 @@ def votes_distribution_exclusive(channels,country_data_to_use):
             #     print country_obj['country'] + " has: "
             #     print subs_in_this_home_language_country
             if(subs_in_this_home_language_country > 0):
-                channel_obj['distribution'].append({'country': country_obj['country'], 'count': round((subs_in_this_home_language_country * pow(10,-6)),2)})
+                electorate.counts[i, electorate.country(country_obj['country'])] = round((subs_in_this_home_language_country * pow(10,-6)),2)
                 covered_countries.append(country_obj['country'])
         channel_subs -= subs_in_home_language_countries
 
@@ -509,124 +509,153 @@ def votes_distribution_exclusive(channels,country_data_to_use):
             subs_in_this_country = (channel_subs * (country_obj['count'] / total_remaining_voters) * pow(10,-6))
 
             # * (channel_obj['subs']/total_votes)
-            channel_obj['distribution'].append({'country': country_obj['country'], 'count': round(subs_in_this_country,2)})
+            electorate.counts[i, electorate.country(country_obj['country'])] = round(subs_in_this_country,2)
             # (80 * 10^6) * [(167.4 * 10^6)/(total * 10^6)] = (80 * 10^6) * [167.4/total]
 
-    count = 0
-    for o in country_data_to_use:
-        count += o['count']
-        print o
-    print count
-
-    printChannelVotes(channels)
-    printCountryVotes(country_data_to_use, channels)
+    # printChannelVotes(electorate)
+    # printCountryVotes(country_data_to_use, electorate)
+    # (or results.ConsoleReporter().electorate(electorate, country_data_to_use))
 
 
-def winner_approval_rating(all_channels,all_countries):
+@instrument.timed()
+def winner_approval_rating(electorate,all_countries,rng=random):
     # print "// constructing voter population..."
     # votes_distribution_exclusive(all_channels,all_countries)
 
     # printChannelVotes(all_channels)
     # printCountryWiseDistribution(all_countries)
 
-    print "\n------------- INITIATING APPROVAL VOTING -------------\n"
-    results = {}
-    for channel_obj in all_channels:
-        results[channel_obj['name']] = 0
-
+    winners = []
+    margins = []
     for country_obj in all_countries:
         this_country = country_obj['country']
         # print "________________________"
         # print this_country
         max_votes_in_this_country = 0
-        winner = {}
+        winner = -1
+        approvals = []
 
         total_votes_in_country = country_obj['useful_count']
-        for channel_obj in all_channels:
-            this_channel_base_votes_in_this_country = getChannelCountryDict(channel_obj,this_country)['count']
-            # print "    " + str(channel_obj['name']) + ": " + str(this_channel_base_votes_in_this_country)
+        for channel_index, this_channel_base_votes_in_this_country in enumerate(electorate.counts[:, electorate.country(this_country)]):
+            # print "    " + str(electorate.channel_names[channel_index]) + ": " + str(this_channel_base_votes_in_this_country)
             # difference_to_total = total_votes_in_country - this_channel_base_votes_in_this_country
 
-            this_channel_actual_votes_in_this_country = round(random.uniform(this_channel_base_votes_in_this_country,total_votes_in_country),2)
-            # print "    " + str(channel_obj['name']) + ": " + str(this_channel_actual_votes_in_this_country)
+            this_channel_actual_votes_in_this_country = round(rng.uniform(this_channel_base_votes_in_this_country,total_votes_in_country),2)
+            # print "    " + str(electorate.channel_names[channel_index]) + ": " + str(this_channel_actual_votes_in_this_country)
+            approvals.append(this_channel_actual_votes_in_this_country)
 
             if(this_channel_actual_votes_in_this_country > max_votes_in_this_country):
                 max_votes_in_this_country = this_channel_actual_votes_in_this_country
-                winner = channel_obj
+                winner = channel_index
         # print "Total population involved in voting: " + str(total_votes_in_country)
-
-        if(winner):
-            print "Winner " + str(this_country) + ": " + str(winner['name'])
-            results[winner['name']] += 1
-
-    print "\nSeats distribution for " + str(len(all_countries)) + " seats (countries):"
-    print sorted(results.items(), key=itemgetter(1), reverse = True)
-    print "\n"
-    print max(results.iterkeys(), key=lambda x: results[x]) + " forms government!"
-    print "\n"
-
-def distribute_score_votes(channel,country,votes):
+        winners.append(winner)
+        margins.append(runner_up_margin(approvals))
+
+    return ElectionResult.from_winners('approval', "APPROVAL VOTING", electorate, all_countries, winners, margins)
+
+def distribute_score_votes(electorate,channel,country,votes,arithmetic='float',rng=random,overlay=None):
+    # Writes the random score ballots (tally.score_ballots, or exact.score_ballots in whole voters
+    # with arithmetic='exact') over the channel's rank row in `overlay`, or in electorate.ranks
+    # itself without one.
+    rows = electorate.ranks[:, country] if overlay is None else overlay.writable_ranks(country)
+    if(votes and arithmetic == 'exact'):
+        ballots, rating = exact.score_ballots(exact.to_units(electorate.counts[channel, country]), electorate.n_ranks, exact.to_units(votes), rng)
+        rows[channel] = exact.to_millions(ballots, None)
+        return rating
     if votes:
-        channel_country_obj = getChannelCountryDict(channel,country)
-        total_ranks = (channel['distribution'][0]['ranks']).keys()
-        new_ranks_obj = {r: 0 for r in total_ranks}
-        total_votes = votes
-        score = 0
-        # giving channel's country subs as minimum 1 ranks.
-        new_ranks_obj[(len(total_ranks))] = channel_country_obj['count']
-        total_votes -= channel_country_obj['count']
-        random.shuffle(total_ranks)
-        for rank in total_ranks:
-            if(rank == total_ranks[-1]):
-                new_ranks_obj[rank] = round((new_ranks_obj[rank] + total_votes),2)
-                score += (rank * new_ranks_obj[rank])
-            else:
-                new_votes = round(random.uniform(0,total_votes),2)
-                new_ranks_obj[rank] = round((new_ranks_obj[rank] + new_votes),2)
-                score += (rank * new_ranks_obj[rank])
-                total_votes -= new_votes
-
-        channel_country_obj['ranks'] = new_ranks_obj
-        # print channel_country_obj
-        return round((score/votes),2)
+        rows[channel], rating = score_ballots(electorate.counts[channel, country], electorate.n_ranks, votes, rng)
+        # print rows[channel]
+        return rating
     return 0
 
 
-def winner_score_voting(channels, countries):
-    # printChannelVotes(channels)
+@instrument.timed()
+def winner_score_voting(electorate, countries, arithmetic='float', rng=random, overlay=None):
+    # The ballots go to `overlay` (a fresh electorate.overlay() by default), never to electorate.
+    # printChannelVotes(electorate)
     # printCountryWiseDistribution(countries)
-    print "\n------------- INITIATING SCORE VOTING -------------\n"
-    results = {}
-    for channel_obj in channels:
-        results[channel_obj['name']] = 0
-
-    channels_copied = copy.deepcopy(channels)
-    total_channels = len(channels_copied)
-
+    if(overlay is None):
+        overlay = electorate.overlay()
+    total_channels = electorate.n_channels
+    winners = []
+    margins = []
     for country_obj in countries:
         this_country = country_obj['country']
-        print "___ ___ ___ ___ ___ ___"
-        print this_country
         max_average = 0
-        winner = {}
+        winner = -1
+        ratings = []
 
-        for channel_obj in channels:
-            # print "     " + str(channel_obj['name'])
-            rating = distribute_score_votes(channel_obj,this_country,country_obj['useful_count'])
+        for channel_index in xrange(total_channels):
+            # print "     " + str(electorate.channel_names[channel_index])
+            rating = distribute_score_votes(electorate,channel_index,electorate.country(this_country),country_obj['useful_count'],arithmetic,rng,overlay)
             # print "       " + str(rating)
+            ratings.append(rating)
             if rating > max_average:
                 max_average = rating
-                winner = channel_obj
-
-        if(winner):
-                print "Winner " + str(this_country) + ": " + str(winner['name'])
-                results[winner['name']] += 1
-
-    print "\nSeats distribution for " + str(len(countries)) + " seats (countries):"
-    print sorted(results.items(), key=itemgetter(1), reverse = True)
-    print "\n"
-    print max(results.iterkeys(), key=lambda x: results[x]) + " forms government!"
-    print "\n"
+                winner = channel_index
+        winners.append(winner)
+        margins.append(runner_up_margin(ratings))
+
+    return ElectionResult.from_winners('score', "SCORE VOTING", electorate, countries, winners, margins)
+
+@instrument.timed()
+def winner_ballots(electorate,country_data_to_use,method='fptp',voters=10**6,seed=0):
+    # Any winner_methods method run on `voters` sampled ballots (split by useful_count) instead of
+    # the rank buckets; see ballots.py. Only needs the first-preference counts.
+    country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+    ballot_box = BallotBox(electorate, country_indices, voters_per_country([c['useful_count'] for c in country_data_to_use], voters), seed)
+    return ElectionResult.from_winners(method, "BALLOT-LEVEL VOTING - " + method.upper().replace('_', ' '), electorate, country_data_to_use, ballot_box.winners(method))
+
+@instrument.timed()
+def winner_weighted(electorate,country_data_to_use,method='irv',conversion='model'):
+    # fptp, irv, borda or a pairwise method over distinct weighted rankings (weighted.py), built
+    # from the first-preference counts (conversion='model') or decomposed from electorate.ranks
+    # (conversion='ranks', fptp and borda only: the decomposition is one of many ballot sets with
+    # those ranks and the other methods' winners depend on which; see weighted.py).
+    if(conversion == 'ranks' and method not in RANKS_METHODS):
+        raise ValueError("conversion='ranks' only decides " + ", ".join(RANKS_METHODS) + ", not " + str(method))
+    country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+    if(conversion == 'ranks'):
+        weighted_ballots = WeightedBallots.from_ranks(electorate.ranks, country_indices)
+    else:
+        weighted_ballots = WeightedBallots.from_electorate(electorate, country_indices)
+    return ElectionResult.from_winners(method, "WEIGHTED-BALLOT VOTING - " + method.upper().replace('_', ' '), electorate, country_data_to_use, weighted_ballots.winners(method))
+
+@instrument.timed()
+def winner_sharded(electorate,country_data_to_use,method='fptp',processes=None,seed=None,**method_options):
+    # Any winner_methods method decided country by country from compact per-country slices,
+    # sharded over `processes` pool workers (1: in this process); see tally.py. Seeded runs give
+    # the same seats for any number of processes.
+    slices = country_slices(electorate, country_data_to_use, ranked=(method in ranked_methods))
+    winners = tally_winners(method, slices, seed, processes, **method_options)
+    return ElectionResult.from_winners(method, "SHARDED VOTING - " + method.upper().replace('_', ' '), electorate, country_data_to_use, winners)
+
+@instrument.timed()
+def compare_all(electorate,country_data_to_use,methods=TALLY_METHODS,seed=None,processes=1,method_options=None):
+    # Every method's winner in every country from one pass over the per-country slices (tally.py):
+    # each country's columns are cut out once and the pairwise matrix is built once (per shard) for
+    # all the Condorcet-family methods. Method m's row is what winner_sharded(method, seed=seed) elects.
+    # method_options: {method: {option: value}}.
+    slices = country_slices(electorate, country_data_to_use, ranked=any(method in ranked_methods for method in methods))
+    winners = compare_winners(methods, slices, seed, processes, method_options)
+    country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+    return ComparisonResult(methods, electorate.channel_names, [c['country'] for c in country_data_to_use], winners,
+                            np.round(electorate.counts[:, country_indices].sum(axis=0), 2))
+
+
+population_shaper = PopulationShaper()
+
+winner_methods = {
+    'fptp': winner_fptp,
+    'irv': winner_irv,
+    'borda': winner_ranked_borda_count,
+    'condorcet': winner_ranked_condorcet,
+    'copeland': winner_copeland,
+    'schulze': winner_schulze,
+    'ranked_pairs': winner_ranked_pairs,
+    'approval': winner_approval_rating,
+    'score': winner_score_voting,
+}
 
 
 
@@ -664,34 +693,15 @@ def winner_score_voting(channels, countries):
 #     print "Useful population: " + str(sum(c['useful_count'] for c in useful_scaled_down))                        # should be = total subs count
 #     return useful_scaled_down
 
+@instrument.timed('population_shaping')
 def shapeCountryPopulationDataAccordingToLanguages_Attempt2(channels, countries):
-    language_data = {}
-    for channel in channels:
-        if(channel['language'] in language_data):
-            language_data[channel['language']]['subs'] += round(channel['subs'] * pow(10,-6),2)
-        else:
-            language_data[channel['language']] = {'subs': round(channel['subs'] * pow(10,-6),2)}
-
-    all_languages = language_data.keys()
-    for lang in all_languages:
-        language_data[lang]['population'] = round(sum(map(lambda country: ((country['count'] * country['languages'][lang]) / 100), countries)),2)
-    # print language_data
-
-    countries_copy = copy.deepcopy(countries)
-
-    for country_obj in countries_copy:
-        subset_of_language_data = {}
-        total_size_of_subset = 0
-        for language in all_languages:
-            this_language_population = round((((country_obj['count'] * country_obj['languages'][language]) / 100) * (language_data[language]['subs']/language_data[language]['population']) ),2)
-            subset_of_language_data[language] = this_language_population
-            total_size_of_subset += this_language_population
-
-        country_obj['useful_count'] = round(total_size_of_subset,2)
-        country_obj['useful_languages'] = subset_of_language_data
+    # Per language: subs (sum of channels' million subs) and population (speakers across countries).
+    # Every country's language population is scaled by subs/population; see shaping.py. Results are
+    # memoized on the inputs' content, and sub-count changes only recompute the affected language.
+    countries_copy = population_shaper.shape(channels, countries)
 
     # printCountryWiseDistribution(countries_copy)
-    print "Useful population: " + str(sum(c['useful_count'] for c in countries_copy))
+    # print "Useful population: " + str(sum(c['useful_count'] for c in countries_copy))
     return countries_copy
 
 
@@ -759,41 +769,245 @@ channels = [
     }
 ]
 
-total_youtube_population = sum(x['count'] for x in total_monthly_2016_top_15_countries)
-# print "Total YouTube population: " + str(total_youtube_population) + "M"
-total_votes = sum(y['subs'] for y in channels)
-total_votes_million = round((total_votes * pow(10,-6)),2)
-print "Total sub count: " + str(total_votes_million) + "M"
-
-for channel_obj in channels:
-    channel_obj['distribution'] = []
-
-    channels_length = len(channels)
-    channel_ranks = {}
-    for i in xrange(1,channels_length+1):
-        channel_ranks[i] = 0
-
-    for country_obj in total_monthly_2016_top_15_countries:
-        channel_obj['distribution'].append({'country': country_obj['country'], 'count': 0, 'ranks': copy.copy(channel_ranks)})
-
-# print channels
-
-# scaled_up?
-
-# Sum of youtube users across all countries comes GREATER THAN sum of all channel subscribers. This doesn't cause any problem for Approval Voting (vote more than one candidate), since we're splitting each channel's sub base into proportions across countries based on these youtube users' proportions across countries. However, for systems where ONLY one candidate is allowed, we'll have to split the COUNTRY USER BASE in proportion to the channel's sub proportions. This leads to an inconsistency. We assume each channel's default sub base (i.e. for ex: 80M for PewDiePie) to be MUTUALLY EXCLUSIVE (voting only one candidate), i.e. 80M are ONLY PewDiePie's subs. Under this assumption, the addition of all subs across all channels should be equal to total youtube user population, which is not the case as stated before. Therefore, we scale down these country wise populations (in their respective proportions) so that the new sum comes equal to total subscribers.
-# ********* EDIT **********: This is too simplistic, and probably stright up WRONG, refer TODO file for more nuances.
-# temp_copy = copy.deepcopy(total_monthly_2016_top_15_countries)
-# scaled_down_total_monthly_2016_top_15_countries = map(lambda x: changeDictValue(x,'count', round((x['count'] * (total_votes_million/total_youtube_population)),2) ), temp_copy)
-
-# useful_country_data = shapeCountryPopulationDataAccordingToLanguages_Attempt1(total_monthly_2016_top_15_countries)
-useful_country_data = shapeCountryPopulationDataAccordingToLanguages_Attempt2(channels,total_monthly_2016_top_15_countries)
-
-votes_distribution_fptp(channels, useful_country_data)
-# winner_fptp(channels, useful_country_data)
-votes_distribution_ranked_voting(channels, useful_country_data)
-# printChannelVotes(channels)
-# winner_irv(channels,useful_country_data)
-# winner_ranked_borda_count(channels, useful_country_data)
-# winner_ranked_condorcet(channels,useful_country_data)
-# winner_approval_rating(channels,useful_country_data)
-winner_score_voting(channels,useful_country_data)
+@instrument.timed()
+def build_electorate(channels, countries, ranked=True, solver='batched', snapshots=None):
+    # Shapes the country populations and fills the electorate's first-preference counts and, for the
+    # ranked methods, its ranks. Returns (electorate, useful_country_data).
+    # With a snapshots directory the result is saved there once per input hash and mapped back
+    # read-only on every later call (see snapshot.py); electorate.copy() gives writable tensors.
+    if(snapshots is not None):
+        path = snapshot.snapshot_path(snapshots, channels, countries, solver)
+        if(snapshot.has_snapshot(path, ranked)):
+            instrument.count('snapshot_hits')
+        else:
+            instrument.count('snapshot_misses')
+            electorate, useful_country_data = build_electorate(channels, countries, ranked, solver)
+            snapshot.save_snapshot(path, channels, countries, electorate, useful_country_data, solver, ranked)
+        return snapshot.load_snapshot(path, ranked)
+    # useful_country_data = shapeCountryPopulationDataAccordingToLanguages_Attempt1(countries)
+    useful_country_data = shapeCountryPopulationDataAccordingToLanguages_Attempt2(channels,countries)
+    electorate = Electorate(channels, countries)
+
+    # print electorate.counts
+
+    # scaled_up?
+
+    # Sum of youtube users across all countries comes GREATER THAN sum of all channel subscribers. This doesn't cause any problem for Approval Voting (vote more than one candidate), since we're splitting each channel's sub base into proportions across countries based on these youtube users' proportions across countries. However, for systems where ONLY one candidate is allowed, we'll have to split the COUNTRY USER BASE in proportion to the channel's sub proportions. This leads to an inconsistency. We assume each channel's default sub base (i.e. for ex: 80M for PewDiePie) to be MUTUALLY EXCLUSIVE (voting only one candidate), i.e. 80M are ONLY PewDiePie's subs. Under this assumption, the addition of all subs across all channels should be equal to total youtube user population, which is not the case as stated before. Therefore, we scale down these country wise populations (in their respective proportions) so that the new sum comes equal to total subscribers.
+    # ********* EDIT **********: This is too simplistic, and probably stright up WRONG, refer TODO file for more nuances.
+    # temp_copy = copy.deepcopy(total_monthly_2016_top_15_countries)
+    # scaled_down_total_monthly_2016_top_15_countries = map(lambda x: changeDictValue(x,'count', round((x['count'] * (total_votes_million/total_youtube_population)),2) ), temp_copy)
+
+    votes_distribution_fptp(electorate, useful_country_data)
+    if(ranked):
+        votes_distribution_ranked_voting(electorate, useful_country_data, solver)
+    # printChannelVotes(electorate)
+    return electorate, useful_country_data
+
+@instrument.timed()
+def winner_parliament(electorate,country_data_to_use,method='dhondt',total_seats=650,apportionment='largest_remainder'):
+    # total_seats split over the countries by useful_count (seats.apportion), each country's seats
+    # filled by one of seats.SEAT_METHODS from its first preferences, or for 'stv' from its weighted
+    # rankings (weighted.py).
+    country_indices = [electorate.country(c['country']) for c in country_data_to_use]
+    country_seats = apportion([c['useful_count'] for c in country_data_to_use], total_seats, apportionment)
+    if(method == 'stv'):
+        allocation = fill_seats(method, country_seats, ballots=WeightedBallots.from_electorate(electorate, country_indices))
+    else:
+        allocation = fill_seats(method, country_seats, votes=electorate.counts[:, country_indices].T)
+    title = "PARLIAMENT - " + str(total_seats) + " SEATS - " + method.upper().replace('_', ' ')
+    return ParliamentResult(method, title, electorate.channel_names, [c['country'] for c in country_data_to_use], allocation)
+
+# Methods that read electorate.ranks (score voting writes its own).
+ranked_methods = set(['irv', 'borda', 'condorcet', 'copeland', 'schulze', 'ranked_pairs'])
+# Methods taking arithmetic='exact'.
+exact_methods = set(['irv', 'condorcet', 'copeland', 'schulze', 'ranked_pairs', 'score'])
+# Methods drawing random numbers, from rng= (the random module unless given).
+random_methods = set(['fptp', 'irv', 'approval', 'score'])
+
+@instrument.timed()
+def run_concurrently(electorate, country_data_to_use, methods, seed=0, threads=None, method_options=None):
+    # {method: ElectionResult} for every one of `methods`, run on a pool of threads over one
+    # read-only view of the electorate (Electorate.frozen, no copies; methods that rewrite rank rows
+    # do it on their own overlay). Every random method draws from its own random.Random(seed), so
+    # each result equals the isolated run
+    #       winner_methods[method](electorate, country_data_to_use, rng=random.Random(seed), **options)
+    # whatever else runs alongside it. method_options: {method: {option: value}}.
+    from multiprocessing.pool import ThreadPool
+    for method in methods:
+        if(method not in winner_methods):
+            raise ValueError("Unknown voting method: " + str(method))
+    base = electorate.frozen()
+    def run(method):
+        options = dict((method_options or {}).get(method, {}))
+        if(method in random_methods):
+            options['rng'] = random.Random(seed)
+        return winner_methods[method](base, country_data_to_use, **options)
+    pool = ThreadPool(threads or len(methods))
+    try:
+        results = pool.map(run, methods)
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(methods, results))
+
+@instrument.timed()
+def run_election(method, channels=channels, countries=total_monthly_2016_top_15_countries, backend='aggregate', reporter=None, snapshots=None, solver='batched', **method_options):
+    # Runs one of winner_methods end to end on the given (default: bundled) data and returns its
+    # ElectionResult, printed through `reporter` (e.g. results.ConsoleReporter) if one is given.
+    # backend='ballots' votes with sampled ballots (winner_ballots) instead of the aggregate counts,
+    # backend='weighted' with distinct weighted rankings (winner_weighted), backend='sharded' country
+    # by country over a process pool (winner_sharded). arithmetic='exact' (irv with transfer='loop',
+    # the pairwise methods and score) also builds the ranks with solver='exact'. `snapshots` is a
+    # directory to keep built electorates in and `solver` the ranked solver (build_electorate).
+    if(method not in winner_methods):
+        raise ValueError("Unknown voting method: " + str(method))
+    if(backend == 'ballots'):
+        electorate, useful_country_data = build_electorate(channels, countries, ranked=False, snapshots=snapshots)
+        result = winner_ballots(electorate, useful_country_data, method, **method_options)
+    elif(backend == 'weighted'):
+        if(method not in WEIGHTED_METHODS):
+            raise ValueError("The weighted backend runs one of " + ", ".join(WEIGHTED_METHODS) + ", not " + str(method))
+        if(method_options.get('conversion') == 'ranks' and method not in RANKS_METHODS):
+            raise ValueError("conversion='ranks' only decides " + ", ".join(RANKS_METHODS) + ", not " + str(method))
+        electorate, useful_country_data = build_electorate(channels, countries, ranked=(method_options.get('conversion') == 'ranks'), solver=solver, snapshots=snapshots)
+        result = winner_weighted(electorate, useful_country_data, method, **method_options)
+    elif(backend == 'sharded'):
+        electorate, useful_country_data = build_electorate(channels, countries, ranked=(method in ranked_methods), solver=solver, snapshots=snapshots)
+        result = winner_sharded(electorate, useful_country_data, method, **method_options)
+    elif(backend == 'aggregate'):
+        if(method_options.get('arithmetic') == 'exact'):
+            solver = 'exact'
+        electorate, useful_country_data = build_electorate(channels, countries, ranked=(method in ranked_methods), solver=solver, snapshots=snapshots)
+        result = winner_methods[method](electorate, useful_country_data, **method_options)
+    else:
+        raise ValueError("Unknown backend: " + str(backend))
+
+    if(reporter is not None):
+        reporter.population(useful_country_data)
+        reporter.election(result)
+    return result
+
+@instrument.timed()
+def run_parliament(method='dhondt', total_seats=650, channels=channels, countries=total_monthly_2016_top_15_countries, reporter=None, snapshots=None, apportionment='largest_remainder'):
+    # run_election for winner_parliament: returns its ParliamentResult, printed through `reporter`.
+    if(method not in SEAT_METHODS):
+        raise ValueError("Unknown seat allocation method: " + str(method))
+    electorate, useful_country_data = build_electorate(channels, countries, ranked=False, snapshots=snapshots)
+    result = winner_parliament(electorate, useful_country_data, method, total_seats, apportionment)
+    if(reporter is not None):
+        reporter.population(useful_country_data)
+        reporter.parliament(result)
+    return result
+
+@instrument.timed()
+def run_comparison(methods=TALLY_METHODS, channels=channels, countries=total_monthly_2016_top_15_countries, reporter=None, snapshots=None, seed=None, processes=1, solver='batched'):
+    # run_election for compare_all: returns its ComparisonResult, printed through `reporter`.
+    electorate, useful_country_data = build_electorate(channels, countries, ranked=any(method in ranked_methods for method in methods), solver=solver, snapshots=snapshots)
+    result = compare_all(electorate, useful_country_data, methods, seed, processes)
+    if(reporter is not None):
+        reporter.population(useful_country_data)
+        reporter.comparison(result)
+    return result
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Elect a YouTube 'government' from channel subscriber counts.",
+                                     epilog="Live re-tallies from a subscriber feed are a separate Python 3.7+ tool: python3 live.py --help")
+    parser.add_argument('--method', default='score', choices=sorted(winner_methods) + sorted(SEAT_METHODS), help="one seat per country, or with --seats one of " + ", ".join(SEAT_METHODS))
+    parser.add_argument('--countries', help="countries .csv/.jsonl (see loader.py); defaults to the bundled 15 countries")
+    parser.add_argument('--channels', help="channels .csv/.jsonl (see loader.py); defaults to the bundled channels")
+    parser.add_argument('--languages', help="optional long-format country,language,percentage file")
+    parser.add_argument('--backend', default='aggregate', choices=['aggregate', 'ballots', 'weighted', 'sharded'], help="'ballots' samples voter-level ballots (ballots.py), 'weighted' uses distinct weighted rankings (weighted.py), 'sharded' tallies countries over a process pool (tally.py)")
+    parser.add_argument('--voters', type=int, default=10**6, help="ballots to sample across all countries with --backend ballots")
+    parser.add_argument('--seed', type=int, default=0, help="ballot sampling / per-country seed with --backend ballots or sharded, score ballots with --replay")
+    parser.add_argument('--processes', type=int, help="pool workers with --backend sharded (default: one per CPU) or --compare (default: 1, in this process)")
+    parser.add_argument('--seats', type=int, help="total seats to split over the countries by useful population (needs a seat --method)")
+    parser.add_argument('--compare', action='store_true', help="run every method in one pass over the countries (compare_all) and print how far they agree; --seed and --processes apply")
+    parser.add_argument('--coalitions', action='store_true', help="after the election or parliament, form a government (coalition.py): minimal winning coalitions and Banzhaf / Shapley-Shubik power")
+    parser.add_argument('--affinity', choices=['language'], help="with --coalitions, only let channels sharing this attribute govern together")
+    parser.add_argument('--per-country', action='store_true', help="also print every country's winner")
+    parser.add_argument('--instrument', metavar='PATH', help="write stage timers and hot-path counters (instrument.py) as JSON to PATH")
+    parser.add_argument('--instrument-profile', action='store_true', help="with --instrument, also capture a cProfile of the run")
+    parser.add_argument('--instrument-memory', action='store_true', help="with --instrument, also trace memory (Python 3 only)")
+    parser.add_argument('--snapshots', nargs='?', const=snapshot.DEFAULT_DIRECTORY, metavar='DIR', help="keep built electorates in DIR (default " + snapshot.DEFAULT_DIRECTORY + ") and memory-map them on later runs")
+    parser.add_argument('--replay', metavar='SERIES', help="replay a time x channel subs series (.csv with a time,<channel>... header, or .npy; see replay.py) with --method " + ", ".join(replay.REPLAY_METHODS))
+    parser.add_argument('--replay-output', metavar='PATH', help="with --replay, write the seats over time to PATH (.npz)")
+    parser.add_argument('--solver', choices=['batched', 'linprog'], help="ranked distribution solver: 'batched' (the default, rank_allocation.py) or 'linprog' (scipy, one LP per channel, the reference it reproduces)")
+    parser.add_argument('--exact', action='store_true', help="whole-voter arithmetic (exact.py) for irv's original loop, the pairwise methods and score")
+    args = parser.parse_args(argv)
+    if((args.method in SEAT_METHODS) != (args.seats is not None)):
+        parser.error("--seats needs one of the seat methods (" + ", ".join(SEAT_METHODS) + ") and they need --seats")
+    if(args.seats is not None and (args.backend != 'aggregate' or args.exact)):
+        parser.error("--seats only runs with --backend aggregate and without --exact")
+    if(args.replay and (args.method not in replay.REPLAY_METHODS or args.backend != 'aggregate' or args.seats is not None or args.exact)):
+        parser.error("--replay runs one of " + ", ".join(replay.REPLAY_METHODS) + " with --backend aggregate, without --seats or --exact")
+    if(args.compare and (args.backend != 'aggregate' or args.seats is not None or args.exact or args.replay)):
+        parser.error("--compare runs on its own, without --backend, --seats, --exact or --replay")
+    if(args.coalitions and (args.compare or args.replay)):
+        parser.error("--coalitions needs a single election or --seats, not --compare or --replay")
+    if(args.affinity and not args.coalitions):
+        parser.error("--affinity needs --coalitions")
+    if(args.backend == 'weighted' and args.method not in WEIGHTED_METHODS):
+        parser.error("--backend weighted needs --method one of " + ", ".join(WEIGHTED_METHODS) + " (not " + args.method + ")")
+    if(args.exact and args.solver):
+        parser.error("--exact builds its own ranks; --solver does not apply")
+    if(args.replay_output and not args.replay):
+        parser.error("--replay-output needs --replay")
+    if((args.instrument_profile or args.instrument_memory) and not args.instrument):
+        parser.error("--instrument-profile and --instrument-memory need --instrument")
+    if(args.instrument_memory and instrument.tracemalloc is None):
+        parser.error("--instrument-memory needs Python 3 (tracemalloc)")
+    if(args.instrument):
+        instrument.enable(profile=args.instrument_profile, memory=args.instrument_memory)
+
+    election_channels = channels
+    election_countries = total_monthly_2016_top_15_countries
+    if(args.countries or args.channels):
+        import loader
+        if(args.countries):
+            election_countries = loader.load_countries(args.countries, args.languages)
+        if(args.channels):
+            election_channels = loader.load_channels(args.channels, election_countries)
+        loader.fill_missing_languages(election_channels, election_countries)
+
+    total_youtube_population = sum(x['count'] for x in election_countries)
+    # print "Total YouTube population: " + str(total_youtube_population) + "M"
+    total_votes = sum(y['subs'] for y in election_channels)
+    total_votes_million = round((total_votes * pow(10,-6)),2)
+    print "Total sub count: " + str(total_votes_million) + "M"
+
+    method_options = {}
+    if(args.backend == 'ballots'):
+        method_options = {'voters': args.voters, 'seed': args.seed}
+    elif(args.backend == 'sharded'):
+        method_options = {'processes': args.processes, 'seed': args.seed}
+    if(args.exact):
+        if(args.backend != 'aggregate' or args.method not in exact_methods):
+            parser.error("--exact needs --backend aggregate and one of: " + ", ".join(sorted(exact_methods)))
+        method_options = {'arithmetic': 'exact'}
+        if(args.method == 'irv'):
+            method_options['transfer'] = 'loop'
+    reporter = ConsoleReporter(per_country=args.per_country)
+    if(args.compare):
+        run_comparison(TALLY_METHODS, election_channels, election_countries, reporter, args.snapshots, args.seed, args.processes or 1, args.solver or 'batched')
+    elif(args.replay):
+        times, series = replay.load_series(args.replay, [c['name'] for c in election_channels])
+        result = replay.replay(series, election_channels, election_countries, (args.method,), args.seed, times)
+        reporter.replay(result)
+        if(args.replay_output):
+            replay.save_replay(result, args.replay_output)
+    elif(args.seats is not None):
+        result = run_parliament(args.method, args.seats, election_channels, election_countries, reporter, args.snapshots)
+    else:
+        result = run_election(args.method, election_channels, election_countries, args.backend, reporter, args.snapshots, args.solver or 'batched', **method_options)
+    if(args.coalitions):
+        groups = None
+        if(args.affinity):
+            affinity = dict((c['name'], c[args.affinity]) for c in election_channels)
+            groups = [affinity[name] for name in result.channel_names]
+        reporter.coalitions(form_government(result, groups))
+    if(args.instrument):
+        instrument.export_json(args.instrument)
+
+if __name__ == "__main__":
+    main()
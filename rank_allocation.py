@@ -0,0 +1,179 @@
+# Rank-allocation engine for votes_distribution_ranked_voting.
+#
+# Each of a channel's first-preference votes in a country has to be spread over the lower rank
+# slots of the other channels: every channel in a group gets exactly `total` votes, and every rank
+# slot can hold at most `total` votes across the group. The original code solves this per channel
+# with scipy's interior-point linprog,
+#
+#       minimize -sum(x)   subject to   sum(x) = total,  0 <= x_r <= cap_r
+#
+# whose objective is constant on the feasible set, so the answer is wherever the solver stops: a few
+# iterations in, short of the analytic center. No closed form reproduces that point, so this is
+# the same algorithm run for many problems at once: linprog's presolve (slots with no capacity
+# left are fixed at 0), its standard form (a slack per bound) and its homogeneous self-dual
+# predictor-corrector (scipy.optimize._linprog_ip._ip_hsd with the default options). Every problem
+# keeps its own step lengths, iteration count and stopping test. What differs is float rounding
+# (an LU solve here, Cholesky with fallbacks in scipy, and the order of the sums), which leaves x
+# within about 1e-9 votes of linprog's, 1e-5 at worst on the last ill-conditioned steps. That
+# only matters where the split is an exact half cent (equal caps and total / n ending in 5 at the
+# third decimal): both solvers then stop within their 1e-8 tolerance of the half, on a side set
+# by rounding noise, so the two can round 0.01 apart and the channel chain carries it on.
+#
+# On the bundled data every ranked cell equals the linprog path's, so it is the default solver
+# (solver='batched') and linprog stays available as the reference. On small synthetic electorates
+# (benchmarks/synthetic.py) 99 of 110 Condorcet-family and Borda seat vectors match; on larger
+# ones the chain's rounding overfills a slot and linprog raises on its bound (see interior_point).
+
+import numpy as np
+
+# linprog(method='interior-point') defaults
+TOLERANCE = 1e-8
+PRESOLVE_TOLERANCE = 1e-9
+ALPHA0 = .99995
+BETA = 0.1
+MAX_ITERATIONS = 1000
+
+# Python's round(x, 2), elementwise; np.round rounds halves to even and would drift from the
+# per-channel path on exact .xx5 splits.
+_round2 = np.frompyfunc(lambda v: round(v, 2), 1, 1)
+
+
+def round2(values):
+    # np.round(x * 100) / 100 agrees with round(x, 2) unless x * 100 lands within its own rounding
+    # error of a half, so only those entries go through round() itself.
+    values = np.asarray(values, dtype=float)
+    scaled = values * 100
+    rounded = np.round(scaled) / 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-12 * np.maximum(np.abs(scaled), 1)
+    if near_half.any():
+        rounded[near_half] = _round2(values[near_half]).astype(float)
+    return rounded
+
+
+def _get_step(x, d_x, z, d_z, tau, d_tau, kappa, d_kappa, alpha0):
+    # Largest step (at most 1) keeping every problem's x, z, tau and kappa positive, times alpha0.
+    def shortest(v, d_v):
+        falling = d_v < 0
+        ratio = np.where(falling, v / np.where(falling, -d_v, 1), np.inf).min(1)
+        return np.where(falling.any(1), alpha0 * ratio, 1)
+    alpha_tau = np.where(d_tau < 0, alpha0 * tau / np.where(d_tau < 0, -d_tau, 1), 1)
+    alpha_kappa = np.where(d_kappa < 0, alpha0 * kappa / np.where(d_kappa < 0, -d_kappa, 1), 1)
+    return np.minimum.reduce([np.ones_like(tau), shortest(x, d_x), alpha_tau, shortest(z, d_z), alpha_kappa])
+
+
+def _sym_solve(Dinv, M, A, r1, r2):
+    r = r2 + (Dinv * r1).dot(A.T)
+    v = np.linalg.solve(M, r[:, :, None])[:, :, 0]
+    return Dinv * (v.dot(A) - r1), v
+
+
+def _get_delta(A, b, c, x, y, z, tau, kappa):
+    # Predictor-corrector search direction for every problem (_get_delta with pc=True, ip=False).
+    r_P = b * tau[:, None] - x.dot(A.T)
+    r_D = c * tau[:, None] - y.dot(A) - z
+    r_G = x.dot(c) - (b * y).sum(1) + kappa
+    mu = ((x * z).sum(1) + tau * kappa) / (x.shape[1] + 1)
+    Dinv = x / z
+    M = np.einsum('ik,pk,jk->pij', A, Dinv, A)
+    p, q = _sym_solve(Dinv, M, A, np.broadcast_to(c, x.shape), b)
+    gamma = np.zeros_like(tau)
+    for corrector in (False, True):
+        eta = 1 - gamma
+        rhatxs = (gamma * mu)[:, None] - x * z
+        rhattk = gamma * mu - tau * kappa
+        if corrector:
+            rhatxs -= d_x * d_z
+            rhattk -= d_tau * d_kappa
+        u, v = _sym_solve(Dinv, M, A, eta[:, None] * r_D - (1 / x) * rhatxs, eta[:, None] * r_P)
+        d_tau = ((eta * r_G + 1 / tau * rhattk - (-u.dot(c) + (b * v).sum(1))) /
+                 (1 / tau * kappa + (-p.dot(c) + (b * q).sum(1))))
+        d_x = u + p * d_tau[:, None]
+        d_y = v + q * d_tau[:, None]
+        d_z = (1 / x) * (rhatxs - z * d_x)
+        d_kappa = 1 / tau * (rhattk - kappa * d_tau)
+        alpha = _get_step(x, d_x, z, d_z, tau, d_tau, kappa, d_kappa, 1)
+        gamma = (1 - alpha)**2 * np.minimum(BETA, 1 - alpha)
+    return d_x, d_y, d_z, d_tau, d_kappa
+
+
+def _ip_hsd(caps, totals):
+    # x for caps (problems, n) with no fixed slots, every problem stopped on its own test.
+    problems, n = caps.shape
+    A = np.vstack([np.hstack([np.eye(n), np.eye(n)]), np.hstack([np.ones((1, n)), np.zeros((1, n))])])
+    b = np.hstack([caps, totals[:, None]])
+    c = np.hstack([-np.ones(n), np.zeros(n)])
+    x, z = np.ones((problems, 2 * n)), np.ones((problems, 2 * n))
+    y = np.zeros((problems, n + 1))
+    tau, kappa = np.ones(problems), np.ones(problems)
+
+    # denominators of the stopping test, from the blind start (_indicators)
+    r_p0 = np.maximum(1, np.sqrt(((b - A.sum(1)) ** 2).sum(1)))
+    r_d0 = max(1, np.linalg.norm(c - 1))
+
+    def going(rows):
+        # the rows of `rows` whose primal, dual or gap residual is still above the tolerance
+        x_, y_, z_, tau_ = x[rows], y[rows], z[rows], tau[rows]
+        rho_p = np.sqrt(((b[rows] * tau_[:, None] - x_.dot(A.T)) ** 2).sum(1)) / r_p0[rows]
+        rho_d = np.sqrt(((c * tau_[:, None] - y_.dot(A) - z_) ** 2).sum(1)) / r_d0
+        by = (b[rows] * y_).sum(1)
+        rho_A = np.abs(x_.dot(c) - by) / (tau_ + np.abs(by))
+        return rows[(rho_p > TOLERANCE) | (rho_d > TOLERANCE) | (rho_A > TOLERANCE)]
+
+    active = going(np.arange(problems))
+    for _ in range(MAX_ITERATIONS):
+        if not len(active):
+            break
+        state = x[active], y[active], z[active], tau[active], kappa[active]
+        d_x, d_y, d_z, d_tau, d_kappa = _get_delta(A, b[active], c, *state)
+        alpha = _get_step(state[0], d_x, state[2], d_z, state[3], d_tau, state[4], d_kappa, ALPHA0)
+        x[active] = state[0] + alpha[:, None] * d_x
+        tau[active] = state[3] + alpha * d_tau
+        z[active] = state[2] + alpha[:, None] * d_z
+        kappa[active] = state[4] + alpha * d_kappa
+        y[active] = state[1] + alpha[:, None] * d_y
+        active = going(active)
+    return (x / tau[:, None])[:, :n]
+
+
+def interior_point(caps, totals):
+    # caps: (problems, slots), totals: (problems,). What linprog's interior-point returns for
+    # minimize -sum(x) s.t. sum(x) = total, 0 <= x <= caps, one row per problem.
+    caps = np.asarray(caps, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    x = np.zeros_like(caps)
+    # presolve fixes a variable whose bounds are within its tolerance of each other. A slot the
+    # chain's rounding has overfilled (cap below 0) is fixed at 0 too, where linprog raises on
+    # the bound (0, cap) instead.
+    free = caps >= PRESOLVE_TOLERANCE
+    sizes = free.sum(1)
+    for n in np.unique(sizes[sizes > 0]):
+        problems = np.flatnonzero(sizes == n)
+        solved = _ip_hsd(caps[problems][free[problems]].reshape(-1, n), totals[problems])
+        block = x[problems]
+        block[free[problems]] = solved.ravel()
+        x[problems] = block
+    return x
+
+
+def allocate_rank_slots(totals, group_size):
+    # Fill group_size channels x group_size rank slots for every total in `totals`, channel by
+    # channel, exactly like distribute_ranks_among_channels_in_this_country: each channel but the
+    # last takes the rounded interior_point of the remaining slot capacities (with the last slot
+    # absorbing the rounding remainder) and the last channel takes whatever is left.
+    # Returns got[problem, channel_in_group, rank_slot].
+    totals = np.asarray(totals, dtype=float)
+    got = np.zeros((len(totals), group_size, group_size))
+    if group_size == 0:
+        return got
+
+    slots_left = np.repeat(totals[:, None], group_size, axis=1)
+    for j in range(group_size - 1):
+        x = interior_point(slots_left, totals)
+        votes_remaining = totals.copy()
+        for r in range(group_size - 1):
+            got[:, j, r] = round2(x[:, r])
+            votes_remaining = votes_remaining - got[:, j, r]
+        got[:, j, -1] = votes_remaining
+        slots_left = slots_left - got[:, j]
+    got[:, -1] = round2(slots_left)
+    return got
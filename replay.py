@@ -0,0 +1,219 @@
+# Time-series replay: seats at every snapshot of a (time, channel) matrix of subscriber counts.
+#
+# Re-running shapeCountryPopulationDataAccordingToLanguages_Attempt2, votes_distribution_fptp and a
+# winner_* function once per snapshot repeats every per-channel and per-country loop T times. Here
+# each stage works on whole blocks of timesteps at once, with time as the leading array axis:
+#
+#       useful[t, k, l]     country k's useful population speaking language l (LanguageAggregates)
+#       counts[t, i, k]     first-preference votes, as votes_distribution_fptp
+#       ranks[t, i, k, r]   the ranked distribution, as votes_distribution_ranked_voting
+#
+# and every figure is rounded exactly like the per-snapshot path, so a snapshot's counts and ranks
+# match build_electorate with its default settings (the batched rank_allocation solver, which
+# reproduces linprog) on that snapshot's subs. Winners differ from the winner_* functions only
+# where those draw at random:
+#
+#       fptp    ties go to the lower channel index instead of random.choice
+#       borda   identical
+#       score   one set of score ballots is drawn per (channel, country) from `seed` and reused at
+#               every timestep (common random numbers), so outcomes only move when the subs do
+#
+# Timesteps are processed in blocks of chunk_size to bound the ranks tensor's memory. The result is
+# a dict like sweep()'s; save_replay() writes it to one .npz with seats as the smallest unsigned
+# integer type that holds a full sweep of the countries.
+
+import csv
+
+import numpy as np
+
+import instrument
+from electorate import Electorate
+from rank_allocation import allocate_rank_slots, round2
+from shaping import LanguageAggregates
+
+REPLAY_METHODS = ('fptp', 'borda', 'score')
+CHUNK_SIZE = 256
+
+
+class SeriesModel(object):
+    # The per-input parts of the pipeline that do not depend on sub counts.
+
+    def __init__(self, channels, countries):
+        self.channels = channels
+        self.countries = countries
+        self.aggregates = LanguageAggregates(channels, countries)
+        self.electorate = Electorate(channels, countries)
+        self.language_groups = self.electorate.language_groups()
+        self.channel_language = np.array([self.aggregates.language_index[language] for language in self.electorate.languages], dtype=int)
+        self.n_channels = len(channels)
+        self.n_countries = len(countries)
+
+    def useful(self, subs):
+        # (useful[t, k, l], useful_count[t, k]) as the shaping stage gives them for each row of subs.
+        aggregates = self.aggregates
+        million = round2(subs * pow(10, -6))
+        useful = np.zeros((len(subs), self.n_countries, len(aggregates.languages)))
+        for language, group in aggregates.language_channels.items():
+            l = aggregates.language_index[language]
+            language_subs = 0
+            for i in group:
+                language_subs = language_subs + million[:, i]
+            useful[:, :, l] = round2(aggregates.speakers[None, :, l] * (language_subs / aggregates.language_population[language])[:, None])
+        return useful, round2(useful.sum(axis=2))
+
+    def counts(self, subs, useful):
+        # counts[t, i, k] as votes_distribution_fptp.
+        language_total = np.zeros((len(subs), len(self.aggregates.languages)))
+        for i, l in enumerate(self.channel_language):
+            language_total[:, l] = language_total[:, l] + subs[:, i]
+        share = subs / language_total[:, self.channel_language]
+        return round2(useful[:, :, self.channel_language].transpose(0, 2, 1) * share[:, :, None])
+
+    def ranks(self, counts):
+        # ranks[t, i, k, r] as votes_distribution_ranked_voting's default (batched) solver.
+        n_steps = len(counts)
+        ranks = np.zeros(counts.shape + (self.n_channels,))
+        ranks[:, :, :, 0] += counts
+        for channel_language, group in self.language_groups.items():
+            remaining_channels = [j for j in range(self.n_channels) if self.electorate.languages[j] != channel_language]
+            same_language_size = len(group) - 1
+            votes = counts[:, group].ravel()
+            same_language_got = allocate_rank_slots(votes, same_language_size).reshape(
+                n_steps, len(group), self.n_countries, same_language_size, same_language_size)
+            remaining_got = allocate_rank_slots(votes, len(remaining_channels)).reshape(
+                n_steps, len(group), self.n_countries, len(remaining_channels), len(remaining_channels))
+            for g, i in enumerate(group):
+                other_channels_with_channel_language = [j for j in group if j != i]
+                for position, j in enumerate(other_channels_with_channel_language):
+                    ranks[:, j, :, 1:1+same_language_size] = round2(ranks[:, j, :, 1:1+same_language_size] + same_language_got[:, g, :, position])
+                for position, j in enumerate(remaining_channels):
+                    ranks[:, j, :, 1+same_language_size:] = round2(ranks[:, j, :, 1+same_language_size:] + remaining_got[:, g, :, position])
+        return ranks
+
+
+def fptp_winners(counts):
+    # winners[t, k]; -1 where nobody has votes.
+    winners = counts.argmax(axis=1)
+    winners[counts.max(axis=1) <= 0] = -1
+    return winners
+
+
+def borda_winners(ranks):
+    sums = ranks.dot(np.arange(1, ranks.shape[-1] + 1))
+    winners = sums.argmin(axis=1)
+    winners[sums.min(axis=1) <= 0] = -1
+    return winners
+
+
+def score_draws(n_channels, n_countries, seed=0):
+    # (uniforms, rank order) for one set of score ballots per (channel, country), as in score_ballots:
+    # the ranks in shuffled order, each but the last taking a uniform share of the votes still left.
+    rng = np.random.RandomState(seed)
+    uniforms = rng.random_sample((n_channels, n_countries, n_channels - 1))
+    order = rng.random_sample((n_channels, n_countries, n_channels)).argsort(axis=2) + 1
+    return uniforms, order
+
+
+def score_winners(counts, useful_count, draws):
+    uniforms, order = draws
+    n_ranks = counts.shape[1]
+    votes = useful_count[:, None, :]
+    remaining = votes - counts
+    score = n_ranks * counts
+    for p in range(n_ranks - 1):
+        new_votes = np.round(uniforms[None, :, :, p] * remaining, 2)
+        score += order[None, :, :, p] * new_votes
+        remaining -= new_votes
+    score += order[None, :, :, -1] * remaining
+    ratings = np.round(np.divide(score, votes, out=np.zeros_like(score), where=votes > 0), 2)
+    winners = ratings.argmax(axis=1)
+    winners[ratings.max(axis=1) <= 0] = -1
+    return winners
+
+
+def seat_dtype(n_countries):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_countries <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def seats_from_winners(winners, n_channels):
+    # seats[t, i] from winners[t, k].
+    seats = np.zeros((len(winners), n_channels + 1), dtype=np.int64)
+    np.add.at(seats, (np.arange(len(winners))[:, None], winners), 1)
+    return seats[:, :n_channels]
+
+
+@instrument.timed()
+def replay(subs, channels, countries, methods=REPLAY_METHODS, seed=0, times=None, chunk_size=CHUNK_SIZE):
+    # Seats and winners of every method at every row of subs (time, channel), channels in the order
+    # of `channels`. Returns a dict of the times, methods, channel and country names, seats
+    # (time, method, channel), winners (time, method, country) and government (time, method).
+    subs = np.asarray(subs, dtype=float)
+    for method in methods:
+        if method not in REPLAY_METHODS:
+            raise ValueError("Unknown replay method: " + str(method))
+    model = SeriesModel(channels, countries)
+    if subs.ndim != 2 or subs.shape[1] != model.n_channels:
+        raise ValueError("subs must be a (time, %d) matrix, got shape %s" % (model.n_channels, subs.shape))
+    n_steps = len(subs)
+    draws = score_draws(model.n_channels, model.n_countries, seed) if 'score' in methods else None
+
+    winners = np.full((n_steps, len(methods), model.n_countries), -1, dtype=np.int32 if model.n_channels > 32767 else np.int16)
+    for start in range(0, n_steps, chunk_size):
+        block = subs[start:start + chunk_size]
+        useful, useful_count = model.useful(block)
+        counts = model.counts(block, useful)
+        for m, method in enumerate(methods):
+            if method == 'fptp':
+                winners[start:start + len(block), m] = fptp_winners(counts)
+            elif method == 'borda':
+                winners[start:start + len(block), m] = borda_winners(model.ranks(counts))
+            else:
+                winners[start:start + len(block), m] = score_winners(counts, useful_count, draws)
+        if instrument.enabled:
+            instrument.count('replay_snapshots', len(block))
+
+    seats = seats_from_winners(winners.reshape(n_steps * len(methods), model.n_countries), model.n_channels)
+    seats = seats.reshape(n_steps, len(methods), model.n_channels).astype(seat_dtype(model.n_countries))
+    return {
+        'times': np.arange(n_steps) if times is None else np.asarray(times),
+        'methods': list(methods),
+        'channels': list(model.electorate.channel_names),
+        'countries': list(model.electorate.country_names),
+        'seats': seats,
+        'winners': winners,
+        'government': seats.argmax(axis=2).astype(winners.dtype),
+    }
+
+
+def load_series(path, channel_names):
+    # (times, subs) from a CSV with a header row of time,<channel name>,... (any column order, one
+    # column per channel in channel_names), or from a (time, channel) .npy matrix in channel order.
+    if path.endswith('.npy'):
+        subs = np.load(path)
+        return np.arange(len(subs)), subs
+    with open(path) as handle:
+        rows = list(csv.reader(handle))
+    header, rows = rows[0], [row for row in rows[1:] if row]
+    missing = [name for name in channel_names if name not in header[1:]]
+    if missing:
+        raise ValueError(path + ": no column for " + ", ".join(missing))
+    columns = [header.index(name) for name in channel_names]
+    subs = np.array([[float(row[c]) for c in columns] for row in rows]).reshape(len(rows), len(channel_names))
+    return [row[0] for row in rows], subs
+
+
+def save_replay(result, path):
+    columns = dict((name, result[name]) for name in ('seats', 'winners', 'government'))
+    times = np.asarray(result['times'])
+    columns['times'] = times if times.dtype.kind in 'iuf' else times.astype('U')
+    for name in ('methods', 'channels', 'countries'):
+        columns[name] = np.array(result[name], dtype='U')
+    np.savez_compressed(path, **columns)
+
+
+def load_replay(path):
+    with np.load(path) as data:
+        return dict((name, data[name]) for name in data.files)
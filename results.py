@@ -0,0 +1,313 @@
+# Election result records, an opt-in console reporter and a bulk columnar exporter.
+#
+# winner_* functions used to print their tallies as they went and return {channel name: seats}.
+# They now return an ElectionResult, which still is that dict (so existing callers keep working)
+# and also carries the per-country detail: winner index, the winner's margin over the runner-up in
+# the method's own tally (NaN where the method has no single tally, like IRV or Condorcet) and the
+# voting population. Nothing prints unless a ConsoleReporter is asked to, and export_results()
+# writes any number of results to one .npz file with one array per column.
+
+from __future__ import print_function
+
+import sys
+
+import numpy as np
+
+
+def runner_up_margin(tally):
+    # Highest minus second-highest entry of a 1-d tally (0 on ties, the value itself if alone).
+    tally = np.asarray(tally, dtype=float)
+    if len(tally) < 2:
+        return float(tally.max()) if len(tally) else 0.0
+    top_two = np.partition(tally, len(tally) - 2)[-2:]
+    return float(top_two[1] - top_two[0])
+
+
+class ElectionResult(dict):
+
+    def __init__(self, method, title, channel_names, country_names, winners, margins=None, voting_population=None):
+        # winners: channel index per country (-1 for none), aligned with country_names.
+        dict.__init__(self)
+        for channel_name in channel_names:
+            self[channel_name] = 0
+        self.method = method
+        self.title = title
+        self.channel_names = list(channel_names)
+        self.country_names = list(country_names)
+        self.winners = np.asarray(winners, dtype=int).reshape(len(self.country_names))
+        self.margins = np.full(len(self.country_names), np.nan) if margins is None else np.asarray(margins, dtype=float)
+        self.voting_population = np.zeros(len(self.country_names)) if voting_population is None else np.asarray(voting_population, dtype=float)
+        for winner in self.winners:
+            if winner >= 0:
+                self[self.channel_names[winner]] += 1
+
+    @classmethod
+    def from_winners(cls, method, title, electorate, country_data, winners, margins=None):
+        # Voting population is each country's first-preference total in the electorate.
+        country_indices = [electorate.country(c['country']) for c in country_data]
+        return cls(method, title, electorate.channel_names, [c['country'] for c in country_data], winners, margins,
+                   np.round(electorate.counts[:, country_indices].sum(axis=0), 2))
+
+    @property
+    def seats(self):
+        return np.array([self[name] for name in self.channel_names], dtype=int)
+
+    def country_winners(self):
+        return dict((country, self.channel_names[w] if w >= 0 else None) for country, w in zip(self.country_names, self.winners))
+
+    def government(self):
+        # The channel with the most seats, picked like the old "forms government!" line.
+        return max(self.keys(), key=lambda name: self[name])
+
+
+class ParliamentResult(dict):
+    # {channel name: seats} over many seats per country (see seats.py), with the per-country table.
+
+    def __init__(self, method, title, channel_names, country_names, allocation):
+        # allocation[k, i]: seats channel i won in country k, rows aligned with country_names.
+        dict.__init__(self)
+        self.method = method
+        self.title = title
+        self.channel_names = list(channel_names)
+        self.country_names = list(country_names)
+        self.allocation = np.asarray(allocation, dtype=int).reshape(len(self.country_names), len(self.channel_names))
+        for name, seats in zip(self.channel_names, self.allocation.sum(axis=0)):
+            self[name] = int(seats)
+
+    @property
+    def seats(self):
+        return self.allocation.sum(axis=0)
+
+    @property
+    def country_seats(self):
+        return self.allocation.sum(axis=1)
+
+    @property
+    def total_seats(self):
+        return int(self.allocation.sum())
+
+    def government(self):
+        return max(self.keys(), key=lambda name: self[name])
+
+    def has_majority(self):
+        return 2 * self[self.government()] > self.total_seats
+
+
+class ComparisonResult(object):
+    # Every method's winner in every country from one compare_all() pass, and how far they agree.
+
+    def __init__(self, methods, channel_names, country_names, winners, voting_population=None):
+        # winners[m, k]: channel index method m elects in country k (-1 for none).
+        self.methods = list(methods)
+        self.channel_names = list(channel_names)
+        self.country_names = list(country_names)
+        self.winners = np.asarray(winners, dtype=int).reshape(len(self.methods), len(self.country_names))
+        self.voting_population = voting_population
+
+    @property
+    def seats(self):
+        # (methods, channels) seats.
+        seats = np.zeros((len(self.methods), len(self.channel_names) + 1), dtype=int)
+        np.add.at(seats, (np.arange(len(self.methods))[:, None], self.winners), 1)
+        return seats[:, :len(self.channel_names)]
+
+    def result(self, method):
+        # One method's row as an ElectionResult.
+        return ElectionResult(method, method.upper().replace('_', ' '), self.channel_names, self.country_names,
+                              self.winners[self.methods.index(method)], voting_population=self.voting_population)
+
+    def agreement(self):
+        # (methods, methods) share of countries where both methods elect the same channel.
+        if not len(self.country_names):
+            return np.ones((len(self.methods), len(self.methods)))
+        return (self.winners[:, None, :] == self.winners[None, :, :]).mean(axis=2)
+
+    def consensus(self):
+        # (winner, methods electing it) per country, for the channel most methods elect; ties go to
+        # the lower channel index, and -1 counts like a channel.
+        winners, support = [], []
+        for column in self.winners.T:
+            values, counts = np.unique(column, return_counts=True)
+            best = counts.argmax()
+            winners.append(int(values[best]))
+            support.append(int(counts[best]))
+        return np.array(winners, dtype=int), np.array(support, dtype=int)
+
+    def unanimous(self):
+        return (self.winners == self.winners[:1]).all(axis=0)
+
+
+class CoalitionResult(object):
+    # Government formation over one seat vector (see coalition.py): the cheapest winning coalition,
+    # the minimal winning coalitions found and each channel's power indices. Coalitions are bitmasks.
+
+    def __init__(self, channel_names, seats, quota, government, minimal_winning, banzhaf, shapley_shubik, groups=None):
+        self.channel_names = list(channel_names)
+        self.seats = np.asarray(seats, dtype=int)
+        self.quota = quota
+        self.government = government
+        self.minimal_winning = list(minimal_winning)
+        self.banzhaf = np.asarray(banzhaf, dtype=float)
+        self.shapley_shubik = np.asarray(shapley_shubik, dtype=float)
+        self.groups = groups
+
+    @property
+    def total_seats(self):
+        return int(self.seats.sum())
+
+    def members(self, mask):
+        return [name for i, name in enumerate(self.channel_names) if (mask >> i) & 1]
+
+    def coalition_seats(self, mask):
+        return sum(int(s) for i, s in enumerate(self.seats) if (mask >> i) & 1)
+
+    def has_government(self):
+        return self.government != 0
+
+
+class ConsoleReporter(object):
+    # Prints results in the format winner_* functions used to print inline.
+
+    def __init__(self, stream=None, per_country=False):
+        self.stream = stream
+        self.per_country = per_country
+
+    def _print(self, *values):
+        print(*values, file=self.stream or sys.stdout)
+
+    def population(self, country_data):
+        self._print("Useful population: " + str(sum(c['useful_count'] for c in country_data)))
+
+    def electorate(self, electorate, country_data):
+        # Per-channel and per-country first-preference totals.
+        for i, channel_obj in enumerate(electorate.channels):
+            self._print("-----------------------------")
+            self._print(channel_obj['name'])
+            self._print(channel_obj['subs'])
+            for row in sorted(electorate.distribution(i), key=lambda row: row['count'], reverse=True):
+                self._print(row)
+            self._print("\nFinal million subs: ")
+            self._print(electorate.counts[i].sum())
+            self._print("\n")
+        self._print("------------------------------")
+        total_votes = 0
+        for c in country_data:
+            count_c = electorate.counts[:, electorate.country(c['country'])].sum()
+            total_votes += count_c
+            self._print("_________")
+            self._print(str(c['country']) + ": " + str(count_c))
+        self._print("Total votes across all countries: " + str(total_votes))
+
+    def election(self, result):
+        self._print("\n------------- INITIATING " + result.title + " -------------\n")
+        if self.per_country:
+            for country, winner in zip(result.country_names, result.winners):
+                if winner >= 0:
+                    self._print("Winner " + str(country) + ": " + str(result.channel_names[winner]))
+        self._print("\nSeats distribution for " + str(len(result.country_names)) + " seats (countries):")
+        self._print(sorted(result.items(), key=lambda item: item[1], reverse=True))
+        self._print("\n")
+        self._print(result.government() + " forms government!")
+        self._print("\n")
+
+    def parliament(self, result):
+        self._print("\n------------- INITIATING " + result.title + " -------------\n")
+        if self.per_country:
+            for country, row in zip(result.country_names, result.allocation):
+                won = [(name, int(seats)) for name, seats in zip(result.channel_names, row) if seats]
+                self._print(str(country) + " (" + str(int(row.sum())) + " seats): " + str(won))
+        self._print("\nSeats distribution for " + str(result.total_seats) + " seats:")
+        self._print(sorted(result.items(), key=lambda item: item[1], reverse=True))
+        self._print("\n")
+        if result.has_majority():
+            self._print(result.government() + " forms government!")
+        else:
+            self._print(result.government() + " is the largest channel, short of a majority.")
+        self._print("\n")
+
+
+    def replay(self, result):
+        # Government over time from replay.replay(): the first snapshot and every change after it.
+        for m, method in enumerate(result['methods']):
+            government = result['government'][:, m]
+            self._print("\n------------- REPLAY - " + str(len(government)) + " SNAPSHOTS - " + method.upper() + " -------------\n")
+            for t in range(len(government)):
+                if t == 0 or government[t] != government[t-1]:
+                    seats = result['seats'][t, m, government[t]]
+                    self._print(str(result['times'][t]) + ": " + result['channels'][government[t]] + " forms government (" + str(seats) + " seats)")
+            self._print("\n")
+
+
+    def comparison(self, result):
+        self._print("\n------------- COMPARING " + str(len(result.methods)) + " METHODS -------------\n")
+        width = max([len(name) for name in result.channel_names + result.methods] + [8])
+        if self.per_country:
+            consensus, support = result.consensus()
+            self._print("%-12s " % 'country' + " ".join("%*s" % (width, method) for method in result.methods) + "  agree")
+            for k, country in enumerate(result.country_names):
+                names = [result.channel_names[w] if w >= 0 else '-' for w in result.winners[:, k]]
+                self._print("%-12s " % country + " ".join("%*s" % (width, name) for name in names) + "  %d/%d" % (support[k], len(result.methods)))
+            self._print("")
+        self._print("%-*s " % (width, 'seats') + " ".join("%*s" % (width, name) for name in result.channel_names))
+        for method, seats in zip(result.methods, result.seats):
+            self._print("%-*s " % (width, method) + " ".join("%*d" % (width, s) for s in seats))
+        self._print("\nAgreement (share of countries with the same winner):")
+        self._print("%-*s " % (width, '') + " ".join("%*s" % (width, method) for method in result.methods))
+        for method, row in zip(result.methods, result.agreement()):
+            self._print("%-*s " % (width, method) + " ".join("%*.2f" % (width, share) for share in row))
+        self._print("\nUnanimous in " + str(int(result.unanimous().sum())) + " of " + str(len(result.country_names)) + " countries.")
+        self._print("\n")
+
+
+    def coalitions(self, result, shown=10):
+        self._print("------------- FORMING GOVERNMENT - " + str(result.quota) + " OF " + str(result.total_seats) + " SEATS -------------\n")
+        width = max([len(name) for name in result.channel_names] + [8])
+        self._print("%-*s %8s %10s %16s" % (width, 'channel', 'seats', 'banzhaf', 'shapley_shubik'))
+        for i in np.argsort(-result.seats, kind='mergesort'):
+            self._print("%-*s %8d %10.4f %16.4f" % (width, result.channel_names[i], result.seats[i], result.banzhaf[i], result.shapley_shubik[i]))
+        self._print("\nMinimal winning coalitions" + (" (first " + str(shown) + ")" if len(result.minimal_winning) > shown else "") + ":")
+        for mask in result.minimal_winning[:shown]:
+            self._print(" + ".join(result.members(mask)) + " (" + str(result.coalition_seats(mask)) + " seats)")
+        self._print("")
+        if not result.has_government():
+            self._print("No coalition" + (" within one group" if result.groups is not None else "") + " reaches " + str(result.quota) + " seats.")
+        elif len(result.members(result.government)) == 1:
+            self._print(result.members(result.government)[0] + " forms government!")
+        else:
+            self._print(" + ".join(result.members(result.government)) + " form a coalition government ("
+                        + str(result.coalition_seats(result.government)) + " seats)!")
+        self._print("\n")
+
+
+def export_results(results, path, run_ids=None):
+    # Writes many ElectionResults to one .npz file, one array per column:
+    #   per (run, country) row: run, method, country, winner, margin, voting_population
+    #   per run: run_method, seats (runs, channels) in `channels` order
+    # All results must share their channels. run_ids default to 0..len(results)-1.
+    results = list(results)
+    run_ids = list(range(len(results))) if run_ids is None else list(run_ids)
+    channels = results[0].channel_names if results else []
+    for result in results:
+        if result.channel_names != channels:
+            raise ValueError("export_results needs results over the same channels")
+
+    sizes = [len(result.country_names) for result in results]
+    columns = {
+        'run': np.repeat(np.asarray(run_ids, dtype=np.int64), sizes),
+        'method': np.array([result.method for result, size in zip(results, sizes) for _ in range(size)], dtype='U'),
+        'country': np.array([name for result in results for name in result.country_names], dtype='U'),
+        'winner': np.concatenate([result.winners for result in results]) if results else np.zeros(0, dtype=int),
+        'margin': np.concatenate([result.margins for result in results]) if results else np.zeros(0),
+        'voting_population': np.concatenate([result.voting_population for result in results]) if results else np.zeros(0),
+        'run_id': np.asarray(run_ids, dtype=np.int64),
+        'run_method': np.array([result.method for result in results], dtype='U'),
+        'seats': np.array([result.seats for result in results], dtype=np.int64).reshape(len(results), len(channels)),
+        'channels': np.array(channels, dtype='U'),
+    }
+    np.savez_compressed(path, **columns)
+
+
+def load_results(path):
+    # The columns written by export_results, as a dict of arrays.
+    with np.load(path) as data:
+        return dict((name, data[name]) for name in data.files)
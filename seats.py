@@ -0,0 +1,124 @@
+# Multi-seat allocation: many seats per country instead of one.
+#
+# Every country gets seats in proportion to its useful population (apportion), and each country's
+# seats are then filled from the electorate's data with one of SEAT_METHODS:
+#
+#       dhondt, sainte_lague  highest-averages: the next seat goes to the channel with the largest
+#                             votes / divisor(seats won so far), divisor s+1 or 2s+1. A heap of each
+#                             channel's next quotient makes a country with s seats and n channels
+#                             O(n + s log n) instead of rescanning every channel for every seat.
+#       largest_remainder     Hare quota: floor(votes / quota) seats each, the rest to the largest
+#                             remainders.
+#       stv                   single transferable vote over a country's weighted rankings (see
+#                             weighted.py) with a Droop quota. Each channel is a party fielding as
+#                             many candidates as there are seats, all ranked together, so a seat
+#                             keeps the channel's surplus (scaled down Gregory-style) with the
+#                             channel, and an excluded channel's votes move to each ranking's next
+#                             channel still standing.
+#
+# Ties go to the lower channel index throughout.
+
+import heapq
+
+import numpy as np
+
+SEAT_METHODS = ('dhondt', 'sainte_lague', 'largest_remainder', 'stv')
+DIVISORS = {
+    'dhondt': lambda won: won + 1.0,
+    'sainte_lague': lambda won: 2.0 * won + 1.0,
+}
+
+
+def highest_averages(votes, seats, method='dhondt'):
+    # Seats per entry of `votes` under a divisor method.
+    divisor = DIVISORS[method]
+    votes = [float(v) for v in votes]
+    won = [0] * len(votes)
+    heap = [(-v / divisor(0), i) for i, v in enumerate(votes) if v > 0]
+    heapq.heapify(heap)
+    for _ in range(seats if heap else 0):
+        # the winner's next quotient replaces it at the top and sifts down, one log n step per seat
+        i = heap[0][1]
+        won[i] += 1
+        heapq.heapreplace(heap, (-votes[i] / divisor(won[i]), i))
+    return np.array(won, dtype=np.int64)
+
+
+def largest_remainder(votes, seats):
+    # Seats per entry of `votes` with a Hare quota, leftovers to the largest remainders.
+    votes = np.asarray(votes, dtype=float)
+    won = np.zeros(len(votes), dtype=np.int64)
+    if votes.sum() <= 0 or seats <= 0:
+        return won
+    quotas = seats * votes / votes.sum()
+    won[:] = np.floor(quotas)
+    leftover = int(seats - won.sum())
+    won[np.argsort(-(quotas - won), kind='mergesort')[:leftover]] += 1
+    return won
+
+
+def apportion(populations, total_seats, method='largest_remainder'):
+    # Seats per country in proportion to `populations` (useful_count), by any non-STV method.
+    if method == 'largest_remainder':
+        return largest_remainder(populations, total_seats)
+    return highest_averages(populations, total_seats, method)
+
+
+def stv(rankings, weights, seats, n_channels):
+    # Seats per channel from one country's weighted rankings (rows of channel indices in rank order).
+    won = np.zeros(n_channels, dtype=np.int64)
+    if seats <= 0 or not len(weights) or np.sum(weights) <= 0:
+        return won
+    value = np.array(weights, dtype=float)
+    quota = value.sum() / (seats + 1)
+    standing = np.ones(n_channels, dtype=bool)
+    live = np.ones(len(value), dtype=bool)
+    position = np.zeros(len(value), dtype=int)
+    top = rankings[:, 0].astype(int)
+
+    while won.sum() < seats and standing.any():
+        tally = np.bincount(top[live], weights=value[live], minlength=n_channels)
+        if standing.sum() == 1:
+            won[standing] += seats - won.sum()
+            break
+        over = standing & (tally > quota)
+        if over.any():
+            chosen = int(np.where(over, tally, -np.inf).argmax())
+            won[chosen] += 1
+            holding = live & (top == chosen)
+            value[holding] *= (tally[chosen] - quota) / tally[chosen]
+            continue
+        chosen = int(np.where(standing, tally, np.inf).argmin())
+        standing[chosen] = False
+        moving = np.flatnonzero(live & (top == chosen))
+        while len(moving):
+            position[moving] += 1
+            exhausted = position[moving] >= rankings.shape[1]
+            live[moving[exhausted]] = False
+            moving = moving[~exhausted]
+            top[moving] = rankings[moving, position[moving]]
+            moving = moving[~standing[top[moving]]]
+    return won
+
+
+def fill_seats(method, country_seats, votes=None, ballots=None):
+    # (countries, channels) seats: each country's country_seats[k] filled by `method` from
+    # votes[k] (first preferences, divisor and remainder methods) or from the rows of a
+    # weighted.WeightedBallots whose country k is position k (stv).
+    if method not in SEAT_METHODS:
+        raise ValueError("Unknown seat allocation method: " + str(method))
+    if method == 'stv':
+        allocation = np.zeros((ballots.n_countries, ballots.n_channels), dtype=np.int64)
+        bounds = np.searchsorted(ballots.countries, np.arange(ballots.n_countries + 1))
+        for k in range(ballots.n_countries):
+            rows = slice(bounds[k], bounds[k+1])
+            allocation[k] = stv(ballots.rankings[rows], ballots.weights[rows], int(country_seats[k]), ballots.n_channels)
+        return allocation
+    votes = np.asarray(votes, dtype=float)
+    allocation = np.zeros(votes.shape, dtype=np.int64)
+    for k, seats in enumerate(country_seats):
+        if method == 'largest_remainder':
+            allocation[k] = largest_remainder(votes[k], int(seats))
+        else:
+            allocation[k] = highest_averages(votes[k], int(seats), method)
+    return allocation
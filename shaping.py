@@ -0,0 +1,155 @@
+# Cached population-shaping stage.
+#
+# shapeCountryPopulationDataAccordingToLanguages_Attempt2 scales every country's language
+# population by (language subs / language population). In parameter sweeps only a few channel sub
+# counts change between runs, so:
+#
+#   * LanguageAggregates keeps the per-language subscriber totals, language populations and the
+#     countries x languages useful-population table, and updating one channel's subs recomputes
+#     only that channel's language column.
+#   * PopulationShaper memoizes whole shaping results on a content hash of (channels, countries)
+#     with LRU eviction, and falls back to incremental updates of its aggregates when only sub
+#     counts changed since the last miss.
+#
+# All figures are rounded exactly like Attempt2 (channel subs to 0.01M before summing, language
+# populations and per-country figures to 2 decimals).
+
+import collections
+import hashlib
+
+import numpy as np
+
+import instrument
+from rank_allocation import round2
+
+CACHE_SIZE = 32
+
+
+def million_subs(subs):
+    return round(subs * pow(10, -6), 2)
+
+
+def channels_key(channels):
+    return hashlib.sha1(repr([(c['name'], c['language'], c['subs']) for c in channels]).encode('utf-8')).hexdigest()
+
+
+def countries_key(countries):
+    return hashlib.sha1(repr([(c['country'], c['count'], sorted(c['languages'].items())) for c in countries]).encode('utf-8')).hexdigest()
+
+
+class LanguageAggregates(object):
+
+    def __init__(self, channels, countries):
+        language_data = collections.OrderedDict()
+        self.channel_languages = []
+        self.channel_subs = []
+        for i, channel in enumerate(channels):
+            subs = million_subs(channel['subs'])
+            self.channel_languages.append(channel['language'])
+            self.channel_subs.append(subs)
+            language_data.setdefault(channel['language'], []).append(i)
+
+        self.languages = list(language_data.keys())
+        self.language_index = dict((language, l) for l, language in enumerate(self.languages))
+        self.language_channels = language_data
+        self.language_subs = {}
+        self.language_population = {}
+
+        # speakers[k, l]: country k's population speaking language l (millions, unrounded)
+        self.speakers = np.array([[(country['count'] * country['languages'][language]) / 100 for language in self.languages]
+                                  for country in countries], dtype=float).reshape(len(countries), len(self.languages))
+        self.useful = np.zeros_like(self.speakers)
+        for language in self.languages:
+            l = self.language_index[language]
+            self.language_population[language] = round(sum(self.speakers[:, l].tolist()), 2)
+            self._recompute(language)
+
+    def _recompute(self, language):
+        subs = 0
+        for i in self.language_channels[language]:
+            subs += self.channel_subs[i]
+        self.language_subs[language] = subs
+        l = self.language_index[language]
+        self.useful[:, l] = round2(self.speakers[:, l] * (subs / self.language_population[language]))
+
+    def update_subs(self, channel, new_subs):
+        # Returns the language whose column changed, or None if the rounded subs did not move.
+        subs = million_subs(new_subs)
+        if subs == self.channel_subs[channel]:
+            return None
+        self.channel_subs[channel] = subs
+        language = self.channel_languages[channel]
+        self._recompute(language)
+        return language
+
+    def useful_counts(self):
+        return round2(self.useful.sum(axis=1))
+
+    def country_data(self, countries):
+        # Attempt2-style copies of countries with 'useful_count' and 'useful_languages' filled in.
+        useful_counts = self.useful_counts()
+        shaped = []
+        for k, country_obj in enumerate(countries):
+            country_copy = dict(country_obj)
+            country_copy['languages'] = dict(country_obj['languages'])
+            country_copy['useful_count'] = float(useful_counts[k])
+            country_copy['useful_languages'] = dict(zip(self.languages, self.useful[k].tolist()))
+            shaped.append(country_copy)
+        return shaped
+
+
+def _copy_shaped(shaped):
+    copies = []
+    for country_obj in shaped:
+        country_copy = dict(country_obj)
+        country_copy['languages'] = dict(country_obj['languages'])
+        country_copy['useful_languages'] = dict(country_obj['useful_languages'])
+        copies.append(country_copy)
+    return copies
+
+
+class PopulationShaper(object):
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._aggregates = None
+        self._aggregates_countries = None
+        self._aggregates_layout = None
+        self.hits = 0
+        self.misses = 0
+        self.incremental_updates = 0
+
+    def clear(self):
+        self._cache.clear()
+        self._aggregates = None
+
+    def aggregates(self, channels, countries):
+        # LanguageAggregates for these inputs, updated in place when only sub counts changed.
+        layout = [(c['name'], c['language']) for c in channels]
+        country_key = countries_key(countries)
+        if self._aggregates is None or self._aggregates_countries != country_key or self._aggregates_layout != layout:
+            self._aggregates = LanguageAggregates(channels, countries)
+            self._aggregates_countries = country_key
+            self._aggregates_layout = layout
+        else:
+            for i, channel in enumerate(channels):
+                if self._aggregates.update_subs(i, channel['subs']) is not None:
+                    self.incremental_updates += 1
+        return self._aggregates
+
+    def shape(self, channels, countries):
+        key = (channels_key(channels), countries_key(countries))
+        if key in self._cache:
+            self.hits += 1
+            instrument.count('shaping_cache_hits')
+            self._cache[key] = self._cache.pop(key)
+            return _copy_shaped(self._cache[key])
+
+        self.misses += 1
+        instrument.count('shaping_cache_misses')
+        shaped = self.aggregates(channels, countries).country_data(countries)
+        self._cache[key] = shaped
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return _copy_shaped(shaped)
@@ -0,0 +1,119 @@
+# Monte Carlo election engine.
+#
+# winner_approval_rating, winner_score_voting and winner_irv draw from `random`, so one call is one
+# sample. simulate() runs many independent trials of a method over a multiprocessing pool and
+# aggregates the seat counts. Every trial is seeded from (base_seed, trial number) alone, so a run
+# is reproducible for a given seed no matter how many processes it is spread over.
+
+import math
+import multiprocessing
+import random
+
+import numpy as np
+
+import pewdie
+
+Z_95 = 1.959963984540054
+
+_worker_state = {}
+
+
+def trial_seed(base_seed, trial):
+    return (base_seed << 32) | trial
+
+
+def _init_worker(method, electorate, countries):
+    _worker_state['method'] = pewdie.winner_methods[method]
+    _worker_state['electorate'] = electorate
+    _worker_state['countries'] = countries
+
+
+def _run_trials(job):
+    base_seed, trials = job
+    winner = _worker_state['method']
+    electorate = _worker_state['electorate']
+    countries = _worker_state['countries']
+    seats = np.zeros((len(trials), electorate.n_channels), dtype=int)
+    for t, trial in enumerate(trials):
+        seed = trial_seed(base_seed, trial)
+        random.seed(seed)
+        np.random.seed(seed % (2 ** 32))
+        # methods that rewrite rank rows do it on their own overlay, so trials share the tensors
+        results = winner(electorate, countries)
+        seats[t] = [results[name] for name in electorate.channel_names]
+    return seats
+
+
+def _chunks(trials, chunk_size):
+    return [range(start, min(start + chunk_size, trials)) for start in range(0, trials, chunk_size)]
+
+
+def wilson_interval(successes, n, z=Z_95):
+    if n == 0:
+        return (0.0, 1.0)
+    p = float(successes) / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return (max(0.0, centre - half_width), min(1.0, centre + half_width))
+
+
+def summarize(method, base_seed, channel_names, seats):
+    # seats: (trials, channels) seat counts.
+    trials, n_channels = seats.shape
+    max_seats = int(seats.max()) if seats.size else 0
+
+    histogram = np.zeros((n_channels, max_seats + 1), dtype=int)
+    for i in range(n_channels):
+        histogram[i] = np.bincount(seats[:, i], minlength=max_seats + 1)
+
+    # a tie for the most seats shares that trial's government between the tied channels
+    most_seats = seats.max(axis=1)[:, None]
+    leaders = (seats == most_seats)
+    government_share = leaders / leaders.sum(axis=1).astype(float)[:, None]
+    win_probability = government_share.mean(axis=0)
+
+    mean_seats = seats.mean(axis=0)
+    seats_sd = seats.std(axis=0, ddof=1) if trials > 1 else np.zeros(n_channels)
+    seats_half_width = Z_95 * seats_sd / math.sqrt(max(trials, 1))
+
+    return {
+        'method': method,
+        'trials': trials,
+        'seed': base_seed,
+        'channels': list(channel_names),
+        'seats': seats,
+        'seat_histogram': histogram,
+        'mean_seats': mean_seats,
+        'mean_seats_ci': np.column_stack((mean_seats - seats_half_width, mean_seats + seats_half_width)),
+        'win_probability': win_probability,
+        'win_probability_ci': np.array([wilson_interval(p * trials, trials) for p in win_probability]),
+    }
+
+
+def simulate(method, trials, base_seed=0, electorate=None, countries=None, processes=None, chunk_size=None, snapshots=None):
+    # method is a key of pewdie.winner_methods. Defaults to the bundled channels and countries, built
+    # once into the `snapshots` directory if given so the workers map it instead of unpickling it.
+    if method not in pewdie.winner_methods:
+        raise ValueError("Unknown voting method: " + str(method))
+    if electorate is None:
+        electorate, countries = pewdie.build_electorate(pewdie.channels, pewdie.total_monthly_2016_top_15_countries, snapshots=snapshots)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(1, int(math.ceil(trials / float(processes * 4))))
+
+    jobs = [(base_seed, chunk) for chunk in _chunks(trials, chunk_size)]
+    if processes == 1:
+        _init_worker(method, electorate, countries)
+        seats = [_run_trials(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, (method, electorate, countries))
+        try:
+            seats = pool.map(_run_trials, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    seats = np.vstack(seats) if seats else np.zeros((0, electorate.n_channels), dtype=int)
+    return summarize(method, base_seed, electorate.channel_names, seats)
@@ -0,0 +1,107 @@
+# On-disk snapshots of built electorates, memory-mapped back read-only.
+#
+# build_electorate's ranked distribution is the most expensive setup step and only depends on the
+# channel and country inputs (and the solver), so its result is written once per input hash:
+#
+#       <directory>/<key>/meta.json     format version, the inputs, useful_country_data, solver
+#       <directory>/<key>/counts.npy    electorate.counts
+#       <directory>/<key>/ranks.npy     electorate.ranks, if the snapshot was built ranked
+#
+# The key hashes SNAPSHOT_VERSION, the solver and every field of every channel and country, so a
+# changed input or format just misses. Snapshots are written to a temporary directory and renamed
+# into place, so a reader never sees half of one. load_snapshot() maps the .npy files read-only;
+# Electorate pickles a snapshot-backed instance as its path, so pool workers map the same files
+# instead of receiving the tensors.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+
+# Default directory for pewdie's --snapshots flag when no path is given.
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'pewdie', 'snapshots')
+
+
+def snapshot_key(channels, countries, solver='batched'):
+    inputs = json.dumps([SNAPSHOT_VERSION, solver, channels, countries], sort_keys=True)
+    return hashlib.sha1(inputs.encode('utf-8')).hexdigest()
+
+
+def snapshot_path(directory, channels, countries, solver='batched'):
+    return os.path.join(directory, snapshot_key(channels, countries, solver))
+
+
+def _native(value):
+    # json gives unicode strings on Python 2; the rest of pewdie uses str there.
+    if isinstance(value, dict):
+        return dict((_native(k), _native(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [_native(v) for v in value]
+    if not isinstance(value, str) and isinstance(value, type(u'')):
+        return value.encode('utf-8')
+    return value
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json')) as handle:
+            meta = _native(json.load(handle))
+    except (IOError, OSError, ValueError):
+        return None
+    if meta.get('version') != SNAPSHOT_VERSION:
+        return None
+    return meta
+
+
+def has_snapshot(path, ranked=True):
+    # True if `path` holds a snapshot of this format with ranks (when ranked) included.
+    meta = _read_meta(path)
+    return meta is not None and (meta['ranked'] or not ranked)
+
+
+def save_snapshot(path, channels, countries, electorate, country_data, solver='batched', ranked=True):
+    # Writes the snapshot for these inputs to `path`, replacing any older one.
+    parent = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    staging = tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+    try:
+        np.save(os.path.join(staging, 'counts.npy'), np.ascontiguousarray(electorate.counts))
+        if ranked:
+            np.save(os.path.join(staging, 'ranks.npy'), np.ascontiguousarray(electorate.ranks))
+        meta = {'version': SNAPSHOT_VERSION, 'solver': solver, 'ranked': ranked,
+                'channels': channels, 'countries': countries, 'country_data': country_data}
+        with open(os.path.join(staging, 'meta.json'), 'w') as handle:
+            json.dump(meta, handle, sort_keys=True)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(staging, path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return path
+
+
+def map_tensors(path, ranked=True):
+    # (counts, ranks or None) mapped read-only from the snapshot at `path`.
+    counts = np.load(os.path.join(path, 'counts.npy'), mmap_mode='r')
+    ranks = np.load(os.path.join(path, 'ranks.npy'), mmap_mode='r') if ranked else None
+    return counts, ranks
+
+
+def load_snapshot(path, ranked=True):
+    # (electorate, useful_country_data) backed by the snapshot's files. The tensors are read-only;
+    # electorate.copy() gives writable ones.
+    from electorate import Electorate
+    meta = _read_meta(path)
+    if meta is None or (ranked and not meta['ranked']):
+        raise IOError("No usable snapshot at " + str(path))
+    electorate = Electorate(meta['channels'], meta['countries'])
+    electorate.counts, electorate.ranks = map_tensors(path, ranked)
+    electorate.snapshot = (path, ranked)
+    return electorate, meta['country_data']
@@ -0,0 +1,192 @@
+# Sensitivity sweep over votes_distribution_exclusive's x/y parameters.
+#
+# x % of a channel's subs come from its home country, y % from the other countries speaking its
+# language (split by their speakers) and the rest from the remaining countries (split by their
+# YouTube population). Everything but the x and y factors is fixed per channel: its home column,
+# its language-share weights and its remaining-country weights. ExclusiveShares computes those
+# once, in the order votes_distribution_exclusive adds them up, so counts(x, y) matches it exactly
+# for any point without redoing the per-channel scans.
+#
+# sweep() then runs every requested method at every point, the points sharded over a
+# multiprocessing pool. Winners come from the per-country kernels in tally.py with the same seed at
+# every point, so the random methods see common random numbers and differences between points come
+# from x and y, not from the draws.
+
+import multiprocessing
+
+import numpy as np
+
+import instrument
+import pewdie
+from rank_allocation import round2
+from tally import country_slices, tally_winners
+
+SWEEP_METHODS = ('fptp', 'borda', 'irv', 'approval', 'score')
+
+_worker_state = {}
+
+
+class ExclusiveShares(object):
+
+    def __init__(self, electorate, country_data):
+        self.n_channels = electorate.n_channels
+        self.n_countries = electorate.n_countries
+        self.country_indices = [electorate.country(c['country']) for c in country_data]
+        names = [c['country'] for c in country_data]
+
+        self.subs = np.array([channel_obj['subs'] for channel_obj in electorate.channels], dtype=float)
+        self.has_home = np.zeros(self.n_channels, dtype=bool)
+        self.home = np.zeros(self.n_channels, dtype=int)
+        # language[i, k]: channel i's share of its y % in country k; remaining_*[i, k] the country's
+        # share of the rest when the language countries are covered (y > 0) or not (y == 0)
+        self.language = np.zeros((self.n_channels, self.n_countries))
+        self.remaining_covered = np.zeros((self.n_channels, self.n_countries))
+        self.remaining_uncovered = np.zeros((self.n_channels, self.n_countries))
+
+        for i, channel_obj in enumerate(electorate.channels):
+            channel_country = channel_obj['country']
+            channel_language = channel_obj['language']
+            if channel_country in names:
+                self.has_home[i] = True
+                self.home[i] = electorate.country(channel_country)
+
+            non_home = [c for c in country_data if c['country'] != channel_country]
+            language_counts = [c['languages'][channel_language] * c['count'] / 100 for c in non_home]
+            denominator = sum(language_counts)
+            covered = set()
+            if denominator:
+                for country_obj, language_count in zip(non_home, language_counts):
+                    if language_count > 0:
+                        self.language[i, electorate.country(country_obj['country'])] = language_count / denominator
+                        covered.add(country_obj['country'])
+
+            for target, skip in ((self.remaining_covered, covered), (self.remaining_uncovered, set())):
+                remaining = [c for c in non_home if c['country'] not in skip]
+                total_remaining_voters = sum(c['count'] for c in remaining)
+                if not total_remaining_voters:
+                    continue
+                for country_obj in remaining:
+                    target[i, electorate.country(country_obj['country'])] = country_obj['count'] / total_remaining_voters
+
+    def counts(self, x, y):
+        # (channels, countries) first-preference counts, as votes_distribution_exclusive(x, y).
+        home_subs = np.where(self.has_home, self.subs * x / 100, 0.0)
+        language_subs = self.subs * y / 100
+        rest = self.subs - home_subs - language_subs
+
+        counts = np.zeros((self.n_channels, self.n_countries))
+        language_votes = language_subs[:, None] * self.language
+        covered = language_votes > 0
+        counts[covered] = round2(language_votes[covered] * pow(10, -6))
+        remaining = np.where(covered.any(axis=1)[:, None], self.remaining_covered, self.remaining_uncovered)
+        in_rest = remaining > 0
+        counts[in_rest] = round2((rest[:, None] * remaining)[in_rest] * pow(10, -6))
+        channels = np.flatnonzero(self.has_home)
+        counts[channels, self.home[channels]] = round2(home_subs[channels] * pow(10, -6))
+        return counts
+
+
+def check_points(points):
+    # Every point must be a share split x, y >= 0 with x + y <= 100 (up to float error); anything
+    # else leaves a negative share for the remaining countries and negative vote counts.
+    for point in points:
+        if len(point) != 2:
+            raise ValueError("Sweep points are (x, y) pairs, got " + repr(point))
+        x, y = float(point[0]), float(point[1])
+        if not (x >= 0 and y >= 0 and x + y <= 100 + 1e-9):
+            raise ValueError("Sweep point (%g, %g) is outside x, y >= 0, x + y <= 100" % (x, y))
+
+
+def grid(xs, ys):
+    # Every (x, y) with x + y <= 100.
+    return [(x, y) for x in xs for y in ys if x + y <= 100]
+
+
+def random_points(n, seed=0):
+    # n points drawn uniformly from the triangle x, y >= 0, x + y <= 100.
+    rng = np.random.RandomState(seed)
+    points = rng.uniform(0, 100, size=(n, 2))
+    flip = points.sum(axis=1) > 100
+    points[flip] = 100 - points[flip]
+    points = np.round(points, 2)
+    # rounding both coordinates up can push a point just past the edge
+    over = points.sum(axis=1) > 100
+    points[over, 1] = np.round(100 - points[over, 0], 2)
+    return [tuple(point) for point in points.tolist()]
+
+
+def _init_worker(electorate, country_data, shares, methods, seed, options, solver):
+    _worker_state.update(electorate=electorate, country_data=country_data, shares=shares,
+                         methods=methods, seed=seed, options=options, solver=solver)
+
+
+def _evaluate(point):
+    # (methods, channels) seats at one (x, y).
+    electorate = _worker_state['electorate'].copy()
+    country_data = _worker_state['country_data']
+    methods = _worker_state['methods']
+    electorate.counts[:] = _worker_state['shares'].counts(*point)
+    ranked = any(method in pewdie.ranked_methods for method in methods)
+    if ranked:
+        electorate.ranks[:] = 0
+        pewdie.votes_distribution_ranked_voting(electorate, country_data, _worker_state['solver'])
+    slices = country_slices(electorate, country_data, ranked)
+
+    seats = np.zeros((len(methods), electorate.n_channels), dtype=int)
+    for m, method in enumerate(methods):
+        winners = tally_winners(method, slices, _worker_state['seed'], 1, **_worker_state['options'].get(method, {}))
+        for winner in winners:
+            if winner >= 0:
+                seats[m, winner] += 1
+    return seats
+
+
+def sweep(points, methods=SWEEP_METHODS, channels=None, countries=None, processes=None, seed=0, method_options=None, solver='batched'):
+    # Seats of every method at every (x, y) point, on the bundled data by default. Returns a dict of
+    # the points, methods, channel names, seats (points, methods, channels) and seat_shares.
+    # `solver` builds the ranks for the ranked methods (pewdie.votes_distribution_ranked_voting).
+    if channels is None:
+        channels = pewdie.channels
+    if countries is None:
+        countries = pewdie.total_monthly_2016_top_15_countries
+    for method in methods:
+        if method not in pewdie.winner_methods:
+            raise ValueError("Unknown voting method: " + str(method))
+    check_points(points)
+    electorate, country_data = pewdie.build_electorate(channels, countries, ranked=False)
+    shares = ExclusiveShares(electorate, country_data)
+    state = (electorate, country_data, shares, list(methods), seed, method_options or {}, solver)
+
+    if processes == 1 or len(points) <= 1:
+        _init_worker(*state)
+        seats = [_evaluate(point) for point in points]
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, state)
+        try:
+            jobs = [(_evaluate, (point,), instrument.enabled) for point in points]
+            seats = []
+            for point_seats, records in pool.map(instrument.pooled, jobs, chunksize=max(1, len(points) // (4 * (processes or multiprocessing.cpu_count())))):
+                instrument.merge(records)
+                seats.append(point_seats)
+        finally:
+            pool.close()
+            pool.join()
+
+    seats = np.array(seats, dtype=int).reshape(len(points), len(methods), electorate.n_channels)
+    n_seats = float(len(country_data))
+    return {
+        'points': np.array(points, dtype=float).reshape(len(points), 2),
+        'methods': list(methods),
+        'channels': list(electorate.channel_names),
+        'seats': seats,
+        'seat_shares': seats / n_seats,
+    }
+
+
+def format_table(result):
+    # One line per (point, method): x, y, method and every channel's seat share.
+    lines = ["%7s %7s %-13s " % ('x', 'y', 'method') + " ".join("%16s" % name[:16] for name in result['channels'])]
+    for p, (x, y) in enumerate(result['points']):
+        for m, method in enumerate(result['methods']):
+            lines.append("%7.2f %7.2f %-13s " % (x, y, method) + " ".join("%16.3f" % share for share in result['seat_shares'][p, m]))
+    return "\n".join(lines)
@@ -0,0 +1,194 @@
+# Per-country tallies, run serially or sharded across a process pool.
+#
+# Every country's seat is decided from that country's column of the electorate alone: its first-
+# preference counts, its rank rows and its useful population. country_slices() cuts those columns
+# out, so pool workers get a few small arrays per country instead of the pickled electorate, and
+# every method has a kernel here that decides one country from its slice.
+#
+# Random methods (fptp ties, irv's random transfers, approval, score) draw from a generator seeded
+# by (seed, country index) alone, so a run gives the same seats for a given seed whether it runs
+# serially or over any number of processes.
+#
+# compare_winners() decides every method from each country's slice in one pass: the pairwise matrix
+# is built once per shard for all the Condorcet-family methods, and each method's winner is the
+# one tally_winners() would give for the same seed.
+
+import multiprocessing
+import random
+
+import numpy as np
+
+import instrument
+from irv import irv_winners
+from pairwise import PAIRWISE_METHODS, pairwise_matrix, pairwise_results
+
+TALLY_METHODS = ('fptp', 'irv', 'borda', 'condorcet', 'copeland', 'schulze', 'ranked_pairs', 'approval', 'score')
+
+
+def country_seed(seed, k):
+    return (seed << 32) | k
+
+
+def country_slices(electorate, country_data, ranked=False):
+    # [(country index, counts column, rank rows or None, useful population)] in country_data order.
+    slices = []
+    for country_obj in country_data:
+        k = electorate.country(country_obj['country'])
+        ranks = electorate.ranks[:, k, :].copy() if ranked else None
+        slices.append((k, electorate.counts[:, k].copy(), ranks, country_obj['useful_count']))
+    return slices
+
+
+def score_ballots(count, n_ranks, votes, rng):
+    # distribute_score_votes for one (channel, country): random score ballots over the ranks, the
+    # channel's own first-preference voters on the top score. Returns (rank row, average score).
+    total_ranks = list(range(1, n_ranks+1))
+    new_ranks_obj = dict((r, 0) for r in total_ranks)
+    total_votes = votes
+    score = 0
+    new_ranks_obj[len(total_ranks)] = count
+    total_votes -= count
+    rng.shuffle(total_ranks)
+    for rank in total_ranks:
+        if rank == total_ranks[-1]:
+            new_ranks_obj[rank] = round((new_ranks_obj[rank] + total_votes), 2)
+            score += (rank * new_ranks_obj[rank])
+        else:
+            new_votes = round(rng.uniform(0, total_votes), 2)
+            new_ranks_obj[rank] = round((new_ranks_obj[rank] + new_votes), 2)
+            score += (rank * new_ranks_obj[rank])
+            total_votes -= new_votes
+    return [new_ranks_obj[r] for r in sorted(new_ranks_obj)], round((score/votes), 2)
+
+
+def _fptp(counts, ranks, useful_count, rng, options):
+    if counts.max() <= 0:
+        return -1
+    return rng.choice(list(np.flatnonzero(counts == counts.max())))
+
+
+def _irv(counts, ranks, useful_count, rng, options):
+    transfer = options.get('transfer', 'random')
+    np_rng = np.random.RandomState(rng.getrandbits(32))
+    return int(irv_winners(ranks[None, :, 0], [useful_count], transfer, np_rng)[0])
+
+
+def _borda(counts, ranks, useful_count, rng, options):
+    sums = ranks.dot(np.arange(1, ranks.shape[1]+1))
+    return int(sums.argmin()) if sums.min() > 0 else -1
+
+
+def _approval(counts, ranks, useful_count, rng, options):
+    winner, max_votes = -1, 0
+    for i, base_votes in enumerate(counts):
+        votes = round(rng.uniform(base_votes, useful_count), 2)
+        if votes > max_votes:
+            winner, max_votes = i, votes
+    return winner
+
+
+def _score(counts, ranks, useful_count, rng, options):
+    winner, max_average = -1, 0
+    if not useful_count:
+        return winner
+    for i, count in enumerate(counts):
+        rating = score_ballots(count, len(counts), useful_count, rng)[1]
+        if rating > max_average:
+            winner, max_average = i, rating
+    return winner
+
+
+def _pairwise(method):
+    def kernel(counts, ranks, useful_count, rng, options):
+        return int(pairwise_results(pairwise_matrix(ranks[:, None, :]))[method][0])
+    return kernel
+
+
+KERNELS = {
+    'fptp': _fptp,
+    'irv': _irv,
+    'borda': _borda,
+    'approval': _approval,
+    'score': _score,
+}
+for _method in PAIRWISE_METHODS:
+    KERNELS[_method] = _pairwise(_method)
+
+
+def _tally_shard(job):
+    method, seed, options, shard = job
+    kernel = KERNELS[method]
+    return [kernel(counts, ranks, useful_count, random.Random(country_seed(seed, k)), options)
+            for k, counts, ranks, useful_count in shard]
+
+
+def _shards(slices, n_shards):
+    size = max(1, -(-len(slices) // n_shards))
+    return [slices[start:start + size] for start in range(0, len(slices), size)]
+
+
+def _compare_shard(job):
+    methods, seed, options, shard = job
+    table = np.full((len(methods), len(shard)), -1, dtype=int)
+    if shard and any(method in PAIRWISE_METHODS for method in methods):
+        # one matrix and one batched pass of pairwise_results for the whole shard
+        tallies = pairwise_results(pairwise_matrix(np.stack([ranks for _, _, ranks, _ in shard], axis=1)))
+        for m, method in enumerate(methods):
+            if method in PAIRWISE_METHODS:
+                table[m] = tallies[method]
+    for c, (k, counts, ranks, useful_count) in enumerate(shard):
+        for m, method in enumerate(methods):
+            if method not in PAIRWISE_METHODS:
+                table[m, c] = KERNELS[method](counts, ranks, useful_count, random.Random(country_seed(seed, k)), options.get(method, {}))
+    return table
+
+
+def compare_winners(methods, slices, seed=None, processes=1, options=None):
+    # (methods, slices) winner table, row m equal to tally_winners(methods[m], slices, seed, ...).
+    # options: {method: {option: value}}. Pool use as in tally_winners.
+    for method in methods:
+        if method not in KERNELS:
+            raise ValueError("Unknown voting method: " + str(method))
+    if seed is None:
+        seed = random.getrandbits(32)
+    options = options or {}
+    if processes == 1 or len(slices) <= 1:
+        return _compare_shard((list(methods), seed, options, slices))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        jobs = [(_compare_shard, ((list(methods), seed, options, shard),), instrument.enabled)
+                for shard in _shards(slices, 4 * (processes or multiprocessing.cpu_count()))]
+        tables = []
+        for table, records in pool.map(instrument.pooled, jobs):
+            instrument.merge(records)
+            tables.append(table)
+    finally:
+        pool.close()
+        pool.join()
+    return np.concatenate(tables, axis=1)
+
+
+def tally_winners(method, slices, seed=None, processes=1, **options):
+    # Winning channel index per slice (-1 for none). processes=1 runs in this process; anything else
+    # shards the slices over a multiprocessing pool (None: one worker per CPU).
+    if method not in KERNELS:
+        raise ValueError("Unknown voting method: " + str(method))
+    if seed is None:
+        seed = random.getrandbits(32)
+    if processes == 1 or len(slices) <= 1:
+        return _tally_shard((method, seed, options, slices))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        # a few shards per worker so one expensive country doesn't hold up the rest
+        jobs = [(_tally_shard, ((method, seed, options, shard),), instrument.enabled)
+                for shard in _shards(slices, 4 * (processes or multiprocessing.cpu_count()))]
+        winners = []
+        for shard_winners, records in pool.imap(instrument.pooled, jobs):
+            instrument.merge(records)
+            winners.extend(shard_winners)
+    finally:
+        pool.close()
+        pool.join()
+    return winners
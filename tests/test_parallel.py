@@ -0,0 +1,69 @@
+# The parallel paths against the serial ones they stand in for, on the bundled data:
+#
+#       python -m unittest discover tests
+#
+# Seeded sharded tallies must not depend on the number of processes, run_concurrently must match
+# isolated runs, compare_all must match winner_sharded method by method, and the sweep's
+# vectorised shares must match votes_distribution_exclusive.
+
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+import pewdie
+import sweep
+from tally import TALLY_METHODS
+
+SEED = 7
+
+
+class ParallelTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.electorate, cls.country_data = pewdie.build_electorate(pewdie.channels, pewdie.total_monthly_2016_top_15_countries)
+
+    def test_sharded_same_for_any_process_count(self):
+        for method in TALLY_METHODS:
+            serial = pewdie.winner_sharded(self.electorate, self.country_data, method, processes=1, seed=SEED)
+            for processes in (2, 3):
+                pooled = pewdie.winner_sharded(self.electorate, self.country_data, method, processes=processes, seed=SEED)
+                np.testing.assert_array_equal(pooled.winners, serial.winners, err_msg="%s, %d processes" % (method, processes))
+
+    def test_run_concurrently_matches_isolated_runs(self):
+        methods = sorted(pewdie.winner_methods)
+        results = pewdie.run_concurrently(self.electorate, self.country_data, methods, seed=SEED)
+        for method in methods:
+            options = {'rng': random.Random(SEED)} if method in pewdie.random_methods else {}
+            isolated = pewdie.winner_methods[method](self.electorate.copy(), self.country_data, **options)
+            np.testing.assert_array_equal(results[method].winners, isolated.winners, err_msg=method)
+
+    def test_compare_all_rows_match_winner_sharded(self):
+        for processes in (1, 2):
+            comparison = pewdie.compare_all(self.electorate, self.country_data, seed=SEED, processes=processes)
+            for m, method in enumerate(comparison.methods):
+                sharded = pewdie.winner_sharded(self.electorate, self.country_data, method, processes=1, seed=SEED)
+                np.testing.assert_array_equal(comparison.winners[m], sharded.winners, err_msg="%s, %d processes" % (method, processes))
+
+    def test_exclusive_shares_match_votes_distribution_exclusive(self):
+        shares = sweep.ExclusiveShares(self.electorate, self.country_data)
+        electorate = self.electorate.copy()
+        for x, y in [(0, 0), (20, 50), (100, 0), (0, 100), (35.5, 12.25)] + sweep.random_points(20, seed=SEED):
+            pewdie.votes_distribution_exclusive(electorate, self.country_data, x, y)
+            np.testing.assert_array_equal(shares.counts(x, y), electorate.counts, err_msg="(%g, %g)" % (x, y))
+
+    def test_check_points_rejects_bad_points(self):
+        sweep.check_points([(0, 0), (20, 80), (100, 0), (33.3, 66.7)])
+        for point in [(-1, 0), (0, -0.5), (60, 41), (101, 0), (1, 2, 3), (5,), (float('nan'), 0)]:
+            self.assertRaises(ValueError, sweep.check_points, [point])
+
+
+if __name__ == '__main__':
+    unittest.main()
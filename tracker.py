@@ -0,0 +1,96 @@
+# Incremental FPTP re-tally for live subscriber tracking.
+#
+# A channel's FPTP votes in a country only depend on its language's useful population there and on
+# its share of that language's subs (votes_distribution_fptp). So when one channel's sub count
+# changes, only the channels of that language get new counts, only countries where those counts
+# moved need a new winner, and the seat change falls out of comparing old and new winners.
+#
+# Unlike winner_fptp, which draws among tied leaders with random.choice, ties go to the first
+# channel in channel order so repeated updates are reproducible.
+
+import numpy as np
+
+from electorate import Electorate
+from rank_allocation import round2
+from shaping import LanguageAggregates
+
+
+class LiveTally(object):
+
+    def __init__(self, channels, countries):
+        self.channels = [dict(channel_obj) for channel_obj in channels]
+        self.countries = countries
+        self.electorate = Electorate(self.channels, countries)
+        self.aggregates = LanguageAggregates(self.channels, countries)
+        self.subs = np.array([channel_obj['subs'] for channel_obj in self.channels], dtype=float)
+        self.language_groups = self.electorate.language_groups()
+
+        for language in self.language_groups:
+            self._recount(language)
+        self.winners = self._winners(np.arange(self.electorate.n_countries))
+        self.seats = np.bincount(self.winners[self.winners >= 0], minlength=self.electorate.n_channels)
+
+    def _recount(self, language):
+        # votes_distribution_fptp for one language group, all countries at once.
+        group = self.language_groups[language]
+        total_subs = 0
+        for i in group:
+            total_subs += self.subs[i]
+        population = self.aggregates.useful[:, self.aggregates.language_index[language]]
+        counts = round2(population[None, :] * (self.subs[group] / total_subs)[:, None])
+        self.electorate.counts[group] = counts
+
+    def _winners(self, countries):
+        votes = self.electorate.counts[:, countries]
+        winners = votes.argmax(axis=0)
+        winners[votes.max(axis=0) <= 0] = -1
+        return winners
+
+    def seat_results(self):
+        return dict(zip(self.electorate.channel_names, self.seats.tolist()))
+
+    def country_winners(self):
+        return dict((country, self.electorate.channel_names[w] if w >= 0 else None)
+                    for country, w in zip(self.electorate.country_names, self.winners))
+
+    def update_subs(self, channel_name, new_subs):
+        # Returns {channel name: seat change} for the channels whose seat count moved.
+        return self.update_many({channel_name: new_subs})
+
+    def update_many(self, new_subs):
+        # update_subs for {channel name: subs} at once: every language touched is recounted once and
+        # every country whose counts moved gets one new winner.
+        languages = set()
+        for channel_name, subs in new_subs.items():
+            i = self.electorate.channel(channel_name)
+            if subs == self.subs[i]:
+                continue
+            self.subs[i] = subs
+            self.channels[i]['subs'] = subs
+            self.aggregates.update_subs(i, subs)
+            languages.add(self.electorate.languages[i])
+        if not languages:
+            return {}
+
+        changed = np.zeros(self.electorate.n_countries, dtype=bool)
+        for language in languages:
+            group = self.language_groups[language]
+            before = self.electorate.counts[group].copy()
+            self._recount(language)
+            changed |= (self.electorate.counts[group] != before).any(axis=0)
+        changed = np.flatnonzero(changed)
+        if not len(changed):
+            return {}
+
+        old_winners = self.winners[changed]
+        new_winners = self._winners(changed)
+        self.winners[changed] = new_winners
+        moved = old_winners != new_winners
+        if not moved.any():
+            return {}
+
+        delta = np.zeros(self.electorate.n_channels, dtype=int)
+        np.subtract.at(delta, old_winners[moved & (old_winners >= 0)], 1)
+        np.add.at(delta, new_winners[moved & (new_winners >= 0)], 1)
+        self.seats += delta
+        return dict((self.electorate.channel_names[c], int(delta[c])) for c in np.flatnonzero(delta))
@@ -0,0 +1,87 @@
+# Bounded transfer engine for the rank-preserving IRV loop.
+#
+# distributeEliminatedChannelsVotes hands an eliminated channel's votes to the channels still
+# standing (random order, uniform(0, votes left) each, the last one the rest) and takes as many
+# votes away from each recipient's lower ranks by proposing random amounts and skipping any that
+# don't fit (`else: pass`) until the remainder reaches zero, which can take any number of passes.
+#
+# transfer_eliminated() does the same hand-off in a fixed number of array operations per
+# elimination:
+#
+#       recipients  'random' draws the recipients' split from the loop's own law in one step
+#                   (irv._random_shares' stick-breaking over a random order; that is not a flat
+#                   Dirichlet, whose sticks would be Beta(1, n-1) rather than uniform, so sampling
+#                   one would change the outcomes). 'proportional' splits in proportion to the
+#                   recipients' current first preferences, with no randomness at all.
+#       lower ranks 'random' uses the same stick-breaking over each recipient's lower ranks, clipped
+#                   to what each rank holds, and takes what the clipping left over from every rank
+#                   in proportion to its remaining votes, which always fits in one step.
+#                   'proportional' takes from every lower rank in proportion to what it holds.
+#
+# Per-rank capacities hold throughout: no rank ever goes below zero and a recipient gains at most
+# the votes its lower ranks hold, the rest going to recipients with room left (or, if there is none
+# anywhere, leaving the count like an exhausted ballot).
+
+import numpy as np
+
+import instrument
+from irv import _random_shares
+
+RANKED_TRANSFERS = ('random', 'proportional')
+
+
+def recipient_shares(first_preferences, mode, rng):
+    # Fractions (summing to 1) of the eliminated votes each recipient gets.
+    first_preferences = np.asarray(first_preferences, dtype=float)
+    if mode == 'random':
+        return _random_shares(np.ones((1, len(first_preferences)), dtype=bool), rng)[0]
+    total = first_preferences.sum()
+    if total > 0:
+        return first_preferences / total
+    return np.full(len(first_preferences), 1.0 / len(first_preferences))
+
+
+def fit_to_capacity(amounts, capacities):
+    # amounts clipped to capacities, the clipped excess moved to the entries with headroom in
+    # proportion to it. Returns (fitted, what no headroom could take).
+    fitted = np.minimum(amounts, capacities)
+    excess = amounts.sum() - fitted.sum()
+    headroom = capacities - fitted
+    room = headroom.sum()
+    if excess <= 0 or room <= 0:
+        return fitted, max(excess, 0.0)
+    moved = min(excess, room)
+    return fitted + headroom * (moved / room), excess - moved
+
+
+def lower_rank_takes(gains, lower_ranks, mode, rng):
+    # (recipients, ranks-1) votes each recipient gives up from each lower rank, summing to its gain.
+    held = lower_ranks > 0
+    holding = held.any(axis=1)
+    split = np.zeros_like(lower_ranks)
+    if mode == 'proportional':
+        split[holding] = lower_ranks[holding] / lower_ranks[holding].sum(axis=1)[:, None]
+    elif holding.any():
+        split[holding] = _random_shares(held[holding], rng)
+    takes = np.minimum(split * gains[:, None], lower_ranks)
+    headroom = lower_ranks - takes
+    room = headroom.sum(axis=1)
+    short = gains - takes.sum(axis=1)
+    fill = np.where(room > 0, short / np.where(room > 0, room, 1), 0)
+    return takes + headroom * fill[:, None]
+
+
+def transfer_eliminated(rows, votes, recipients, mode='random', rng=None):
+    # rows: one country's (channels, ranks) slice, updated in place; recipients: channel indices.
+    if mode not in RANKED_TRANSFERS:
+        raise ValueError("Unknown ranked transfer: " + str(mode))
+    if rng is None:
+        rng = np.random
+    recipients = np.asarray(recipients, dtype=int)
+    if not len(recipients) or votes <= 0:
+        return
+    instrument.count('bounded_transfers')
+    lower_ranks = rows[recipients, 1:]
+    gains, _ = fit_to_capacity(votes * recipient_shares(rows[recipients, 0], mode, rng), lower_ranks.sum(axis=1))
+    rows[recipients, 0] += gains
+    rows[recipients, 1:] = np.maximum(lower_ranks - lower_rank_takes(gains, lower_ranks, mode, rng), 0)
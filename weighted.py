@@ -0,0 +1,267 @@
+# Weighted-ballot electorates: every distinct ranking stored once, with the votes that cast it.
+#
+# A WeightedBallots holds rows of (country, ranking, weight), sorted by country, where a ranking is
+# the channel indices in rank order (uint8, or uint16 past 255 channels) and weight is in million
+# votes like the rest of pewdie. FPTP, IRV, Borda and the pairwise methods all work on these rows, so
+# their cost grows with the number of distinct rankings, not with voters or rank slots.
+#
+# Conversions:
+#       from_electorate   the ranking model votes_distribution_ranked_voting spreads over rank
+#                         buckets: first preference, then the first preference's language group,
+#                         then everyone else. Each group's uniform rank split is written as its
+#                         cyclic shifts and the two groups' shifts are paired up along their
+#                         cumulative weights, so a first preference needs at most (a + b - 1)
+#                         rankings for groups of a and b channels. Only needs electorate.counts.
+#       from_ranks        any (channels, countries, ranks) tensor whose country slices are
+#                         "doubly stochastic" (every channel and every rank slot holds the country's
+#                         total), via a Birkhoff-von Neumann decomposition. One bipartite matching
+#                         per ranking, so meant for the bundled sizes rather than 50+ channels.
+#                         A rank tensor only says how many votes each channel has in each slot, not
+#                         which slots go together on a ballot; the decomposition picks one of many
+#                         ballot sets that fit. FPTP and Borda only read those slot totals, so they
+#                         come out the same for any of them (RANKS_METHODS). IRV and the pairwise
+#                         methods depend on the pick, so they are refused on these ballots.
+#       from_ballot_box   deduplicated sampled ballots from ballots.BallotBox.
+
+import numpy as np
+
+import instrument
+from ballots import ballot_dtype
+from pairwise import pairwise_results
+
+WEIGHTED_METHODS = ('fptp', 'irv', 'borda', 'condorcet', 'copeland', 'schulze', 'ranked_pairs')
+# The methods whose winners from_ranks' ballots fix (see the header).
+RANKS_METHODS = ('fptp', 'borda')
+
+# Rank-matrix entries at or below this many million votes count as empty (ranks are 2-decimal).
+TOLERANCE = 0.005
+
+# Largest countries x distinct-rankings weight table pairwise_matrix builds to share work between
+# countries; past it, every row is compared on its own.
+DENSE_WEIGHTS_LIMIT = 1 << 24
+
+
+def _shifts(channels):
+    # Every cyclic shift of `channels`: together they put each channel in each slot exactly once.
+    return [channels[s:] + channels[:s] for s in range(len(channels))]
+
+
+def _paired_shifts(first, same_language, remaining):
+    # (ranking, fraction) pairs for one first preference, pairing the uniform shift splits of the
+    # two groups along [0, 1): both groups keep every channel in every slot 1/size of the time.
+    same_shifts = _shifts(same_language) or [[]]
+    remaining_shifts = _shifts(remaining) or [[]]
+    cuts = sorted(set([s / float(len(same_shifts)) for s in range(len(same_shifts))] +
+                      [s / float(len(remaining_shifts)) for s in range(len(remaining_shifts))] + [1.0]))
+    pairs = []
+    for low, high in zip(cuts[:-1], cuts[1:]):
+        middle = (low + high) / 2
+        ranking = [first] + same_shifts[int(middle * len(same_shifts))] + remaining_shifts[int(middle * len(remaining_shifts))]
+        pairs.append((ranking, high - low))
+    return pairs
+
+
+def _matching(support, values):
+    # A perfect channel -> slot matching inside `support` (Kuhn's augmenting paths, trying the
+    # fullest slots first), or None if there is none.
+    n = len(support)
+    slot_owner = [-1] * n
+    candidates = [sorted(np.flatnonzero(support[i]), key=lambda r: -values[i, r]) for i in range(n)]
+
+    def augment(i, seen):
+        for r in candidates[i]:
+            if r in seen:
+                continue
+            seen.add(r)
+            if slot_owner[r] < 0 or augment(slot_owner[r], seen):
+                slot_owner[r] = i
+                return True
+        return False
+
+    for i in range(n):
+        if not augment(i, set()):
+            return None
+    return slot_owner
+
+
+def birkhoff_decomposition(matrix, tolerance=TOLERANCE):
+    # matrix[channel, slot] with (near) equal row and column sums -> ([ranking], [weight], residual).
+    remaining = np.array(matrix, dtype=float)
+    rankings = []
+    weights = []
+    while True:
+        owners = _matching(remaining > tolerance, remaining)
+        if owners is None:
+            break
+        weight = remaining[owners, np.arange(len(owners))].min()
+        remaining[owners, np.arange(len(owners))] -= weight
+        rankings.append(owners)
+        weights.append(weight)
+    return rankings, weights, float(np.clip(remaining, 0, None).sum())
+
+
+class WeightedBallots(object):
+
+    def __init__(self, n_channels, n_countries, countries, rankings, weights):
+        # countries[row]: country position (0..n_countries-1), rankings[row]: channels in rank order.
+        self.n_channels = n_channels
+        self.n_countries = n_countries
+        countries = np.asarray(countries, dtype=np.int64)
+        order = np.argsort(countries, kind='mergesort')
+        self.countries = countries[order]
+        self.rankings = np.asarray(rankings, dtype=ballot_dtype(n_channels)).reshape(len(countries), n_channels)[order]
+        self.weights = np.asarray(weights, dtype=float)[order]
+        self.residual = np.zeros(n_countries)
+
+    def __len__(self):
+        return len(self.weights)
+
+    @classmethod
+    def from_electorate(cls, electorate, country_indices):
+        # A first preference's rankings are the same in every country, only their weights differ.
+        language_groups = electorate.language_groups()
+        templates = []
+        for first, language in enumerate(electorate.languages):
+            same_language = [j for j in language_groups[language] if j != first]
+            remaining = [j for j in range(electorate.n_channels) if electorate.languages[j] != language]
+            pairs = _paired_shifts(first, same_language, remaining)
+            templates.append((np.array([ranking for ranking, _ in pairs]), np.array([fraction for _, fraction in pairs])))
+
+        countries, rankings, weights = [], [], []
+        for position, k in enumerate(country_indices):
+            for first in np.flatnonzero(electorate.counts[:, k] > 0):
+                first_rankings, fractions = templates[first]
+                countries.append(np.full(len(fractions), position))
+                rankings.append(first_rankings)
+                weights.append(electorate.counts[first, k] * fractions)
+        if not rankings:
+            return cls(electorate.n_channels, len(country_indices), [], [], [])
+        return cls(electorate.n_channels, len(country_indices), np.concatenate(countries), np.concatenate(rankings), np.concatenate(weights))
+
+    @classmethod
+    def from_ranks(cls, ranks, country_indices, tolerance=TOLERANCE):
+        # ranks[channel, country, rank-1]; `residual` keeps the votes per country no ranking covered.
+        countries, rankings, weights, residual = [], [], [], []
+        for position, k in enumerate(country_indices):
+            owners, owner_weights, left = birkhoff_decomposition(ranks[:, k, :], tolerance)
+            countries.extend([position] * len(owners))
+            rankings.extend(owners)
+            weights.extend(owner_weights)
+            residual.append(left)
+        ballots = cls(ranks.shape[0], len(country_indices), countries, rankings, weights)
+        ballots.residual = np.array(residual)
+        return ballots
+
+    @classmethod
+    def from_ballot_box(cls, ballot_box, weight=1.0):
+        # Sampled ballots collapsed to distinct rankings, `weight` votes per ballot.
+        countries, rankings, weights = [], [], []
+        for country in range(ballot_box.n_countries):
+            for rng, ballots in ballot_box.chunks(country):
+                unique, counts = np.unique(ballots, axis=0, return_counts=True)
+                countries.append(np.full(len(unique), country))
+                rankings.append(unique)
+                weights.append(counts * weight)
+        if not rankings:
+            return cls(ballot_box.n_channels, ballot_box.n_countries, [], [], [])
+        return cls(ballot_box.n_channels, ballot_box.n_countries,
+                   np.concatenate(countries), np.concatenate(rankings), np.concatenate(weights)).compress()
+
+    def compress(self):
+        # Merges rows with the same country and ranking.
+        if not len(self):
+            return self
+        keys = np.hstack((self.countries[:, None], self.rankings.astype(np.int64)))
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=self.weights, minlength=len(unique))
+        compressed = WeightedBallots(self.n_channels, self.n_countries, unique[:, 0], unique[:, 1:], weights)
+        compressed.residual = self.residual
+        return compressed
+
+    def _by_country(self, channels, weights):
+        # (countries, channels) sums of `weights` per (row country, channel).
+        cells = self.countries * self.n_channels + channels
+        return np.bincount(cells, weights=weights, minlength=self.n_countries * self.n_channels).reshape(self.n_countries, self.n_channels)
+
+    def _sum_rows(self, values):
+        # Per-country sums of the rows of `values` (rows are sorted by country).
+        sums = np.zeros((self.n_countries,) + values.shape[1:])
+        present = np.unique(self.countries)
+        if len(present):
+            sums[present] = np.add.reduceat(values, np.searchsorted(self.countries, present), axis=0)
+        return sums
+
+    def totals(self):
+        return np.bincount(self.countries, weights=self.weights, minlength=self.n_countries)
+
+    def first_preferences(self):
+        return self._by_country(self.rankings[:, 0], self.weights)
+
+    def rank_sums(self):
+        # Like winner_ranked_borda_count: sum of rank * votes per channel (lower is better).
+        sums = np.zeros((self.n_countries, self.n_channels))
+        for rank in range(self.n_channels):
+            sums += self._by_country(self.rankings[:, rank], self.weights * (rank + 1))
+        return sums
+
+    def pairwise_matrix(self):
+        # (countries, channels, channels): matrix[k, i, j] votes in country k ranking i above j.
+        # Rankings shared by several countries are compared once, then weighed per country.
+        if not len(self):
+            return np.zeros((self.n_countries, self.n_channels, self.n_channels))
+        distinct, inverse = np.unique(self.rankings, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        if self.n_countries * len(distinct) <= DENSE_WEIGHTS_LIMIT:
+            country_weights = np.bincount(self.countries * len(distinct) + inverse, weights=self.weights,
+                                          minlength=self.n_countries * len(distinct)).reshape(self.n_countries, len(distinct))
+            rankings, combine = distinct, country_weights.dot
+        else:
+            rankings, combine = self.rankings, lambda above: self._sum_rows(above * self.weights[:, None])
+
+        position = np.empty_like(rankings)
+        position[np.arange(len(rankings))[:, None], rankings] = np.arange(self.n_channels, dtype=rankings.dtype)
+        matrix = np.zeros((self.n_countries, self.n_channels, self.n_channels))
+        for i in range(self.n_channels):
+            matrix[:, i, :] = combine((position[:, i, None] < position).astype(float))
+        return matrix
+
+    def irv_winners(self):
+        # All countries at once: each round counts every ranking for its highest channel still
+        # standing, decides countries with a majority and eliminates the fewest (first on ties)
+        # everywhere else. Rankings only move down when their current top is eliminated, so a
+        # whole run touches each ranking slot at most once.
+        totals = self.totals()
+        winners = np.full(self.n_countries, -1, dtype=int)
+        standing = np.ones((self.n_countries, self.n_channels), dtype=bool)
+        undecided = totals > 0
+        position = np.zeros(len(self), dtype=int)
+        top = self.rankings[:, 0].astype(int)
+        while undecided.any():
+            tally = self._by_country(top, self.weights)
+            done = undecided & ((2 * tally.max(axis=1) > totals) | (standing.sum(axis=1) == 1))
+            winners[done] = tally.argmax(axis=1)[done]
+            undecided &= ~done
+
+            instrument.count('elimination_rounds', int(undecided.sum()))
+            eliminated = np.where(undecided, np.where(standing, tally, np.inf).argmin(axis=1), -1)
+            standing[np.flatnonzero(undecided), eliminated[undecided]] = False
+            moving = np.flatnonzero(top == eliminated[self.countries])
+            while len(moving):
+                position[moving] += 1
+                top[moving] = self.rankings[moving, position[moving]]
+                moving = moving[~standing[self.countries[moving], top[moving]]]
+        return winners
+
+    def winners(self, method):
+        # Winning channel index per country for any of WEIGHTED_METHODS, -1 where there is none.
+        if method == 'fptp':
+            tally = self.first_preferences()
+            return np.where(tally.max(axis=1) > 0, tally.argmax(axis=1), -1)
+        if method == 'irv':
+            return self.irv_winners()
+        if method == 'borda':
+            sums = self.rank_sums()
+            return np.where(self.totals() > 0, sums.argmin(axis=1), -1)
+        if method in ('condorcet', 'copeland', 'schulze', 'ranked_pairs'):
+            return pairwise_results(self.pairwise_matrix())[method]
+        raise ValueError("Unknown weighted-ballot method: " + str(method))